@@ -0,0 +1,119 @@
+"""
+Offline microbenchmarks for the plugin's pure-Python hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks                 # run everything and compare with baseline.json
+    python -m benchmarks -k search       # only cases whose name contains "search"
+    python -m benchmarks --save          # run and store the results as the new baseline
+    python -m benchmarks --threshold 15  # flag changes over 15% (default 10)
+
+Each case is timed in repeats of roughly --min-time seconds and the fastest repeat is reported, which
+is the least noisy estimate on a shared machine. The exit status is 1 if any case regressed, so the
+suite can gate a CI job. Baselines are only comparable on the same machine and Python version.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+
+
+def boot():
+    """Initialise NoneBot just enough for the plugin modules to import, without starting the bot"""
+    sys.path.insert(0, os.getcwd())
+    import nonebot
+
+    nonebot.init(log_level="WARNING")
+    nonebot.load_plugin("nonebot_plugin_localstore")
+
+
+def measure(run, min_time: float, repeats: int) -> float:
+    """Seconds per call of run: the fastest of `repeats` repeats, each looping for about min_time"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time / 5:
+            break
+        number *= 2
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def format_seconds(value: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if value >= scale:
+            return f"{value / scale:.2f}{unit}"
+    return f"{value / 1e-9:.0f}ns"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", default="", help="only run cases whose name contains this")
+    parser.add_argument("--save", action="store_true", help="write the results to baseline.json")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change reported as a regression")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--repeats", type=int, default=5)
+    options = parser.parse_args()
+
+    boot()
+    from .cases import CASES
+
+    baseline = {}
+    if BASELINE_FILE.exists():
+        saved = json.loads(BASELINE_FILE.read_text(encoding="utf-8"))
+        baseline = saved.get("cases", {})
+        if saved.get("python") != platform.python_version():
+            print(f"note: baseline was recorded on Python {saved.get('python')}, this is {platform.python_version()}")
+
+    results = {}
+    regressions = []
+    print(f"{'case':<24}{'time':>12}{'baseline':>12}{'change':>10}")
+    for name, setup in CASES.items():
+        if options.filter not in name:
+            continue
+        results[name] = measure(setup(), options.min_time, options.repeats)
+        line = f"{name:<24}{format_seconds(results[name]):>12}"
+        if name in baseline:
+            change = (results[name] / baseline[name] - 1) * 100
+            verdict = ""
+            if change > options.threshold:
+                verdict = "  REGRESSED"
+                regressions.append(name)
+            elif change < -options.threshold:
+                verdict = "  improved"
+            line += f"{format_seconds(baseline[name]):>12}{change:>+9.1f}%{verdict}"
+        print(line)
+
+    if options.save:
+        merged = {**baseline, **results}
+        BASELINE_FILE.write_text(json.dumps({
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cases": {name: merged[name] for name in sorted(merged)},
+        }, indent=2) + "\n", encoding="utf-8")
+        print(f"saved baseline for {len(results)} case(s) to {BASELINE_FILE}")
+        return 0
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {options.threshold:.0f}%: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Benchmark cases.
+
+Each case is a setup function returning the zero-argument callable that gets timed; setup itself is
+not measured. Names are stable keys into baseline.json, so rename a case only together with the baseline.
+"""
+import copy
+from typing import Callable
+
+from . import fixtures
+
+CASES: dict[str, Callable[[], Callable[[], object]]] = {}
+
+QUERIES = ["lionharder", "kz_lionharder", "cake", "bkz_", "hb_fafnir", "lionhardr", "yes", "xc_", "kz", "sync"]
+COMMANDS = [
+    "", "kz_lionharder", "-m skz", "kz_beginnerblock_go v", "-s 76561198000000000 -m kzt",
+    "STEAM_1:0:19867136", "-M kz_bhop_badges -u", "all s",
+]
+STEAMIDS = ["STEAM_1:0:19867136", "76561198000000000", "[U:1:39734272]", 76561198000000000]
+
+
+def case(name: str):
+    def register(setup):
+        CASES[name] = setup
+        return setup
+    return register
+
+
+@case("search_map")
+def search_map_case():
+    from src.plugins.gokz.core.kreedz import search_map
+    from src.plugins.gokz.core.map_catalog import map_catalog, CatalogSnapshot
+
+    map_catalog._snapshot = CatalogSnapshot.from_maps_data(fixtures.load_maps(), str(fixtures.MAPS_FILE))  # NOQA
+    map_catalog.snapshot.index  # NOQA build outside the timed part
+
+    def run():
+        for query in QUERIES:
+            search_map(query)
+    return run
+
+
+@case("map_index_build")
+def map_index_build_case():
+    from src.plugins.gokz.core.map_search import MapSearchIndex
+
+    names = [m["name"] for m in fixtures.load_maps() if m.get("name")]
+
+    def run():
+        MapSearchIndex(names)
+    return run
+
+
+@case("parse_args")
+def parse_args_case():
+    from src.plugins.gokz.core.command_helper import parse_args
+
+    def run():
+        for text in COMMANDS:
+            parse_args(text)
+    return run
+
+
+@case("command_data")
+def command_data_case():
+    from nonebot.adapters.qq import Message, MessageSegment
+    from src.plugins.gokz.core.command_helper import CommandData
+
+    class StubEvent:
+        """Just enough of a QQ MessageEvent for CommandData's parsing step"""
+        def __init__(self, message: Message):
+            self.message = message
+
+        def get_user_id(self) -> str:
+            return "BENCH_OPENID"
+
+        def get_message(self) -> Message:
+            return self.message
+
+    pairs = []
+    for text in COMMANDS:
+        args = Message(text)
+        pairs.append((StubEvent(Message("/pb ") + args + MessageSegment.mention_user("OTHER")), args))
+
+    def run():
+        for event, args in pairs:
+            CommandData(event, args)
+    return run
+
+
+@case("format_kzmode")
+def format_kzmode_case():
+    from src.plugins.gokz.core.kreedz import format_kzmode
+
+    modes = ["kzt", "skz", "vnl", "k", "s", "v", 0, 1, 2, "kz_timer", "kz_simple", "kz_vanilla"]
+    forms = ["full", "m", "num"]
+
+    def run():
+        for mode in modes:
+            for form in forms:
+                format_kzmode(mode, form)
+    return run
+
+
+@case("convert_steamid")
+def convert_steamid_case():
+    from src.plugins.gokz.core.steam_user import convert_steamid
+
+    def run():
+        for steamid in STEAMIDS:
+            for target in (2, 3, 64):
+                convert_steamid(steamid, target)
+    return run
+
+
+@case("format_gruntime_5k")
+def format_gruntime_case():
+    from src.plugins.gokz.core.formatter import format_gruntime
+
+    times = [record["time"] for record in fixtures.records(5000)]
+
+    def run():
+        for value in times:
+            format_gruntime(value, True)
+    return run
+
+
+@case("record_format_time_5k")
+def record_format_time_case():
+    from src.plugins.gokz.core.formatter import record_format_time
+
+    stamps = [record["created_on"] for record in fixtures.records(5000)]
+
+    def run():
+        for stamp in stamps:
+            record_format_time(stamp)
+    return run
+
+
+@case("count_servers_10k")
+def count_servers_case():
+    from src.plugins.gokz.core.kz.records import count_servers
+
+    payload = fixtures.records(10_000)
+
+    def run():
+        count_servers(payload, limit=10)
+    return run
+
+
+@case("separate_records_10k")
+def separate_records_case():
+    from src.plugins.gokz.schema.record import GlobalRecord, separate_records
+
+    fields = GlobalRecord.__dataclass_fields__
+    payload = [GlobalRecord(**{k: v for k, v in record.items() if k in fields}) for record in fixtures.records(10_000)]
+
+    def run():
+        separate_records(payload)
+    return run
+
+
+@case("mp_progress_2k")
+def mp_progress_case():
+    from src.plugins.gokz.core.kz.records import progress_history
+
+    runs = fixtures.map_runs(2000)
+
+    def run():
+        # progress_history sorts in place; time it on fresh, unsorted input like the handler gets
+        progress_history(copy.copy(runs))
+    return run
+
+
+@case("render_card_400")
+def render_card_case():
+    from src.plugins.gokz.core.kz.card import render_card
+    from src.plugins.gokz.core.map_catalog import map_catalog, CatalogSnapshot
+
+    map_catalog._snapshot = CatalogSnapshot.from_maps_data(fixtures.load_maps(), str(fixtures.MAPS_FILE))  # NOQA
+    payload = fixtures.records(400)
+    render_card(payload, "kz_timer", steamid="STEAM_1:0:0")  # fonts and tier totals are cached after the first card
+
+    def run():
+        render_card(payload, "kz_timer", steamid="STEAM_1:0:0")
+    return run
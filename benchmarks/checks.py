@@ -0,0 +1,286 @@
+"""
+Deterministic self-checks of the plugin's concurrency-sensitive bookkeeping.
+
+The repository has no test suite; these complement the timing cases with assertions about behaviour
+that manual runs cannot pin down, such as request coalescing and incrementally maintained state.
+Everything runs offline against throwaway databases and the upstream simulator.
+
+Run from the repository root:
+
+    python -m benchmarks.checks              # run every check
+    python -m benchmarks.checks -k cache     # only checks whose name contains "cache"
+
+The exit status is 1 if any check failed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import traceback
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from .upstream_sim import Faults
+
+CHECKS: dict[str, Callable[[], Awaitable[None]]] = {}
+
+
+def check(name: str):
+    def register(run):
+        CHECKS[name] = run
+        return run
+    return register
+
+
+def boot(workdir: Path):
+    """Initialise NoneBot enough to import the plugin modules, with all state under workdir"""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir / 'bot.sqlite3'}"
+    os.environ["RECORD_STORE_PATH"] = str(workdir / "records.sqlite3")
+    sys.path.insert(0, os.getcwd())
+    import nonebot
+
+    nonebot.init(
+        log_level="ERROR",
+        localstore_cache_dir=str(workdir / "cache"),
+        localstore_data_dir=str(workdir / "data"),
+        localstore_config_dir=str(workdir / "config"),
+    )
+    nonebot.load_plugin("nonebot_plugin_localstore")
+
+
+@asynccontextmanager
+async def simulator(faults: Faults | None = None):
+    """Route the shared HTTP session to a fresh upstream simulator; yields its per-host request counter"""
+    from src.plugins.gokz.api import helper
+    from . import upstream_sim
+
+    runner, base_url = await upstream_sim.start(faults)
+    helper._session = upstream_sim.RedirectSession(await helper.init_session(), base_url)  # NOQA
+    try:
+        yield runner.app["requests"]
+    finally:
+        await helper.close_session()
+        await runner.cleanup()
+
+
+@check("response_cache_single_flight")
+async def response_cache_single_flight():
+    from src.plugins.gokz.api.kztimerglobal import fetch_global_api
+
+    params = {"steamid64": "76561198000000001", "modes_list_string": "kz_timer", "has_teleports": "false"}
+    async with simulator(Faults(latency=0.05)) as requests:
+        results = await asyncio.gather(*(fetch_global_api("records/top", params) for _ in range(50)))
+        assert requests["kztimerglobal.com"] == 1, f"50 identical lookups made {requests['kztimerglobal.com']} requests"
+        assert all(result == results[0] for result in results), "coalesced callers got different results"
+
+        await fetch_global_api("records/top", {**params, "has_teleports": "true"})
+        assert requests["kztimerglobal.com"] == 2, "a different query was answered from another query's entry"
+
+
+@check("response_cache_cancelled_waiter")
+async def response_cache_cancelled_waiter():
+    from src.plugins.gokz.api.cache import ResponseCache
+
+    cache = ResponseCache()
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetcher():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return ["value"]
+
+    waiters = [asyncio.create_task(cache.get_or_fetch("key", fetcher, ttl=60)) for _ in range(3)]
+    await asyncio.sleep(0)
+    waiters[0].cancel()  # the caller that started the fetch gives up
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters, return_exceptions=True)
+    assert isinstance(results[0], asyncio.CancelledError), results[0]
+    assert results[1:] == [["value"], ["value"]], f"remaining waiters got {results[1:]}"
+    assert calls == 1 and cache.get("key") == ["value"], "the shared fetch did not complete for the other waiters"
+
+
+@check("response_cache_lru_cap")
+async def response_cache_lru_cap():
+    from src.plugins.gokz.api.cache import ResponseCache, estimate_size
+
+    value = ["x" * 100]
+    size = estimate_size(value)
+    cache = ResponseCache(max_bytes=size * 5)
+    for i in range(5):
+        cache.set(i, value, ttl=60)
+    cache.get(0)  # most recently used now, 1 is the oldest
+    cache.set(5, value, ttl=60)
+    assert cache.get(1) is None, "the least recently used entry survived going over the cap"
+    assert all(cache.get(i) == value for i in (0, 2, 3, 4, 5)), "an entry other than the oldest was evicted"
+    assert cache.total_bytes == size * 5 <= cache.max_bytes, f"{cache.total_bytes} bytes accounted for 5 entries"
+
+    cache.set("big", ["x" * size * 10], ttl=60)
+    assert cache.get("big") is None and cache.total_bytes == size * 5, \
+        "a value larger than the whole cache was stored or evicted others"
+
+
+async def seed_group(group_openid: str, qids: list[str], first_steamid64: int, mode: str = "kz_timer"):
+    """Bind qids to consecutive steamids, record them as members of the group, one User row per qid"""
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from steam.steamid import SteamID
+    from src.plugins.gokz.db.db import engine
+    from src.plugins.gokz.db.models import GroupMember, User
+
+    async with AsyncSession(engine) as session:
+        for i, qid in enumerate(qids):
+            await session.merge(User(qid=qid, name=f"bind-{qid}", steamid=SteamID(first_steamid64 + i).as_steam2, mode=mode))
+            await session.merge(GroupMember(group_openid=group_openid, qid=qid))
+        await session.commit()
+
+
+def random_entry(rng, steamid64: int, mode: str) -> dict:
+    from src.plugins.gokz.db.rank_store import rank_values
+
+    # few distinct values so ties, which only the steamid breaks, are common
+    data = {"rank": rng.randrange(1, 5000), "points": rng.randrange(20) * 1000, "rating": rng.randrange(10) / 4}
+    return rank_values(str(steamid64), mode, data, rng.choice((None, f"player-{steamid64}")))
+
+
+async def assert_boards_rebuilt_equal(keys: list[tuple[str, str]]):
+    """Every (group, mode) board of the live rankings equals one built from scratch out of the database"""
+    from src.plugins.gokz.db.group_ranking import GroupRankings, METRICS, group_rankings
+
+    scratch = GroupRankings()
+    for group_openid, mode in keys:
+        live = await group_rankings.board(group_openid, mode)
+        rebuilt = await scratch.board(group_openid, mode)
+        for metric in METRICS:
+            assert live.orders[metric] == rebuilt.orders[metric], \
+                f"{group_openid} {mode} by {metric} differs from a board sorted from scratch"
+        for steamid64 in rebuilt.top(METRICS[0], len(rebuilt)):
+            assert group_rankings.standings[(steamid64, mode)] == scratch.standings[(steamid64, mode)], \
+                f"standing of {steamid64} in {mode} differs from the database"
+
+
+@check("group_ranking_incremental")
+async def group_ranking_incremental():
+    import random
+    from src.plugins.gokz.db.rank_store import save_ranks
+
+    rng = random.Random(0)
+    base = 76561198100000000
+    # GA and GB overlap on members 100-149; 200-249 are bound but in neither group
+    await seed_group("CHECK_GA", [f"CA{i}" for i in range(150)], base)
+    await seed_group("CHECK_GB", [f"CA{i}" for i in range(100, 150)] + [f"CB{i}" for i in range(50)], base + 150)
+    await seed_group("CHECK_GC", [f"CC{i}" for i in range(50)], base + 200)
+    players = range(base, base + 250)
+    await save_ranks([random_entry(rng, steamid64, "kz_timer") for steamid64 in players if rng.random() < 0.7])
+
+    keys = [(group, mode) for group in ("CHECK_GA", "CHECK_GB") for mode in ("kz_timer", "kz_simple")]
+    await assert_boards_rebuilt_equal(keys)  # loads the live boards before they are updated in place
+
+    for _ in range(30):
+        # new entries, moved entries, unchanged ones and players outside the loaded groups, both modes
+        batch = {
+            (steamid64, mode): random_entry(rng, steamid64, mode)
+            for steamid64, mode in ((rng.choice(players), rng.choice(("kz_timer", "kz_simple"))) for _ in range(25))
+        }
+        await save_ranks(list(batch.values()))
+        await assert_boards_rebuilt_equal(keys)
+
+
+@check("group_ranking_membership")
+async def group_ranking_membership():
+    import random
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from steam.steamid import SteamID
+    from src.plugins.gokz.db.db import engine
+    from src.plugins.gokz.db.group_ranking import group_rankings
+    from src.plugins.gokz.db.models import User
+    from src.plugins.gokz.db.rank_store import save_ranks
+
+    rng = random.Random(1)
+    base = 76561198200000000
+    await seed_group("CHECK_GM", [f"CM{i}" for i in range(40)], base)
+    await save_ranks([random_entry(rng, steamid64, "kz_timer") for steamid64 in range(base, base + 60)])
+    keys = [("CHECK_GM", "kz_timer")]
+    await assert_boards_rebuilt_equal(keys)
+
+    # a bound user talks in the group for the first time
+    await seed_group("CHECK_OTHER", ["CM50"], base + 50)
+    await group_rankings.member_seen("CHECK_GM", "CM50")
+    assert group_rankings.members["CHECK_GM"]["CM50"] == str(base + 50), "a newly seen member was not added"
+    await assert_boards_rebuilt_equal(keys)
+
+    # a member rebinds to another account, as /bind does
+    async with AsyncSession(engine) as session:
+        user = await session.get(User, "CM3")
+        user.steamid = SteamID(base + 55).as_steam2
+        session.add(user)
+        await session.commit()
+    group_rankings.invalidate_member("CM3")
+    assert ("CHECK_GM", "kz_timer") not in group_rankings.boards, "a rebind left the group's board in place"
+    await assert_boards_rebuilt_equal(keys)
+    board = await group_rankings.board("CHECK_GM", "kz_timer")
+    assert board.position(group_rankings.standings[(str(base + 55), "kz_timer")], "points"), "the new account is not ranked"
+    assert board.position(group_rankings.standings[(str(base + 3), "kz_timer")], "points") is None, \
+        "the old account is still ranked"
+
+
+@check("group_ranking_single_fill")
+async def group_ranking_single_fill():
+    from src.plugins.gokz.db.group_ranking import GroupRankings
+
+    rankings = GroupRankings()
+    release = asyncio.Event()
+    calls = []
+
+    async def fill(steamid64s):
+        calls.append(steamid64s)
+        await release.wait()
+
+    assert rankings.start_fill("G", "kz_timer", ["1", "2"], fill), "the first fill did not start"
+    assert not rankings.start_fill("G", "kz_timer", ["1", "2"], fill), "a second fill started for the same group and mode"
+    assert rankings.start_fill("G", "kz_simple", ["1"], fill), "a fill in another mode was held back"
+    assert not rankings.start_fill("H", "kz_timer", [], fill), "a fill started with nobody to fetch"
+    release.set()
+    await asyncio.gather(*rankings._fills.values())  # NOQA
+    await asyncio.sleep(0)  # done callbacks
+    assert not rankings._fills, "finished fills were not forgotten"  # NOQA
+    assert rankings.start_fill("G", "kz_timer", ["1"], fill), "no new fill after the previous one finished"
+    await asyncio.gather(*rankings._fills.values())  # NOQA
+    assert len(calls) == 3, f"{len(calls)} fills ran"
+
+
+async def run_checks(names: list[str]) -> int:
+    from src.plugins.gokz.db.db import create_db_and_tables, create_local_db_and_tables, close_engines
+
+    await create_db_and_tables()
+    await create_local_db_and_tables()
+    failed = 0
+    for name in names:
+        try:
+            await CHECKS[name]()
+            print(f"ok    {name}")
+        except Exception:  # NOQA report every failing check, not just the first
+            failed += 1
+            print(f"FAIL  {name}")
+            traceback.print_exc()
+    await close_engines()
+    print(f"{len(names) - failed}/{len(names)} checks passed")
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.checks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("-k", "--filter", default="", help="only run checks whose name contains this")
+    options = parser.parse_args()
+
+    names = [name for name in CHECKS if options.filter in name]
+    with tempfile.TemporaryDirectory(prefix="gokz-checks-") as workdir:
+        boot(Path(workdir))
+        return asyncio.run(run_checks(names))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
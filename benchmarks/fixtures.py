@@ -0,0 +1,69 @@
+"""Deterministic synthetic payloads shaped like Global API / gokz.top responses"""
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from steam.steamid import SteamID
+
+MAPS_FILE = Path("data/gokz_maps.json")
+
+SERVERS = [f"Server #{i} | KZ Timer 128 tick" for i in range(60)]
+MODES = ("kz_timer", "kz_simple", "kz_vanilla")
+
+
+def load_maps() -> list[dict]:
+    with MAPS_FILE.open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def records(count: int, seed: int = 0, steamid64: str = "76561198000000000", player_name: str = "bench") -> list[dict]:
+    """count personal-best style records spread over the real map list"""
+    rng = random.Random(seed)
+    maps = [m["name"] for m in load_maps()]
+    steam_id = SteamID(steamid64).as_steam2
+    start = datetime(2018, 1, 1)
+    result = []
+    for i in range(count):
+        created = start + timedelta(seconds=rng.randrange(200_000_000))
+        result.append({
+            "id": 10_000_000 + i,
+            "steamid64": steamid64,
+            "player_name": player_name,
+            "steam_id": steam_id,
+            "server_id": rng.randrange(1500),
+            "map_id": rng.randrange(1200),
+            "stage": 0,
+            "mode": rng.choice(MODES),
+            "tickrate": 128,
+            "time": round(rng.uniform(20, 7200), 3),
+            "teleports": rng.choice((0, 0, 0, rng.randrange(1, 400))),
+            "created_on": created.strftime("%Y-%m-%dT%H:%M:%S"),
+            "updated_on": created.strftime("%Y-%m-%dT%H:%M:%S"),
+            "server_name": rng.choice(SERVERS),
+            "map_name": rng.choice(maps),
+            "tier": rng.randrange(1, 8),
+            "points": rng.randrange(0, 1001),
+        })
+    return result
+
+
+def map_runs(count: int, seed: int = 0) -> list[dict]:
+    """count runs of one player on one map, times trending down with noise like a real grind"""
+    rng = random.Random(seed)
+    start = datetime(2020, 1, 1)
+    best = 900.0
+    result = []
+    for i in range(count):
+        best = max(60.0, best * rng.uniform(0.995, 1.0))
+        result.append({
+            "player_name": "bench",
+            "map_name": "kz_lionharder",
+            "mode": "kz_timer",
+            "time": round(best * rng.uniform(1.0, 1.3), 3),
+            "teleports": rng.choice((0, rng.randrange(1, 60))),
+            "points": rng.randrange(0, 1001),
+            "created_on": (start + timedelta(minutes=17 * i)).strftime("%Y-%m-%dT%H:%M:%S"),
+        })
+    rng.shuffle(result)
+    return result
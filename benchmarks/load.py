@@ -0,0 +1,217 @@
+"""
+Concurrent load test of the command handlers against the offline upstream simulator.
+
+Boots the plugin with throwaway databases and cache directories, binds a pool of synthetic users,
+points the shared HTTP session at benchmarks.upstream_sim and pushes synthetic QQ group and C2C
+events through NoneBot's normal event dispatch. Replies are captured instead of sent.
+
+Run from the repository root:
+
+    python -m benchmarks.load                                   # 2000 events, 100 at a time
+    python -m benchmarks.load -n 5000 -c 200 --commands pb,wr
+    python -m benchmarks.load --latency 300 --error-rate 0.05   # slow, flaky upstreams
+    python -m benchmarks.load --down api.gokz.top               # exercise breakers and hedging
+    python -m benchmarks.load --keep-limits                     # production per-host rate limits
+
+Latency is measured per event from dispatch until its handler finished. An event counts as failed if
+it got no reply or the handler raised.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from .upstream_sim import add_fault_options, faults_from_options
+
+COMMANDS = ("pb", "wr", "pr", "rank", "ccf", "mp")
+MODES = ("kz_timer", "kz_simple", "kz_vanilla")
+BASE_STEAMID64 = 76561198000000000
+
+# Far above anything the simulator needs, so the bot's own code is what gets measured
+UNTHROTTLED = {"default": [1000, 1000, 200]}
+
+
+def boot(workdir: Path, keep_limits: bool):
+    """Initialise NoneBot with the QQ adapter and the plugin, keeping all state under workdir"""
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{workdir / 'bot.sqlite3'}"
+    os.environ["RECORD_STORE_PATH"] = str(workdir / "records.sqlite3")
+    os.environ["screenshot_pool_warm"] = "false"
+    if not keep_limits:
+        hosts = ("kztimerglobal.com", "api.gokz.top", "api.steampowered.com", "api.wmpvp.com", "cdn.jsdelivr.net")
+        os.environ["http_host_limits"] = json.dumps({host: UNTHROTTLED["default"] for host in hosts} | UNTHROTTLED)
+
+    sys.path.insert(0, os.getcwd())
+    import nonebot
+    from nonebot.adapters.qq import Adapter
+
+    nonebot.init(
+        driver="~fastapi+~httpx",
+        command_start={"/"},
+        log_level="WARNING",
+        localstore_cache_dir=str(workdir / "cache"),
+        localstore_data_dir=str(workdir / "data"),
+        localstore_config_dir=str(workdir / "config"),
+    )
+    nonebot.get_driver().register_adapter(Adapter)
+    nonebot.load_plugin("nonebot_plugin_localstore")
+    nonebot.load_plugin("src.plugins.gokz")
+
+
+def user_openid(index: int) -> str:
+    return f"BENCH{index:06d}"
+
+
+async def seed_users(count: int):
+    from sqlmodel.ext.asyncio.session import AsyncSession
+    from steam.steamid import SteamID
+    from src.plugins.gokz.db.db import engine
+    from src.plugins.gokz.db.models import User
+
+    rng = random.Random(0)
+    async with AsyncSession(engine) as session:
+        for i in range(count):
+            session.add(User(
+                qid=user_openid(i),
+                name=f"bench{i}",
+                steamid=SteamID(BASE_STEAMID64 + i).as_steam2,
+                mode=rng.choice(MODES),
+            ))
+        await session.commit()
+
+
+def make_events(count: int, users: int, commands: list[str], c2c_share: float, seed: int) -> list[tuple[str, object]]:
+    """(command, event) pairs in dispatch order"""
+    from nonebot.adapters.qq import GroupAtMessageCreateEvent, C2CMessageCreateEvent
+    from nonebot.adapters.qq.models import GroupMemberAuthor, FriendAuthor
+    from . import fixtures
+
+    rng = random.Random(seed)
+    maps = [m["name"] for m in fixtures.load_maps()]
+    timestamp = datetime.now().astimezone().isoformat()
+    events = []
+    for i in range(count):
+        command = rng.choice(commands)
+        content = f"/{command}"
+        if command in ("pb", "wr", "mp"):
+            content += f" {rng.choice(maps)}"
+        openid = user_openid(rng.randrange(users))
+        if rng.random() < c2c_share:
+            event = C2CMessageCreateEvent(
+                id=f"bench-{i}", content=content, timestamp=timestamp,
+                author=FriendAuthor(id=openid, user_openid=openid),
+            )
+        else:
+            event = GroupAtMessageCreateEvent(
+                id=f"bench-{i}", content=content, timestamp=timestamp,
+                author=GroupMemberAuthor(id=openid, member_openid=openid),
+                group_openid=f"BENCHGROUP{rng.randrange(20):02d}",
+            )
+        events.append((command, event))
+    return events
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(options) -> int:
+    import nonebot
+    from nonebot.adapters.qq import Adapter, Bot
+    from nonebot.adapters.qq.config import BotInfo
+    from nonebot.message import handle_event
+    from src.plugins.gokz.api import helper
+    from src.plugins.gokz.core.map_catalog import load_map_catalog
+    from src.plugins.gokz.db.db import create_db_and_tables, create_local_db_and_tables, close_engines
+    from . import upstream_sim
+
+    runner, base_url = await upstream_sim.start(faults_from_options(options))
+    await create_db_and_tables()
+    await create_local_db_and_tables()
+    await seed_users(options.users)
+    helper._session = upstream_sim.RedirectSession(await helper.init_session(), base_url)  # NOQA
+    await load_map_catalog()
+
+    adapter = nonebot.get_adapter(Adapter)
+    bot = Bot(adapter, "bench", BotInfo(id="bench", token="bench", secret="bench"))
+    replies: dict[str, int] = defaultdict(int)
+
+    async def send(event, message, **kwargs):
+        replies[event.id] += 1
+
+    bot.send = send
+
+    commands = options.commands.split(",")
+    events = make_events(options.events, options.users, commands, options.c2c_share, options.seed)
+    latencies: dict[str, list[float]] = defaultdict(list)
+    failures: dict[str, int] = defaultdict(int)
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def dispatch(command, event):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await handle_event(bot, event)
+            except Exception:  # NOQA handle_event logs handler errors itself; this is the dispatcher failing
+                failures[command] += 1
+            latencies[command].append(time.perf_counter() - start)
+            if not replies[event.id]:
+                failures[command] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(dispatch(command, event) for command, event in events))
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(events)} events in {elapsed:.2f}s = {len(events) / elapsed:.1f}/s at concurrency {options.concurrency}")
+    print(f"{'command':<10}{'count':>8}{'failed':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    every = []
+    for command in commands:
+        ordered = sorted(latencies[command])
+        every.extend(ordered)
+        print(f"{command:<10}{len(ordered):>8}{failures[command]:>8}" + "".join(
+            f"{percentile(ordered, q) * 1000:>8.0f}ms" for q in (0.5, 0.95, 0.99, 1.0)
+        ))
+    every.sort()
+    print(f"{'all':<10}{len(every):>8}{sum(failures.values()):>8}" + "".join(
+        f"{percentile(every, q) * 1000:>8.0f}ms" for q in (0.5, 0.95, 0.99, 1.0)
+    ))
+    upstream = runner.app["requests"]
+    print("upstream requests: " + ", ".join(f"{host} {count}" for host, count in upstream.most_common()))
+
+    await helper.close_session()
+    await runner.cleanup()
+    await close_engines()
+    return 1 if sum(failures.values()) else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description=__doc__.split("\n\n")[0])
+    parser.add_argument("-n", "--events", type=int, default=2000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100, help="events in flight at once")
+    parser.add_argument("--users", type=int, default=500, help="distinct bound users sending commands")
+    parser.add_argument("--commands", default=",".join(COMMANDS), help=f"comma separated subset of {','.join(COMMANDS)}")
+    parser.add_argument("--c2c-share", type=float, default=0.3, help="share of events sent as C2C instead of group @")
+    parser.add_argument("--keep-limits", action="store_true", help="keep the configured per-host rate limits")
+    add_fault_options(parser)
+    options = parser.parse_args()
+    if options.seed is None:
+        options.seed = 0
+    unknown = set(options.commands.split(",")) - set(COMMANDS)
+    if unknown:
+        parser.error(f"unknown command(s): {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory(prefix="gokz-load-") as workdir:
+        boot(Path(workdir), options.keep_limits)
+        return asyncio.run(run(options))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+"""
+Offline stand-in for every upstream the plugin talks to, served from fixtures.
+
+One aiohttp app answers for all hosts; the original host is the first path segment, so
+https://api.gokz.top/api/v1/players/X becomes http://127.0.0.1:PORT/api.gokz.top/api/v1/players/X.
+`RedirectSession` wraps an aiohttp session to do that rewrite, which leaves throttles, breakers
+and metrics keyed on the real host names.
+
+Run it on its own to poke at it with curl:
+
+    python -m benchmarks.upstream_sim --port 8765 --latency 80 --error-rate 0.02
+
+Served:
+    kztimerglobal.com        records/top, records/top/recent, bans, maps
+    api.gokz.top             leaderboards, players, maps (summary, by name, comments), records, search
+    api.steampowered.com     GetPlayerSummaries, GetPlayerBans, ResolveVanityURL
+    steamcommunity.com       profile XML of custom URLs
+    api.wmpvp.com            pvpDetailDataStats
+    cdn.jsdelivr.net         map thumbnails
+"""
+import argparse
+import asyncio
+import io
+import random
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import urlsplit
+
+from PIL import Image
+from aiohttp import web
+from steam.steamid import SteamID
+
+from . import fixtures
+
+MODE_CODES = {"KZT": "kz_timer", "SKZ": "kz_simple", "VNL": "kz_vanilla"}
+
+
+@dataclass
+class Faults:
+    """What the simulator does to requests before answering them"""
+    latency: float = 0.05  # seconds
+    jitter: float = 0.02  # seconds, uniform +-
+    error_rate: float = 0.0  # share answered with 503
+    throttle_rate: float = 0.0  # share answered with 429 and Retry-After
+    stall_rate: float = 0.0  # share that hang for `stall` seconds, to trip client timeouts
+    stall: float = 30.0
+    down: set[str] = field(default_factory=set)  # hosts that always answer 503
+    seed: int | None = None
+
+    def __post_init__(self):
+        self.rng = random.Random(self.seed)
+
+
+# Fixtures --------------------------------------------------------------------------------------------
+
+
+def _steamid64(value: str) -> str | None:
+    steamid = SteamID(value)
+    return str(steamid.as_64) if steamid.is_valid() else None
+
+
+def _mode(value: str | None) -> str:
+    if not value:
+        return "kz_timer"
+    return MODE_CODES.get(value.upper(), value)
+
+
+def _seed(*parts) -> int:
+    """Stable across processes, unlike hash() of a str"""
+    return zlib.crc32(":".join(map(str, parts)).encode())
+
+
+@lru_cache(maxsize=1)
+def thumbnail() -> bytes:
+    image = Image.new("RGB", (200, 113), (40, 44, 52))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+def _player_name(steamid64: str) -> str:
+    return f"player{int(steamid64) % 100_000}"
+
+
+@lru_cache(maxsize=4096)
+def player_records(steamid64: str) -> tuple[dict, ...]:
+    """Personal bests of one player: unique per (map, mode, TP/PRO), seeded by the steamid"""
+    best = {}
+    for record in fixtures.records(400, seed=int(steamid64), steamid64=steamid64, player_name=_player_name(steamid64)):
+        best.setdefault((record["map_name"], record["mode"], record["teleports"] > 0), record)
+    return tuple(best.values())
+
+
+def _filter_records(records, query) -> list[dict]:
+    modes = query.get("modes_list_string")
+    has_tp = query.get("has_teleports")
+    map_name = query.get("map_name")
+    result = [
+        record for record in records
+        if (not modes or record["mode"] == modes)
+        and (has_tp is None or (record["teleports"] > 0) == (has_tp == "true"))
+        and (not map_name or record["map_name"] == map_name)
+    ]
+    return result[:int(query.get("limit", 10000))]
+
+
+def _world_record(map_name: str, mode: str, has_tp: bool) -> dict:
+    holder = str(76561197960265728 + sum(map_name.encode()) * 7 % 50_000)
+    record = dict(fixtures.records(1, seed=_seed(map_name, mode, has_tp), steamid64=holder,
+                                   player_name=_player_name(holder))[0])
+    record.update(map_name=map_name, mode=mode, teleports=record["teleports"] if has_tp else 0, points=1000)
+    if has_tp and not record["teleports"]:
+        record["teleports"] = 3
+    return record
+
+
+def _rank(steamid64: str, mode: str) -> dict:
+    rng = random.Random(f"{steamid64}:{mode}")
+    return {
+        "steamid64": steamid64,
+        "mode": mode,
+        "rank": rng.randrange(1, 40_000),
+        "region_code": "CN",
+        "regional_rank": rng.randrange(1, 3_000),
+        "points": rng.randrange(0, 900_000),
+        "total_points_v2": rng.randrange(0, 900_000),
+        "rating": rng.uniform(0, 40),
+        "maps_easy_rating": rng.uniform(0, 40),
+        "maps_hard_rating": rng.uniform(0, 40),
+        "overall_wrs": rng.randrange(0, 20),
+        "pro_wrs": rng.randrange(0, 20),
+        "map_finished": rng.randrange(0, 900),
+        **{f"t{tier}_finishes": rng.randrange(0, 100) for tier in range(5, 9)},
+        "last_updated": datetime.now().strftime("%Y-%m-%dT%H:%M:%S"),
+        "differ": {},
+    }
+
+
+# Routes ----------------------------------------------------------------------------------------------
+
+routes = web.RouteTableDef()
+
+
+@routes.get("/kztimerglobal.com/api/v2.0/records/top")
+async def global_records_top(request: web.Request):
+    query = request.query
+    if steamid64 := _steamid64(query.get("steamid64", "")):
+        return web.json_response(_filter_records(player_records(steamid64), query))
+    if map_name := query.get("map_name"):
+        modes = query.get("modes_list_string", "kz_timer")
+        return web.json_response([_world_record(map_name, modes, query.get("has_teleports") == "true")])
+    return web.json_response([])
+
+
+@routes.get("/kztimerglobal.com/api/v2.0/records/top/recent")
+async def global_records_recent(request: web.Request):
+    query = request.query
+    if steamid64 := _steamid64(query.get("steamid64", "")):
+        since = query.get("created_since", "")
+        records = [r for r in player_records(steamid64) if r["created_on"] > since]
+        return web.json_response(_filter_records(records, query))
+    if map_name := query.get("map_name"):
+        modes = query.get("modes_list_string", "kz_timer")
+        return web.json_response([_world_record(map_name, modes, query.get("has_teleports") == "true")])
+    return web.json_response([])
+
+
+@routes.get("/kztimerglobal.com/api/v2.0/bans")
+async def global_bans(request: web.Request):
+    steamid64 = _steamid64(request.query.get("steamid64", ""))
+    if steamid64 and int(steamid64) % 50 == 0:
+        return web.json_response([{
+            "id": int(steamid64) % 100_000, "ban_type": "bhop_hack", "expires_on": "2099-01-01T00:00:00",
+            "steamid64": steamid64, "player_name": _player_name(steamid64), "steam_id": SteamID(steamid64).as_steam2,
+            "notes": "", "stats": "", "server_id": 1, "updated_by_id": "0",
+            "created_on": "2023-01-01T00:00:00", "updated_on": "2023-01-01T00:00:00",
+        }])
+    return web.json_response([])
+
+
+@routes.get("/kztimerglobal.com/api/v2.0/maps")
+async def global_maps(request: web.Request):
+    return web.json_response(fixtures.load_maps()[:int(request.query.get("limit", 2000))])
+
+
+@routes.route("*", "/api.gokz.top/api/v1/leaderboards/{steamid}")
+async def gokz_top_leaderboard(request: web.Request):
+    steamid64 = _steamid64(request.match_info["steamid"])
+    if steamid64 is None:
+        return web.json_response({"detail": "Player not found"}, status=404)
+    return web.json_response(_rank(steamid64, _mode(request.query.get("mode"))))
+
+
+@routes.get("/api.gokz.top/api/v1/players/{steamid}")
+async def gokz_top_player(request: web.Request):
+    steamid64 = _steamid64(request.match_info["steamid"])
+    if steamid64 is None:
+        return web.json_response({"detail": "Player not found"}, status=404)
+    return web.json_response({"steamid64": steamid64, "name": _player_name(steamid64), "alias": None})
+
+
+@routes.get("/api.gokz.top/api/v1/maps/reviews/summary")
+async def gokz_top_review_summary(request: web.Request):
+    map_name = request.query.get("map_name", "kz_lionharder")
+    rng = random.Random(map_name)
+    stars = {}
+    for aspect in ("overall", "visuals", "gameplay"):
+        stars[f"{aspect}_avg_stars"] = round(rng.uniform(1, 5), 2)
+        stars[f"{aspect}_count"] = rng.randrange(0, 300)
+    return web.json_response({"data": [{"map_name": map_name, "stars": stars, "comment_count": rng.randrange(0, 50)}]})
+
+
+@routes.get("/api.gokz.top/api/v1/maps/name/{map_name}")
+async def gokz_top_map(request: web.Request):
+    map_name = request.match_info["map_name"]
+    return web.json_response({"name": map_name, "authors": [{"name": "mapper", "alias": None}]})
+
+
+@routes.get("/api.gokz.top/api/v1/maps/{map_name}/comments")
+async def gokz_top_comments(request: web.Request):
+    rng = random.Random(request.match_info["map_name"])
+    comments = [{
+        "player_name": f"player{rng.randrange(100_000)}",
+        "comment": "gg",
+        "ratings": [{"aspect": "overall", "rating": rng.randrange(1, 6)}],
+        "created_at": "2024-01-01T00:00:00",
+    } for _ in range(rng.randrange(0, 10))]
+    return web.json_response({"count": len(comments), "data": comments})
+
+
+@routes.get("/api.gokz.top/leaderboard/search/{name}")
+async def gokz_top_search(request: web.Request):
+    name = request.match_info["name"]
+    return web.json_response([{"name": f"{name}{i}", "steamid": SteamID(76561198000000000 + i).as_steam2,
+                               "points": 10_000 - i} for i in range(5)])
+
+
+@routes.get("/api.gokz.top/records/top/{steamid}")
+async def gokz_top_records_top(request: web.Request):
+    steamid64 = _steamid64(request.match_info["steamid"])
+    if steamid64 is None:
+        return web.json_response({"detail": "Player not found"}, status=404)
+    return web.json_response(_filter_records(player_records(steamid64), {"modes_list_string": _mode(request.query.get("mode"))}))
+
+
+@routes.get("/api.gokz.top/records/{steamid}")
+async def gokz_top_records(request: web.Request):
+    steamid64 = _steamid64(request.match_info["steamid"])
+    if steamid64 is None:
+        return web.json_response({"detail": "Player not found"}, status=404)
+    mode = _mode(request.query.get("mode"))
+    if not (map_name := request.query.get("map_name")):
+        return web.json_response(_filter_records(player_records(steamid64), {"modes_list_string": mode}))
+    runs = fixtures.map_runs(int(steamid64) % 40, seed=_seed(steamid64, map_name))
+    steam_id, name = SteamID(steamid64).as_steam2, _player_name(steamid64)
+    return web.json_response([
+        {**run, "map_name": map_name, "mode": mode, "steam_id": steam_id, "player_name": name} for run in runs
+    ])
+
+
+@routes.get("/api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/")
+async def steam_summaries(request: web.Request):
+    players = []
+    for steamid64 in filter(None, map(_steamid64, request.query.get("steamids", "").split(","))):
+        players.append({
+            "steamid": steamid64, "communityvisibilitystate": 3, "profilestate": 1,
+            "personaname": _player_name(steamid64), "profileurl": f"https://steamcommunity.com/profiles/{steamid64}/",
+            "avatar": "", "avatarmedium": "", "avatarfull": "", "avatarhash": f"{int(steamid64):040x}"[-40:],
+            "personastate": 0, "timecreated": 1_300_000_000, "loccountrycode": "CN",
+        })
+    return web.json_response({"response": {"players": players}})
+
+
+@routes.get("/api.steampowered.com/ISteamUser/GetPlayerBans/v1/")
+async def steam_bans(request: web.Request):
+    players = []
+    for steamid64 in filter(None, map(_steamid64, request.query.get("steamids", "").split(","))):
+        banned = int(steamid64) % 50 == 0
+        players.append({
+            "SteamId": steamid64, "CommunityBanned": False, "VACBanned": banned,
+            "NumberOfVACBans": int(banned), "DaysSinceLastBan": 100 if banned else 0,
+            "NumberOfGameBans": 0, "EconomyBan": "none",
+        })
+    return web.json_response({"players": players})
+
+
+def _vanity_steamid64(vanity: str) -> str | None:
+    """Custom URLs starting with "none" are not taken; everything else maps to a stable account"""
+    if vanity.lower().startswith("none"):
+        return None
+    return str(76561198000000000 + _seed(vanity.lower()) % 1_000_000)
+
+
+@routes.get("/api.steampowered.com/ISteamUser/ResolveVanityURL/v1/")
+async def steam_resolve_vanity(request: web.Request):
+    steamid64 = _vanity_steamid64(request.query.get("vanityurl", ""))
+    if steamid64 is None:
+        return web.json_response({"response": {"success": 42, "message": "No match"}})
+    return web.json_response({"response": {"success": 1, "steamid": steamid64}})
+
+
+@routes.get("/steamcommunity.com/id/{vanity}/")
+async def steam_profile_xml(request: web.Request):
+    steamid64 = _vanity_steamid64(request.match_info["vanity"])
+    if steamid64 is None:
+        body = "<response><error><![CDATA[The specified profile could not be found.]]></error></response>"
+    else:
+        body = f"<profile><steamID64>{steamid64}</steamID64><steamID><![CDATA[{_player_name(steamid64)}]]></steamID></profile>"
+    return web.Response(text=f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>{body}', content_type="text/xml")
+
+
+@routes.post("/api.wmpvp.com/api/v2/csgo/pvpDetailDataStats")
+async def wmpvp_stats(request: web.Request):
+    body = await request.json()
+    rng = random.Random(f"{body.get('steamId64')}:{body.get('csgoSeasonId')}")
+    return web.json_response({"statusCode": 0, "data": {
+        "pvpScore": rng.randrange(800, 2600),
+        "historyPwRatings": [round(rng.uniform(0.5, 1.8), 2) for _ in range(rng.randrange(0, 30))],
+        "cnt": rng.randrange(0, 300), "winRate": round(rng.uniform(0.3, 0.7), 3),
+        "kills": rng.randrange(0, 9000), "deaths": rng.randrange(1, 9000),
+        "kd": round(rng.uniform(0.5, 1.8), 2), "adr": round(rng.uniform(50, 110), 1),
+        "rws": round(rng.uniform(5, 15), 2), "headShotRatio": round(rng.uniform(0.2, 0.7), 3),
+    }})
+
+
+@routes.get("/cdn.jsdelivr.net/gh/KZGlobalTeam/map-images@public/mediums/{image}")
+async def map_image(request: web.Request):
+    return web.Response(body=thumbnail(), content_type="image/jpeg", headers={"ETag": '"sim"'})
+
+
+# Fault injection -------------------------------------------------------------------------------------
+
+
+def make_app(faults: Faults | None = None) -> web.Application:
+    faults = faults or Faults()
+
+    @web.middleware
+    async def inject(request: web.Request, handler):
+        host = request.path.split("/", 2)[1]
+        request.app["requests"][host] += 1
+        rng = faults.rng
+        delay = max(0.0, faults.latency + rng.uniform(-faults.jitter, faults.jitter))
+        if faults.stall_rate and rng.random() < faults.stall_rate:
+            delay = faults.stall
+        if delay:
+            await asyncio.sleep(delay)
+        if host in faults.down or (faults.error_rate and rng.random() < faults.error_rate):
+            return web.json_response({"detail": "simulated outage"}, status=503)
+        if faults.throttle_rate and rng.random() < faults.throttle_rate:
+            return web.json_response({"detail": "simulated rate limit"}, status=429, headers={"Retry-After": "1"})
+        return await handler(request)
+
+    app = web.Application(middlewares=[inject])
+    app["faults"] = faults
+    app["requests"] = Counter()  # host -> requests received
+    app.add_routes(routes)
+    return app
+
+
+async def start(faults: Faults | None = None, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """Start the simulator in the running loop; returns the runner (runner.app["requests"] counts hits) and its base URL"""
+    runner = web.AppRunner(make_app(faults), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound = site._server.sockets[0].getsockname()[1]  # NOQA port 0 picks a free one
+    return runner, f"http://{host}:{bound}"
+
+
+class RedirectSession:
+    """
+    Wrap an aiohttp session so every request goes to the simulator at base_url instead.
+
+    Only the URL changes; callers still see their own host in it, so per-host state such as
+    throttles, breakers and metrics behaves as it would against the real APIs.
+    """
+
+    def __init__(self, session, base_url: str):
+        self._session = session
+        self._base_url = base_url.rstrip("/")
+
+    def _rewrite(self, url) -> str:
+        parts = urlsplit(str(url))
+        query = f"?{parts.query}" if parts.query else ""
+        return f"{self._base_url}/{parts.netloc}{parts.path}{query}"
+
+    def request(self, method, url, **kwargs):
+        return self._session.request(method, self._rewrite(url), **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def add_fault_options(parser: argparse.ArgumentParser):
+    group = parser.add_argument_group("fault injection")
+    group.add_argument("--latency", type=float, default=50, help="upstream latency in ms")
+    group.add_argument("--jitter", type=float, default=20, help="uniform +- jitter in ms")
+    group.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    group.add_argument("--throttle-rate", type=float, default=0.0, help="share answered with 429 + Retry-After")
+    group.add_argument("--stall-rate", type=float, default=0.0, help="share that hang for --stall seconds")
+    group.add_argument("--stall", type=float, default=30.0)
+    group.add_argument("--down", action="append", default=[], metavar="HOST", help="host that always answers 503")
+    group.add_argument("--seed", type=int, default=None)
+
+
+def faults_from_options(options) -> Faults:
+    return Faults(
+        latency=options.latency / 1000, jitter=options.jitter / 1000,
+        error_rate=options.error_rate, throttle_rate=options.throttle_rate,
+        stall_rate=options.stall_rate, stall=options.stall, down=set(options.down), seed=options.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.upstream_sim", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_fault_options(parser)
+    options = parser.parse_args()
+    web.run_app(make_app(faults_from_options(options)), host=options.host, port=options.port)
+
+
+if __name__ == "__main__":
+    main()
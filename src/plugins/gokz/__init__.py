@@ -3,10 +3,18 @@ from pathlib import Path
 import nonebot
 from nonebot import get_plugin_config
 from nonebot import logger
+from nonebot.adapters.qq import Bot
 from nonebot.log import default_format
 from nonebot.plugin import PluginMetadata
 
 from .config import Config
+from .api.helper import init_session, close_session
+from .core.loop_watchdog import start_loop_watchdog, stop_loop_watchdog
+from .core.map_catalog import load_map_catalog
+from .core.qq_media import reuse_uploaded_media, remember_uploaded_media
+from .core.kz.screenshot import start_browser_pool, stop_browser_pool
+from .db.db import create_db_and_tables, create_local_db_and_tables, close_engines
+from .db.rank_store import start_rank_refresher, stop_rank_refresher
 
 __plugin_meta__ = PluginMetadata(
     name="gokz",
@@ -18,6 +26,24 @@ __plugin_meta__ = PluginMetadata(
 config = get_plugin_config(Config)
 logger.add("error.log", level="ERROR", format=default_format, rotation="1 week")
 
+driver = nonebot.get_driver()
+driver.on_startup(create_db_and_tables)
+driver.on_startup(create_local_db_and_tables)
+driver.on_startup(init_session)
+driver.on_startup(load_map_catalog)
+driver.on_startup(start_browser_pool)
+driver.on_startup(start_loop_watchdog)
+driver.on_startup(start_rank_refresher)
+driver.on_shutdown(close_session)
+driver.on_shutdown(stop_browser_pool)
+driver.on_shutdown(stop_loop_watchdog)
+driver.on_shutdown(stop_rank_refresher)
+driver.on_shutdown(close_engines)
+
+# Upload each image once per group/user and reuse the returned file_info handle
+Bot.on_calling_api(reuse_uploaded_media)
+Bot.on_called_api(remember_uploaded_media)
+
 sub_plugins = nonebot.load_plugins(
     str(Path(__file__).parent.joinpath("plugins").resolve())
 )
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable
+from urllib.parse import urlsplit
+
+from nonebot import logger
+
+from ..config import (
+    BREAKER_WINDOW,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATIO,
+    BREAKER_SLOW_CALL,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_MAX_OPEN_SECONDS,
+)
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    Trips when at least BREAKER_FAILURE_RATIO of the last BREAKER_WINDOW calls failed or took longer
+    than BREAKER_SLOW_CALL seconds. While open every call fails fast; a background task probes the
+    upstream with backoff and closes the breaker on the first healthy answer, so no user request
+    has to be the guinea pig.
+    """
+
+    def __init__(self, host: str):
+        self.host = host
+        self.outcomes: deque[bool] = deque(maxlen=BREAKER_WINDOW)
+        self.opened_at: float | None = None
+        self.trips = 0
+        self.rejected = 0
+        self._probe_task: asyncio.Task | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.is_open:
+            self.rejected += 1
+            return False
+        return True
+
+    def record(self, ok: bool, latency: float, probe: Callable[[], Awaitable[bool]]):
+        """
+        Record a finished call.
+
+        Args:
+            ok: The upstream answered (anything but a network error, timeout or 5xx)
+            latency: Seconds the call took; slow calls count as failures
+            probe: Coroutine function checking upstream health, used if this call trips the breaker
+        """
+        if self.is_open:
+            return
+        self.outcomes.append(ok and latency < BREAKER_SLOW_CALL)
+        failures = self.outcomes.count(False)
+        if len(self.outcomes) >= BREAKER_MIN_CALLS and failures / len(self.outcomes) >= BREAKER_FAILURE_RATIO:
+            self._trip(probe)
+
+    def _trip(self, probe: Callable[[], Awaitable[bool]]):
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        logger.warning(f"Circuit for {self.host} opened after {self.outcomes.count(False)}/{len(self.outcomes)} bad calls")
+        self._probe_task = asyncio.create_task(self._probe_until_healthy(probe))
+
+    async def _probe_until_healthy(self, probe: Callable[[], Awaitable[bool]]):
+        delay = BREAKER_OPEN_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                healthy = await probe()
+            except Exception as e:
+                logger.debug(f"Probe of {self.host} failed: {e!r}")
+                healthy = False
+            if healthy:
+                break
+            delay = min(delay * 2, BREAKER_MAX_OPEN_SECONDS)
+        logger.info(f"Circuit for {self.host} closed after {time.monotonic() - self.opened_at:.0f}s")
+        self.outcomes.clear()
+        self.opened_at = None
+        self._probe_task = None
+
+    def stats(self) -> dict:
+        return {
+            "open": self.is_open,
+            "open_for": round(time.monotonic() - self.opened_at, 1) if self.is_open else 0,
+            "failures": self.outcomes.count(False),
+            "calls": len(self.outcomes),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(url: str) -> CircuitBreaker:
+    host = urlsplit(url).hostname or ""
+    breaker = _breakers.get(host)
+    if breaker is None:
+        breaker = _breakers[host] = CircuitBreaker(host)
+    return breaker
+
+
+def breaker_stats() -> dict[str, dict]:
+    return {host: breaker.stats() for host, breaker in _breakers.items()}
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+
+from ..config import RESPONSE_CACHE_MAX_BYTES
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    size: int
+
+
+def make_key(endpoint: str, params: dict | None = None) -> tuple:
+    """Build a hashable cache key from an endpoint and its query params"""
+    if not params:
+        return endpoint, ()
+    return endpoint, tuple(sorted((k, str(v)) for k, v in params.items()))
+
+
+def estimate_size(value: Any, sample: int = 20) -> int:
+    """
+    Roughly estimate the memory footprint of a JSON payload.
+
+    Large lists are sampled instead of fully serialised so that caching a
+    10k-record response does not cost a full json.dumps on the event loop.
+    """
+    try:
+        if isinstance(value, list) and len(value) > sample:
+            sampled = len(json.dumps(value[:sample], ensure_ascii=False))
+            return sampled * len(value) // sample
+        return len(json.dumps(value, ensure_ascii=False))
+    except (TypeError, ValueError):
+        return 1024
+
+
+class ResponseCache:
+    """
+    Async TTL + LRU cache for upstream API responses.
+
+    Concurrent lookups for the same key are coalesced: only the first caller
+    runs the fetcher, everyone else awaits the same in-flight task.
+    """
+
+    def __init__(self, max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry.value
+
+    def set(self, key: Hashable, value: Any, ttl: float):
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CacheEntry(value, time.monotonic() + ttl, size)
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes and self._entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+
+    def invalidate(self, predicate: Callable[[Hashable], bool] | None = None):
+        """Drop every entry, or only those whose key matches the predicate"""
+        for key in [k for k in self._entries if predicate is None or predicate(k)]:
+            self._remove(key)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetcher: Callable[[], Awaitable[Any]],
+        ttl: float,
+        cacheable: Callable[[Any], bool] = lambda v: v is not None,
+    ) -> Any:
+        """
+        Return the cached value for key, or run fetcher once and cache its result.
+
+        Args:
+            key: Cache key, see make_key
+            fetcher: Zero-argument coroutine function producing the value
+            ttl: Seconds the value stays fresh
+            cacheable: Predicate deciding whether a result may be cached (failures should not be)
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+
+        async def run():
+            try:
+                result = await fetcher()
+                if cacheable(result):
+                    self.set(key, result, ttl)
+                return result
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'inflight': len(self._inflight),
+            'hit_ratio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
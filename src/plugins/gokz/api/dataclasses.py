@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -68,3 +68,28 @@ class LeaderboardData:
             percentage=data.get('percentage'),
             steamid64=data.get('steamid64')
         )
+
+
+@dataclass
+class RecordBatch:
+    """
+    Result of a batched record query, keyed by (mode, has_tp).
+
+    A variant listed in `records` succeeded (its list may be empty, meaning no record);
+    a variant listed in `errors` failed upstream and its outcome is unknown.
+    """
+    records: dict[tuple[str, bool], list] = field(default_factory=dict)
+    errors: dict[tuple[str, bool], str] = field(default_factory=dict)
+
+    def get(self, mode: str, has_tp: bool) -> list | None:
+        return self.records.get((mode, has_tp))
+
+    def first(self, mode: str, has_tp: bool) -> dict | None:
+        records = self.records.get((mode, has_tp))
+        return records[0] if records else None
+
+    def failed(self, mode: str, has_tp: bool) -> bool:
+        return (mode, has_tp) in self.errors
+
+    def all_records(self) -> list:
+        return [record for records in self.records.values() for record in records]
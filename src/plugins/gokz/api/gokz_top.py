@@ -0,0 +1,34 @@
+from ..config import GOKZ_TOP_API_KEY
+from .helper import fetch_json
+
+GOKZ_TOP_API_URL = "https://api.gokz.top/api/v1"
+
+# Leaderboard GETs take the short mode names
+API_MODES = {
+    "kz_timer": "KZT",
+    "kz_simple": "SKZ",
+    "kz_vanilla": "VNL",
+}
+
+
+def auth_headers() -> dict:
+    return {"Authorization": f"Bearer {GOKZ_TOP_API_KEY}"} if GOKZ_TOP_API_KEY else {}
+
+
+async def fetch_rank(steamid, mode: str) -> dict | None:
+    """A player's leaderboard entry in one mode (full mode name), None on failure or error responses"""
+    data = await fetch_json(
+        f"{GOKZ_TOP_API_URL}/leaderboards/{steamid}",
+        params={"mode": API_MODES.get(mode, mode.upper())},
+        headers=auth_headers(),
+        timeout=30,
+    )
+    return data if isinstance(data, dict) and 'steamid64' in data else None
+
+
+async def fetch_player_name(steamid) -> str | None:
+    """Alias, or else name, of a gokz.top player"""
+    data = await fetch_json(f"{GOKZ_TOP_API_URL}/players/{steamid}", headers=auth_headers(), timeout=30)
+    if not isinstance(data, dict) or 'detail' in data:
+        return None
+    return data.get('alias') or data.get('name')
@@ -0,0 +1,115 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable
+from urllib.parse import urlsplit
+
+from nonebot import logger
+
+from ..config import (
+    HEDGE_PERCENTILE,
+    HEDGE_LATENCY_WINDOW,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_DEFAULT_DELAY,
+    HEDGE_MIN_DELAY,
+    HEDGE_MAX_DELAY,
+)
+
+_latencies: dict[str, deque[float]] = {}
+
+# Losing requests are left to finish so they still feed the breaker, latency window and stale cache
+_stragglers: set[asyncio.Future] = set()
+
+hedge_stats = {"primary": 0, "secondary": 0, "hedged": 0, "failed": 0}
+
+
+def observe_latency(url: str, seconds: float):
+    """Record how long a response from url's host took"""
+    host = urlsplit(url).hostname or ""
+    window = _latencies.get(host)
+    if window is None:
+        window = _latencies[host] = deque(maxlen=HEDGE_LATENCY_WINDOW)
+    window.append(seconds)
+
+
+def hedge_delay(url: str, percentile: float = HEDGE_PERCENTILE) -> float:
+    """
+    Seconds to give url's host before starting a backup request.
+
+    The given percentile of the host's recent latencies, clamped to [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY];
+    HEDGE_DEFAULT_DELAY until enough calls have been seen.
+    """
+    window = _latencies.get(urlsplit(url).hostname or "")
+    if not window or len(window) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    ordered = sorted(window)
+    value = ordered[min(len(ordered) - 1, int(percentile * len(ordered)))]
+    return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, value))
+
+
+def _outcome(task: asyncio.Future) -> Any:
+    try:
+        return task.result()
+    except Exception as e:
+        logger.warning(f"Hedged request failed: {e!r}")
+        return None
+
+
+def _let_finish(task: asyncio.Future):
+    if not task.done():
+        _stragglers.add(task)
+        task.add_done_callback(_stragglers.discard)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())  # keep unretrieved errors quiet
+
+
+async def hedged(
+    primary: Callable[[], Awaitable[Any]],
+    secondary: Callable[[], Awaitable[Any]],
+    delay: float,
+    accept: Callable[[Any], bool] = lambda v: v is not None,
+) -> Any:
+    """
+    Race two sources for the same answer, starting the backup only when the primary is slow.
+
+    The secondary starts after delay seconds, or as soon as the primary returns something unacceptable.
+    The first acceptable result wins.
+
+    Args:
+        primary: Zero-argument coroutine function for the preferred source
+        secondary: Zero-argument coroutine function for the backup source
+        delay: Seconds to wait for the primary alone, usually hedge_delay(primary_url)
+        accept: Whether a result is good enough to return
+
+    Returns:
+        The first accepted result; if neither is accepted, the primary's result unless it is None,
+        else the secondary's
+    """
+    first = asyncio.ensure_future(primary())
+    await asyncio.wait([first], timeout=delay)
+    if first.done():
+        result = _outcome(first)
+        if accept(result):
+            hedge_stats["primary"] += 1
+            return result
+
+    hedge_stats["hedged"] += 1
+    second = asyncio.ensure_future(secondary())
+    names = {first: "primary", second: "secondary"}
+    results = {}
+    pending = {task for task in names if not task.done()}
+    if first.done():
+        results["primary"] = _outcome(first)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = names[task]
+                results[name] = _outcome(task)
+                if accept(results[name]):
+                    hedge_stats[name] += 1
+                    return results[name]
+    finally:
+        for task in pending:
+            _let_finish(task)
+
+    hedge_stats["failed"] += 1
+    return results["primary"] if results.get("primary") is not None else results.get("secondary")
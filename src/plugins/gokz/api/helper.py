@@ -1,10 +1,196 @@
 import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import urlsplit
 
 import aiohttp
 from nonebot import logger
 
+from .breaker import get_breaker
+from .cache import ResponseCache, make_key
+from .hedge import observe_latency
+from .throttle import throttled, parse_retry_after, retry_delay, background_priority
+from ..core.metrics import record_upstream
+from ..config import (
+    STALE_CACHE_MAX_BYTES,
+    STALE_CACHE_MAX_AGE,
+    HTTP_MAX_RETRIES,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_KEEPALIVE_TIMEOUT,
+)
 
-async def fetch_json(*urls, params=None, timeout=15, headers=None):
+_session: aiohttp.ClientSession | None = None
+
+# Statuses worth retrying an idempotent GET for
+RETRY_STATUSES = {429, 502, 503, 504}
+
+# Last good response per request, served by fetch_json_swr while an upstream is down
+last_good = ResponseCache(max_bytes=STALE_CACHE_MAX_BYTES)
+
+
+@dataclass
+class Fetched:
+    """Result of fetch_json_swr; a stale result is a cached copy served because the upstream is down"""
+    data: Any
+    stale: bool = False
+    fetched_at: float | None = None
+    source: str = ""
+
+    @property
+    def age_minutes(self) -> int:
+        return int((time.time() - self.fetched_at) // 60) if self.fetched_at else 0
+
+    @property
+    def stale_note(self) -> str:
+        """Line to append to a reply built from this data, empty when it is fresh"""
+        if not self.stale:
+            return ""
+        return f"\n(接口暂时不可用，以下为{self.age_minutes}分钟前的缓存数据)"
+
+
+def make_timeout(timeout=HTTP_TIMEOUT) -> aiohttp.ClientTimeout:
+    return aiohttp.ClientTimeout(total=timeout, connect=min(HTTP_CONNECT_TIMEOUT, timeout))
+
+
+async def init_session() -> aiohttp.ClientSession:
+    """
+    Create the process-wide pooled HTTP session.
+
+    Registered on NoneBot startup. Connections are kept alive and pooled per host,
+    and DNS lookups are cached, so repeated API calls skip the TCP/TLS/DNS setup.
+    """
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _session = aiohttp.ClientSession(connector=connector, timeout=make_timeout())
+    return _session
+
+
+async def close_session():
+    """Close the shared HTTP session. Registered on NoneBot shutdown."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it lazily if startup hook has not run"""
+    if _session is None or _session.closed:
+        return await init_session()
+    return _session
+
+
+async def probe_url(url, params=None, headers=None) -> bool:
+    """Health check used by open circuit breakers: True if the host answers without a 5xx"""
+    try:
+        session = await get_session()
+        with background_priority():
+            async with throttled(url), session.get(url, params=params, headers=headers, timeout=make_timeout(10)) as response:
+                return response.status < 500
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return False
+
+
+def _record(breaker, method: str, status: int | str, latency: float, probe):
+    """Feed one request outcome (HTTP status, or 'error'/'timeout') to the host's breaker and the metrics"""
+    responded = isinstance(status, int)
+    breaker.record(responded and status < 500, latency, probe)
+    record_upstream(breaker.host, method, status, latency if responded else None)
+
+
+def host_probe(url):
+    """Probe for non-idempotent requests: check the host root instead of replaying the request"""
+    parts = urlsplit(url)
+    return lambda: probe_url(f"{parts.scheme}://{parts.netloc}/")
+
+
+async def _read_response(response, url):
+    if response.status == 200:
+        return await response.json()
+    # Try to parse error response as JSON to get detail message
+    try:
+        error_json = await response.json()
+        logger.warning(f"API request failed with status {response.status}: {url}, error: {error_json.get('detail', '')}")
+        return error_json  # Return error response so caller can check for 'detail'
+    except Exception:
+        # If JSON parsing fails, log and return None
+        error_text = await response.text()
+        logger.warning(f"API request failed with status {response.status}: {url}, error: {error_text}")
+        return None
+
+
+async def _get_json(url, params=None, timeout=HTTP_TIMEOUT, headers=None) -> tuple[int | None, Any]:
+    """
+    GET url through the host's rate limiter and circuit breaker, retrying transient failures.
+
+    timeout bounds the whole call: retries only start while time is left and get what remains of it,
+    and a timed out attempt is not retried since it has already used the budget up.
+
+    Returns:
+        (HTTP status, parsed body); status is None if no response was received or the circuit is open
+    """
+    breaker = get_breaker(url)
+    deadline = time.monotonic() + timeout
+
+    def probe():
+        return probe_url(url, params, headers)
+
+    def out_of_time(delay: float) -> bool:
+        return time.monotonic() + delay >= deadline
+
+    session = await get_session()
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        last_attempt = attempt == HTTP_MAX_RETRIES
+        if not breaker.allow():
+            logger.debug(f"Circuit open for {breaker.host}, not requesting {url}")
+            record_upstream(breaker.host, "GET", "circuit_open")
+            return None, None
+        attempt_timeout = timeout if attempt == 0 else deadline - time.monotonic()
+        start = time.monotonic()
+        try:
+            async with throttled(url) as limiter:
+                start = time.monotonic()
+                async with session.get(url, params=params, headers=headers, timeout=make_timeout(attempt_timeout)) as response:
+                    latency = time.monotonic() - start
+                    _record(breaker, "GET", response.status, latency, probe)
+                    observe_latency(url, latency)
+                    if response.status not in RETRY_STATUSES or last_attempt:
+                        return response.status, await _read_response(response, url)
+                    delay = retry_delay(attempt, parse_retry_after(response.headers.get('Retry-After')))
+                    if out_of_time(delay):
+                        return response.status, await _read_response(response, url)
+                    if response.status == 429:
+                        limiter.pause(delay)
+                    logger.warning(f"API request got {response.status}, retrying in {delay:.1f}s: {url}")
+        except aiohttp.ClientError as e:
+            _record(breaker, "GET", "error", time.monotonic() - start, probe)
+            delay = retry_delay(attempt)
+            if last_attempt or out_of_time(delay):
+                logger.error(f"Network error fetching {url}: {e}")
+                return None, None
+            logger.warning(f"Network error fetching {url}, retrying in {delay:.1f}s: {e}")
+        except asyncio.TimeoutError:
+            _record(breaker, "GET", "timeout", time.monotonic() - start, probe)
+            logger.error(f"Request timeout for {url}")
+            return None, None
+        except Exception as e:
+            logger.error(f"Unexpected error fetching {url}: {e}")
+            return None, None
+        await asyncio.sleep(delay)
+
+
+async def fetch_json(*urls, params=None, timeout=HTTP_TIMEOUT, headers=None):
     """
     Fetch JSON data from one or more URLs with error handling.
     
@@ -13,49 +199,50 @@ async def fetch_json(*urls, params=None, timeout=15, headers=None):
         params: Query parameters
         timeout: Request timeout in seconds
         headers: Optional headers dictionary
-    
+
+    Requests are rate limited per host, and 429/502/503/504 responses or network errors are
+    retried up to HTTP_MAX_RETRIES times with jittered backoff (or as long as Retry-After asks),
+    within timeout overall. Timeouts are not retried.
+    While a host's circuit breaker is open, requests to it fail immediately.
+
     Returns:
-        JSON data or None if request fails (network/timeout errors)
+        JSON data or None if request fails (network/timeout errors, open circuit)
         For non-200 status codes, returns the error response JSON if available
     """
-    async def fetch(session_, url_):
-        try:
-            async with session_.get(url_, params=params, headers=headers) as response:
-                if response.status == 200:
-                    return await response.json()
-                else:
-                    # Try to parse error response as JSON to get detail message
-                    try:
-                        error_json = await response.json()
-                        logger.warning(f"API request failed with status {response.status}: {url_}, error: {error_json.get('detail', '')}")
-                        return error_json  # Return error response so caller can check for 'detail'
-                    except Exception:
-                        # If JSON parsing fails, log and return None
-                        error_text = await response.text()
-                        logger.warning(f"API request failed with status {response.status}: {url_}, error: {error_text}")
-                        return None
-        except aiohttp.ClientError as e:
-            logger.error(f"Network error fetching {url_}: {e}")
-            return None
-        except asyncio.TimeoutError:
-            logger.error(f"Request timeout for {url_}")
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error fetching {url_}: {e}")
-            return None
+    async def fetch(url_):
+        _, data = await _get_json(url_, params, timeout, headers)
+        return data
 
     if len(urls) == 1:
-        url = urls[0]
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-            return await fetch(session, url)
+        return await fetch(urls[0])
     else:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-            tasks = [fetch(session, url) for url in urls]
-            responses = await asyncio.gather(*tasks)
-            return tuple(responses)
+        tasks = [fetch(url) for url in urls]
+        responses = await asyncio.gather(*tasks)
+        return tuple(responses)
 
 
-async def put_json(url, params=None, timeout=15, headers=None):
+async def fetch_json_swr(url, params=None, timeout=HTTP_TIMEOUT, headers=None) -> Fetched:
+    """
+    Like fetch_json, but fall back to the last good response for the same request when the
+    upstream is unreachable, erroring (5xx) or its circuit is open.
+
+    Returns:
+        Fetched with stale=True when the data came from the fallback copy
+    """
+    key = make_key(url, params)
+    status, data = await _get_json(url, params, timeout, headers)
+    if status == 200:
+        last_good.set(key, (data, time.time()), STALE_CACHE_MAX_AGE)
+        return Fetched(data)
+    if status is None or status >= 500:
+        cached = last_good.get(key)
+        if cached is not None:
+            logger.info(f"Serving stale response for {url}")
+            return Fetched(cached[0], stale=True, fetched_at=cached[1])
+    return Fetched(data)
+
+
+async def put_json(url, params=None, timeout=HTTP_TIMEOUT, headers=None):
     """
     Send PUT request to URL with error handling.
     
@@ -69,9 +256,18 @@ async def put_json(url, params=None, timeout=15, headers=None):
         JSON data or None if request fails (network/timeout errors)
         For non-200 status codes, returns the error response JSON if available
     """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        logger.debug(f"Circuit open for {breaker.host}, not requesting {url}")
+        record_upstream(breaker.host, "PUT", "circuit_open")
+        return None
+    start = time.monotonic()
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-            async with session.put(url, params=params, headers=headers) as response:
+        session = await get_session()
+        async with throttled(url):
+            start = time.monotonic()
+            async with session.put(url, params=params, headers=headers, timeout=make_timeout(timeout)) as response:
+                _record(breaker, "PUT", response.status, time.monotonic() - start, host_probe(url))
                 if response.status == 200:
                     return await response.json()
                 else:
@@ -86,9 +282,11 @@ async def put_json(url, params=None, timeout=15, headers=None):
                         logger.warning(f"API PUT request failed with status {response.status}: {url}, error: {error_text}")
                         return None
     except aiohttp.ClientError as e:
+        _record(breaker, "PUT", "error", time.monotonic() - start, host_probe(url))
         logger.error(f"Network error PUTting {url}: {e}")
         return None
     except asyncio.TimeoutError:
+        _record(breaker, "PUT", "timeout", time.monotonic() - start, host_probe(url))
         logger.error(f"PUT request timeout for {url}")
         return None
     except Exception as e:
@@ -96,7 +294,7 @@ async def put_json(url, params=None, timeout=15, headers=None):
         return None
 
 
-async def post_json(url, json_data=None, params=None, timeout=15, headers=None):
+async def post_json(url, json_data=None, params=None, timeout=HTTP_TIMEOUT, headers=None):
     """
     Send POST request to URL with error handling.
     
@@ -113,9 +311,18 @@ async def post_json(url, json_data=None, params=None, timeout=15, headers=None):
         - data: Response JSON data if successful, None otherwise
         - error: Error detail message if available, None otherwise
     """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        logger.debug(f"Circuit open for {breaker.host}, not requesting {url}")
+        record_upstream(breaker.host, "POST", "circuit_open")
+        return (False, None, None)
+    start = time.monotonic()
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
-            async with session.post(url, json=json_data, params=params, headers=headers) as response:
+        session = await get_session()
+        async with throttled(url):
+            start = time.monotonic()
+            async with session.post(url, json=json_data, params=params, headers=headers, timeout=make_timeout(timeout)) as response:
+                _record(breaker, "POST", response.status, time.monotonic() - start, host_probe(url))
                 if response.status in (200, 201):
                     return (True, await response.json(), None)
                 else:
@@ -131,9 +338,11 @@ async def post_json(url, json_data=None, params=None, timeout=15, headers=None):
                         logger.warning(f"API POST request failed with status {response.status}: {url}, error: {error_text}")
                         return (False, None, error_text)
     except aiohttp.ClientError as e:
+        _record(breaker, "POST", "error", time.monotonic() - start, host_probe(url))
         logger.error(f"Network error POSTing {url}: {e}")
         return (False, None, None)
     except asyncio.TimeoutError:
+        _record(breaker, "POST", "timeout", time.monotonic() - start, host_probe(url))
         logger.error(f"POST request timeout for {url}")
         return (False, None, None)
     except Exception as e:
@@ -1,29 +1,110 @@
-import json
-import subprocess
+import asyncio
 from datetime import datetime
-from pathlib import Path
+
+from nonebot import logger
 
 from src.plugins.gokz.core.kreedz import format_kzmode
 from src.plugins.gokz.core.steam_user import convert_steamid
-from ..api.helper import fetch_json
+from ..api.cache import response_cache, make_key
+from ..api.dataclasses import RecordBatch
+from ..api.helper import fetch_json, fetch_json_swr
 
 GLOBAL_API_URL = "https://kztimerglobal.com/api/v2.0/"
 
+# Seconds each Global API endpoint stays cached
+GLOBAL_API_TTL = {
+    'records/top/recent': 60,
+    'records/top': 120,
+    'bans': 1800,
+    'maps': 3600,
+}
+
+
+async def fetch_global_api(endpoint: str, params: dict | None = None):
+    """
+    GET a Global API endpoint through the shared response cache.
+
+    Identical concurrent requests share one upstream call; only list responses
+    are cached, so failures and error bodies are always retried. While the Global API
+    is down the last good response for the same query is returned.
+    """
+    async def fetcher():
+        return (await fetch_json_swr(f"{GLOBAL_API_URL}{endpoint}", params=params)).data
+
+    return await response_cache.get_or_fetch(
+        make_key(endpoint, params),
+        fetcher,
+        ttl=GLOBAL_API_TTL.get(endpoint, 60),
+        cacheable=lambda v: isinstance(v, list),
+    )
+
+
+async def fetch_map_list() -> list[dict] | None:
+    """Fetch the full Global API map list, bypassing the response cache"""
+    data = await fetch_json(f"{GLOBAL_API_URL}maps", params={'limit': 2000})
+    return data if isinstance(data, list) else None
+
+
+async def query_records(endpoint: str, params: dict, modes=('kz_timer',), tp_variants=(True, False)) -> RecordBatch:
+    """
+    Query every (mode, has_tp) variant of a Global API record endpoint concurrently.
+
+    Args:
+        endpoint: Global API endpoint, e.g. 'records/top'
+        params: Query params shared by all variants
+        modes: KZ modes in any format accepted by format_kzmode
+        tp_variants: Which has_teleports values to query
+
+    Returns:
+        RecordBatch keyed by (full mode name, has_tp); failed variants end up in `errors`
+    """
+    variants = [(format_kzmode(mode), has_tp) for mode in modes for has_tp in tp_variants]
+
+    async def query(mode, has_tp):
+        variant_params = {**params, 'modes_list_string': mode, 'has_teleports': str(has_tp).lower()}
+        return await fetch_global_api(endpoint, params=variant_params)
+
+    results = await asyncio.gather(*(query(*variant) for variant in variants), return_exceptions=True)
+
+    batch = RecordBatch()
+    for variant, result in zip(variants, results):
+        if isinstance(result, list):
+            batch.records[variant] = result
+        elif isinstance(result, BaseException):
+            batch.errors[variant] = repr(result)
+        elif isinstance(result, dict) and result.get('detail'):
+            batch.errors[variant] = str(result['detail'])
+        else:
+            batch.errors[variant] = 'request failed'
+    return batch
+
+
+async def fetch_global_stats_batch(steamid64, modes=('kz_timer',), tp_variants=(True, False)) -> RecordBatch:
+    params = {
+        'steamid64': convert_steamid(steamid64, 64),
+        'tickrate': 128,
+        'stage': 0,
+        'limit': 10000,
+    }
+    return await query_records('records/top', params, modes, tp_variants)
 
-async def update_map_data():
-    url = f"{GLOBAL_API_URL}maps?limit=2000"
-    save_path = Path("data/gokz_maps_data.json")
-    save_path.parent.mkdir(parents=True, exist_ok=True)
 
-    # fetch and save json
-    data = await fetch_json(url)
-    with save_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+async def fetch_personal_best_batch(steamid64, map_name, modes=('kz_timer',), tp_variants=(True, False)) -> RecordBatch:
+    params = {
+        'steamid64': str(convert_steamid(steamid64, 64)),
+        'map_name': map_name,
+        'stage': 0,
+    }
+    return await query_records('records/top', params, modes, tp_variants)
 
-    # git pull the map-images repo
-    repo_path = Path("data/map-images")
-    if repo_path.exists():
-        subprocess.run(["git", "pull"], cwd=repo_path, check=True)
+
+async def fetch_world_record_batch(map_name, modes=('kz_timer',), tp_variants=(True, False)) -> RecordBatch:
+    params = {
+        'map_name': map_name,
+        'stage': 0,
+        'place_top_at_least': 1,
+    }
+    return await query_records('records/top/recent', params, modes, tp_variants)
 
 
 async def fetch_global_stats(steamid64, mode_str, has_tp=True) -> list:
@@ -36,23 +117,31 @@ async def fetch_global_stats(steamid64, mode_str, has_tp=True) -> list:
         'limit': 10000,
         'has_teleports': str(has_tp).lower(),
     }
-    data = await fetch_json(f"{GLOBAL_API_URL}records/top", params=params)
+    data = await fetch_global_api('records/top', params=params)
     return data
 
 
-async def fetch_personal_recent(steamid64, mode='kzt'):
-    steamid64 = convert_steamid(steamid64, 64)
-    mode = format_kzmode(mode)
+async def fetch_player_records(steamid64, mode='kzt') -> list:
+    """All TP and PRO personal bests of a player, from the local mirror when possible"""
+    from ..db.record_store import get_player_records
 
-    data_with_tp = await fetch_global_stats(steamid64, mode, True)
-    data_without_tp = await fetch_global_stats(steamid64, mode, False)
-    data = data_with_tp + data_without_tp
+    data = await get_player_records(steamid64, mode)
+    if data is not None:
+        return data
 
-    for item in data:
-        item["created_on_datetime"] = datetime.fromisoformat(item["updated_on"])
-    sorted_data = sorted(data, key=lambda x: x["created_on_datetime"], reverse=True)
+    batch = await fetch_global_stats_batch(steamid64, (mode,))
+    if batch.errors:
+        logger.warning(f"fetch_player_records partial failure for {steamid64}: {batch.errors}")
+    return batch.all_records()
 
-    return sorted_data[0]
+
+async def fetch_personal_recent(steamid64, mode='kzt') -> dict | None:
+    data = await fetch_player_records(steamid64, mode)
+    if not data:
+        return None
+
+    # records are shared with the response cache, so don't mutate them
+    return max(data, key=lambda x: datetime.fromisoformat(x["updated_on"]))
 
 
 async def fetch_personal_best(steamid64, map_name, mode='kzt', has_tp=True):
@@ -67,8 +156,7 @@ async def fetch_personal_best(steamid64, map_name, mode='kzt', has_tp=True):
         'has_teleports': str(has_tp).lower()
     }
 
-    url = "https://kztimerglobal.com/api/v2.0/records/top"
-    data = await fetch_json(url, params=params)
+    data = await fetch_global_api('records/top', params=params)
     if data:
         return data[0]
     else:
@@ -82,8 +170,7 @@ async def fetch_personal_bans(steamid64):
         'steamid64': str(steamid64),
     }
 
-    url = "https://kztimerglobal.com/api/v2.0/bans"
-    data = await fetch_json(url, params=params)
+    data = await fetch_global_api('bans', params=params)
     if data:
         return data
     else:
@@ -100,7 +187,7 @@ async def fetch_world_record(map_name, mode='kzt', has_tp=True):
         'place_top_at_least': 1
     }
 
-    data = await fetch_json(f"{GLOBAL_API_URL}records/top/recent", params=params)
+    data = await fetch_global_api('records/top/recent', params=params)
     return data[0]
 
 
@@ -108,11 +195,7 @@ async def fetch_personal_purity(steamid64, mode='kzt', exclusive=False) -> dict:
     server_id = [1683, 1633, 1393]
 
     steamid64 = convert_steamid(steamid64, 64)
-    mode = format_kzmode(mode)
-
-    data_with_tp = await fetch_global_stats(steamid64, mode, True)
-    data_without_tp = await fetch_global_stats(steamid64, mode, False)
-    data = data_with_tp + data_without_tp
+    data = await fetch_player_records(steamid64, mode)
 
     maps = [f"{record['map_name']} {'TP' if record['teleports'] else 'PRO'}" for record in data if record['server_id'] != 1683]
 
@@ -1,6 +1,7 @@
 import time
 
-import aiohttp
+from .helper import get_session
+from .throttle import throttled
 
 
 async def fetch_cs2_stats(steamid: str, season: str = 'S20'):
@@ -15,7 +16,7 @@ async def fetch_cs2_stats(steamid: str, season: str = 'S20'):
         "csgoSeasonId": season
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            data = await response.json()
-            return data
+    session = await get_session()
+    async with throttled(url), session.post(url, headers=headers, json=payload) as response:
+        data = await response.json()
+        return data
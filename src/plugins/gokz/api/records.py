@@ -0,0 +1,110 @@
+from typing import Any
+
+from src.plugins.gokz.core.kreedz import format_kzmode
+from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.db.record_store import get_player_records
+from .helper import fetch_json_swr, Fetched
+from .hedge import hedged, hedge_delay
+from .kztimerglobal import fetch_global_stats_batch, fetch_personal_best_batch
+
+GOKZ_TOP_URL = "https://api.gokz.top/"
+
+# Record sources, as reported in Fetched.source
+GOKZ_TOP = "gokz.top"
+GLOBAL_API = "kztimerglobal"
+
+
+def normalize_record(record: dict, source: str) -> dict:
+    """
+    Bring a gokz.top or Global API record to one shape.
+
+    Both APIs return mostly the same fields; this fills the ones either may leave out, makes the mode
+    the full name and trims created_on to '%Y-%m-%dT%H:%M:%S' so callers can treat them alike.
+    """
+    steam_id = record.get('steam_id') or record.get('steamid')
+    steamid64 = record.get('steamid64')
+    if steam_id and not steamid64:
+        steamid64 = str(convert_steamid(steam_id, 64))
+    elif steamid64 and not steam_id:
+        steam_id = convert_steamid(steamid64)
+    try:
+        mode = format_kzmode(record.get('mode', 'kz_timer'))
+    except ValueError:
+        mode = record.get('mode')
+    created_on = record.get('created_on') or record.get('updated_on') or ''
+    return {
+        **record,
+        'player_name': record.get('player_name') or '未知玩家',
+        'steam_id': steam_id,
+        'steamid64': steamid64,
+        'server_name': record.get('server_name') or '未知服务器',
+        'mode': mode,
+        'teleports': record.get('teleports') or 0,
+        'points': record.get('points') or 0,
+        'created_on': created_on[:19],
+        'source': source,
+    }
+
+
+def normalize_records(data: Any, source: str) -> list[dict] | None:
+    """Normalise a list of records; anything else (error body, failure) becomes None"""
+    if not isinstance(data, list):
+        return None
+    return [normalize_record(record, source) for record in data]
+
+
+async def _gokz_top(url: str) -> Fetched:
+    fetched = await fetch_json_swr(url)
+    return Fetched(normalize_records(fetched.data, GOKZ_TOP), fetched.stale, fetched.fetched_at, GOKZ_TOP)
+
+
+def _batch_records(batch) -> list[dict] | None:
+    if batch.errors and not batch.records:
+        return None
+    return normalize_records([record for records in batch.records.values() for record in records], GLOBAL_API)
+
+
+def _fresh(fetched: Fetched | None) -> bool:
+    return fetched is not None and fetched.data is not None and not fetched.stale
+
+
+async def fetch_top_records(steamid, mode, all_records=False) -> Fetched:
+    """
+    A player's records for /ccf, from gokz.top with the Global API as a hedge.
+
+    Args:
+        all_records: Every run instead of personal bests (gokz.top only; the Global API still answers with bests)
+
+    Returns:
+        Fetched with normalised records, data None if both sources failed
+    """
+    path = 'records' if all_records else 'records/top'
+    url = f'{GOKZ_TOP_URL}{path}/{steamid}?mode={mode}'
+
+    async def global_api():
+        batch = await fetch_global_stats_batch(steamid, (mode,))
+        return Fetched(_batch_records(batch), source=GLOBAL_API)
+
+    return await hedged(lambda: _gokz_top(url), global_api, hedge_delay(url), accept=_fresh) or Fetched(None)
+
+
+async def fetch_map_progress(steamid, mode, map_name) -> Fetched:
+    """
+    A player's runs on one map for /mp, from gokz.top with the Global API as a hedge.
+
+    gokz.top has every run; the Global API (local mirror first) only has the TP and PRO personal bests.
+
+    Returns:
+        Fetched with normalised records, data None if both sources failed
+    """
+    url = f'{GOKZ_TOP_URL}records/{steamid}?mode={mode}&map_name={map_name}'
+
+    async def global_api():
+        records = await get_player_records(steamid, mode, map_name)
+        if records is None:
+            records = _batch_records(await fetch_personal_best_batch(steamid, map_name, (mode,)))
+        else:
+            records = normalize_records(records, GLOBAL_API)
+        return Fetched(records, source=GLOBAL_API)
+
+    return await hedged(lambda: _gokz_top(url), global_api, hedge_delay(url), accept=_fresh) or Fetched(None)
@@ -0,0 +1,152 @@
+import asyncio
+import re
+from typing import Callable
+
+import aiohttp
+
+from cachetools import TTLCache
+from nonebot import logger
+
+from ..config import (
+    STEAM_API_KEY, STEAM_BATCH_WINDOW, STEAM_BATCH_SIZE, STEAM_CACHE_SIZE, STEAM_SUMMARY_TTL, STEAM_BANS_TTL,
+)
+from .helper import _get_json, get_session, make_timeout  # NOQA
+from .throttle import throttled
+
+STEAM_API_URL = "https://api.steampowered.com/ISteamUser/"
+COMMUNITY_URL = "https://steamcommunity.com/"
+
+
+class SteamBatcher:
+    """
+    Coalesces lookups of one Steam Web API endpoint that takes a list of steamids.
+
+    Lookups arriving within STEAM_BATCH_WINDOW of each other share a single request of up to
+    STEAM_BATCH_SIZE ids (Steam's limit is 100), and an id already being fetched is not asked for
+    again. Results are cached per id, so a group-wide lookup of N players costs one request.
+    """
+
+    def __init__(self, endpoint: str, id_field: str, extract: Callable[[dict], list[dict]], ttl: float,
+                 window: float = STEAM_BATCH_WINDOW, batch_size: int = STEAM_BATCH_SIZE):
+        self.url = f"{STEAM_API_URL}{endpoint}"
+        self.id_field = id_field
+        self.extract = extract
+        self.window = window
+        self.batch_size = batch_size
+        self.cache: TTLCache[str, dict] = TTLCache(maxsize=STEAM_CACHE_SIZE, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._waiting: dict[str, asyncio.Future] = {}  # queued or in flight
+        self._pending: list[str] = []  # queued for the next request
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    def _enqueue(self, steamid64: str) -> asyncio.Future:
+        future = self._waiting.get(steamid64)
+        if future is not None:
+            return future
+        loop = asyncio.get_running_loop()
+        future = self._waiting[steamid64] = loop.create_future()
+        self._pending.append(steamid64)
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+            task = asyncio.create_task(self._fetch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, batch: list[str]):
+        players = {}
+        self.requests += 1
+        try:
+            status, data = await _get_json(self.url, params={"key": STEAM_API_KEY or "", "steamids": ",".join(batch)})
+            if status == 200:
+                players = {str(player[self.id_field]): player for player in self.extract(data)}
+            else:
+                logger.warning(f"Steam {self.url} failed for {len(batch)} ids: {status}")
+        except (KeyError, TypeError) as e:
+            logger.warning(f"Unexpected Steam response from {self.url}: {e!r}")
+        finally:
+            for steamid64 in batch:
+                future = self._waiting.pop(steamid64)
+                player = players.get(steamid64)
+                if player is not None:
+                    self.cache[steamid64] = player
+                if not future.done():
+                    future.set_result(player)
+
+    async def get_many(self, steamid64s) -> dict[str, dict | None]:
+        """steamid64 -> player entry, None for ids Steam did not return or when the request failed"""
+        result: dict[str, dict | None] = {}
+        waiting = {}
+        for steamid64 in map(str, steamid64s):
+            player = self.cache.get(steamid64)
+            if player is not None:
+                self.hits += 1
+                result[steamid64] = player
+            elif steamid64 not in waiting:
+                self.misses += 1
+                waiting[steamid64] = self._enqueue(steamid64)
+        if waiting:
+            # shielded: one caller giving up must not cancel the result for everyone sharing the batch
+            players = await asyncio.gather(*(asyncio.shield(future) for future in waiting.values()))
+            result.update(zip(waiting, players))
+        return result
+
+    async def get(self, steamid64) -> dict | None:
+        return (await self.get_many((steamid64,)))[str(steamid64)]
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "requests": self.requests, "cached": len(self.cache)}
+
+
+# Summaries change rarely; `avatarhash` is part of every entry, so anything derived from the avatar
+# can be cached under that hash and survive summary refreshes
+player_summaries = SteamBatcher(
+    "GetPlayerSummaries/v2/", "steamid", lambda data: data["response"]["players"], STEAM_SUMMARY_TTL,
+)
+player_bans = SteamBatcher(
+    "GetPlayerBans/v1/", "SteamId", lambda data: data["players"], STEAM_BANS_TTL,
+)
+
+
+async def _resolve_from_profile(vanity: str) -> str | None:
+    url = f"{COMMUNITY_URL}id/{vanity}/?xml=1"
+    try:
+        session = await get_session()
+        async with throttled(url), session.get(url, timeout=make_timeout(10)) as response:
+            text = await response.text()
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"Failed to read Steam profile {vanity}: {e!r}")
+        return None
+    match = re.search(r"<steamID64>(\d+)</steamID64>", text)
+    return match.group(1) if match else None
+
+
+async def resolve_vanity_url(vanity: str) -> str | None:
+    """
+    steamid64 behind a steamcommunity.com/id/<vanity> custom URL.
+
+    Uses ResolveVanityURL, or the public profile XML when no API key is configured.
+
+    Returns:
+        steamid64, or None if the URL is not taken or Steam could not be reached
+    """
+    if not STEAM_API_KEY:
+        return await _resolve_from_profile(vanity)
+    status, data = await _get_json(f"{STEAM_API_URL}ResolveVanityURL/v1/", params={"key": STEAM_API_KEY, "vanityurl": vanity})
+    if status != 200 or not isinstance(data, dict):
+        logger.warning(f"ResolveVanityURL failed for {vanity}: {status}")
+        return None
+    response = data.get("response", {})
+    return response.get("steamid") if response.get("success") == 1 else None
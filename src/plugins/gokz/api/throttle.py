@@ -0,0 +1,161 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from urllib.parse import urlsplit
+
+from ..config import HTTP_HOST_LIMITS, HTTP_RETRY_BASE_DELAY, HTTP_RETRY_MAX_DELAY
+
+
+class Priority(IntEnum):
+    """Lower runs first when requests to a host are queued"""
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def background_priority():
+    """Run requests made in this block (and tasks it starts) behind interactive commands"""
+    token = request_priority.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        request_priority.reset(token)
+
+
+class HostLimiter:
+    """
+    Token bucket plus concurrency cap for one upstream host.
+
+    Waiters are served in priority order, FIFO within a priority. A Retry-After from the host
+    pauses every queued request, not just the one that got it.
+    """
+
+    def __init__(self, host: str, rate: float, burst: int, concurrency: int):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.active = 0
+        self.blocked_until = 0.0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _schedule(self, delay: float):
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        self._refill(now)
+        while self._waiters:
+            *_, future = self._waiters[0]
+            if future.done():  # cancelled while queued
+                heapq.heappop(self._waiters)
+                continue
+            if self.active >= self.concurrency:
+                return  # release() dispatches again
+            if now < self.blocked_until:
+                self._schedule(self.blocked_until - now)
+                return
+            if self.tokens < 1:
+                self._schedule((1 - self.tokens) / self.rate)
+                return
+            heapq.heappop(self._waiters)
+            self.tokens -= 1
+            self.active += 1
+            future.set_result(None)
+
+    async def acquire(self, priority: Priority = Priority.INTERACTIVE):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # got the slot just as we were cancelled
+            raise
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def pause(self, delay: float):
+        """Hold every request to this host for delay seconds"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": sum(1 for *_, future in self._waiters if not future.done()),
+            "tokens": round(self.tokens, 2),
+            "paused": max(0.0, round(self.blocked_until - time.monotonic(), 2)),
+        }
+
+
+_limiters: dict[str, HostLimiter] = {}
+
+
+def get_limiter(url: str) -> HostLimiter:
+    host = urlsplit(url).hostname or ""
+    limiter = _limiters.get(host)
+    if limiter is None:
+        rate, burst, concurrency = HTTP_HOST_LIMITS.get(host, HTTP_HOST_LIMITS["default"])
+        limiter = _limiters[host] = HostLimiter(host, rate, burst, concurrency)
+    return limiter
+
+
+@asynccontextmanager
+async def throttled(url: str):
+    """Hold a rate-limited, concurrency-capped slot for url's host for the duration of a request"""
+    limiter = get_limiter(url)
+    await limiter.acquire(request_priority.get())
+    try:
+        yield limiter
+    finally:
+        limiter.release()
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Delay before retry number attempt (0-based): Retry-After if given, else full-jitter exponential backoff"""
+    if retry_after is not None:
+        return min(retry_after, HTTP_RETRY_MAX_DELAY)
+    return random.uniform(0, min(HTTP_RETRY_MAX_DELAY, HTTP_RETRY_BASE_DELAY * 2 ** attempt))
+
+
+def limiter_stats() -> dict[str, dict]:
+    return {host: limiter.stats() for host, limiter in _limiters.items()}
@@ -1,3 +1,4 @@
+import json
 import os
 
 from pydantic import BaseModel
@@ -10,6 +11,110 @@ GOKZ_TOP_API_KEY = os.getenv("GOKZ_TOP_API_KEY", "")
 QQ_BOT_SECRET = os.getenv("qq_bot_secret", "")
 ENABLE_DIRECT_STEAM_BINDING = os.getenv("enable_direct_steam_binding", "").lower() in ("true", "1", "yes")
 
+# Shared outbound HTTP connection pool
+HTTP_TIMEOUT = float(os.getenv("http_timeout", "15"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("http_connect_timeout", "5"))
+HTTP_POOL_LIMIT = int(os.getenv("http_pool_limit", "100"))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("http_pool_limit_per_host", "20"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("http_dns_cache_ttl", "300"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("http_keepalive_timeout", "60"))
+
+# Per-host (requests/second, burst, max concurrent requests); extend or override with a JSON object in http_host_limits
+HTTP_HOST_LIMITS = {
+    "default": (10, 20, 10),
+    "kztimerglobal.com": (8, 16, 8),
+    "api.gokz.top": (5, 10, 5),
+    "api.steampowered.com": (5, 10, 5),
+    "api.wmpvp.com": (2, 4, 2),
+    **{host: tuple(limit) for host, limit in json.loads(os.getenv("http_host_limits", "{}")).items()},
+}
+HTTP_MAX_RETRIES = int(os.getenv("http_max_retries", "3"))
+HTTP_RETRY_BASE_DELAY = float(os.getenv("http_retry_base_delay", "0.5"))
+HTTP_RETRY_MAX_DELAY = float(os.getenv("http_retry_max_delay", "10"))
+
+# Per-host circuit breakers, and the last good responses served while one is open
+BREAKER_WINDOW = int(os.getenv("breaker_window", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("breaker_min_calls", "5"))
+BREAKER_FAILURE_RATIO = float(os.getenv("breaker_failure_ratio", "0.5"))
+BREAKER_SLOW_CALL = float(os.getenv("breaker_slow_call", "10"))
+BREAKER_OPEN_SECONDS = float(os.getenv("breaker_open_seconds", "15"))
+BREAKER_MAX_OPEN_SECONDS = float(os.getenv("breaker_max_open_seconds", "300"))
+STALE_CACHE_MAX_BYTES = int(os.getenv("stale_cache_max_bytes", str(32 * 1024 * 1024)))
+STALE_CACHE_MAX_AGE = int(os.getenv("stale_cache_max_age", str(3 * 86400)))
+
+# Hedged requests: start the backup source once the primary is slower than this percentile of its recent calls
+HEDGE_PERCENTILE = float(os.getenv("hedge_percentile", "0.9"))
+HEDGE_LATENCY_WINDOW = int(os.getenv("hedge_latency_window", "200"))
+HEDGE_MIN_SAMPLES = int(os.getenv("hedge_min_samples", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("hedge_default_delay", "2"))
+HEDGE_MIN_DELAY = float(os.getenv("hedge_min_delay", "0.3"))
+HEDGE_MAX_DELAY = float(os.getenv("hedge_max_delay", "5"))
+
+# Prometheus endpoint on the ASGI server driver (FastAPI), empty to disable
+METRICS_PATH = os.getenv("metrics_path", "/metrics")
+
+# Event loop watchdog: heartbeat period, and the lag (seconds) reported as a block; 0 disables it
+LOOP_LAG_INTERVAL = float(os.getenv("loop_lag_interval", "0.1"))
+LOOP_LAG_THRESHOLD = float(os.getenv("loop_lag_threshold", "0.2"))
+
+# /profile sampler; runs are capped so the result still fits QQ's 5 minute passive reply window
+PROFILE_INTERVAL = float(os.getenv("profile_interval", "0.01"))
+PROFILE_MAX_SECONDS = int(os.getenv("profile_max_seconds", "240"))
+
+# Upstream response cache
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("response_cache_max_bytes", str(64 * 1024 * 1024)))
+
+# Local Global API record mirror
+RECORD_STORE_MAX_AGE = int(os.getenv("record_store_max_age", "300"))
+RECORD_STORE_FULL_SYNC_INTERVAL = int(os.getenv("record_store_full_sync_interval", "86400"))
+
+# Headless Chrome pool for /kz screenshots
+SCREENSHOT_POOL_SIZE = int(os.getenv("screenshot_pool_size", "2"))
+SCREENSHOT_MAX_RENDERS = int(os.getenv("screenshot_max_renders", "50"))
+SCREENSHOT_MEMORY_LIMIT_MB = float(os.getenv("screenshot_memory_limit_mb", "1024"))
+SCREENSHOT_DEADLINE = float(os.getenv("screenshot_deadline", "45"))
+SCREENSHOT_POOL_WARM = os.getenv("screenshot_pool_warm", "true").lower() in ("true", "1", "yes")
+
+# Font used by the native /kz card renderer, should cover CJK player names
+CARD_FONT_PATH = os.getenv("card_font_path", "")
+
+# Background refresh of bound users' api.gokz.top leaderboard entries, which /rank answers from
+RANK_MAX_AGE = int(os.getenv("rank_max_age", str(6 * 3600)))
+RANK_REFRESH_INTERVAL = int(os.getenv("rank_refresh_interval", "600"))  # 0 disables the refresher
+RANK_REFRESH_PER_CYCLE = int(os.getenv("rank_refresh_per_cycle", "200"))
+RANK_REFRESH_CONCURRENCY = int(os.getenv("rank_refresh_concurrency", "4"))
+RANK_UPSERT_BATCH = int(os.getenv("rank_upsert_batch", "500"))
+# Players whose lookup failed or who have no entry in a mode are not asked for again for this long
+RANK_MISSING_TTL = int(os.getenv("rank_missing_ttl", "3600"))
+
+# Group members recorded from group @ messages; last_seen is rewritten at most once per TTL
+GROUP_MEMBER_CACHE_SIZE = int(os.getenv("group_member_cache_size", "65536"))
+GROUP_MEMBER_SEEN_TTL = int(os.getenv("group_member_seen_ttl", "86400"))
+
+# In-memory cache of qqbot_users bindings
+USER_CACHE_SIZE = int(os.getenv("user_cache_size", "4096"))
+USER_CACHE_TTL = int(os.getenv("user_cache_ttl", "600"))
+
+# Steam Web API lookups: concurrent ones within the window share a request of up to 100 ids
+STEAM_BATCH_WINDOW = float(os.getenv("steam_batch_window", "0.05"))
+STEAM_BATCH_SIZE = min(int(os.getenv("steam_batch_size", "100")), 100)
+STEAM_CACHE_SIZE = int(os.getenv("steam_cache_size", "8192"))
+STEAM_SUMMARY_TTL = int(os.getenv("steam_summary_ttl", "3600"))
+STEAM_BANS_TTL = int(os.getenv("steam_bans_ttl", "21600"))
+# Parsed SteamIDs kept in memory, and how long a resolved custom profile URL is trusted (owners can change it)
+STEAMID_CACHE_SIZE = int(os.getenv("steamid_cache_size", "16384"))
+STEAM_VANITY_TTL = int(os.getenv("steam_vanity_ttl", str(30 * 86400)))
+
+# Map thumbnail cache
+MAP_IMAGE_MEMORY_CACHE_BYTES = int(os.getenv("map_image_memory_cache_bytes", str(32 * 1024 * 1024)))
+MAP_IMAGE_DISK_LIMIT_BYTES = int(os.getenv("map_image_disk_limit_bytes", str(512 * 1024 * 1024)))
+MAP_IMAGE_REFRESH_INTERVAL = int(os.getenv("map_image_refresh_interval", str(7 * 86400)))
+MAP_IMAGE_MISSING_TTL = int(os.getenv("map_image_missing_ttl", "21600"))
+
+# Uploaded QQ rich-media handles, reused per target until they expire
+MEDIA_CACHE_SIZE = int(os.getenv("media_cache_size", "2048"))
+MEDIA_CACHE_MAX_TTL = int(os.getenv("media_cache_max_ttl", "86400"))
+
 
 class Config(BaseModel):
     """Plugin Config Here"""
@@ -5,10 +5,7 @@ from dataclasses import dataclass, field, asdict
 from typing import Optional, Tuple
 from pathlib import Path
 
-from sqlmodel import Session
-
-from src.plugins.gokz.db.db import engine
-from src.plugins.gokz.db.models import User
+from src.plugins.gokz.db.user_cache import get_user
 from src.plugins.gokz.core.kreedz import format_kzmode
 from src.plugins.gokz.core.steam_user import convert_steamid
 
@@ -26,39 +23,49 @@ class CommandData:
     error_image: Optional[Path] = None
 
     def __init__(self, event, args):
+        """Parse the command arguments. Use `await CommandData.create(...)` to also resolve the users."""
         self.qid = event.get_user_id()
-        parsed_args = parse_args(args.extract_plain_text())
-        if 'error' in parsed_args:
-            self.error = parsed_args['error']
+        self._parsed_args = parse_args(args.extract_plain_text())
+        if 'error' in self._parsed_args:
+            self.error = self._parsed_args['error']
             print(f"Error during argument parsing: {self.error}")
             return
 
-        with Session(engine) as session:
-            user = session.get(User, self.qid)  # NOQA
+        self._target_qid = self._parsed_args.get('qid')
+        if not self._target_qid:
+            at_msg = event.get_message().copy()
+            for segment in at_msg:
+                if segment.type == 'at':
+                    self._target_qid = segment.data['qq']
+                    break
+
+    @classmethod
+    async def create(cls, event, args) -> "CommandData":
+        cd = cls(event, args)
+        if not cd.error:
+            await cd._resolve_users()
+        return cd
+
+    async def _resolve_users(self):
+        parsed_args = self._parsed_args
+        user = await get_user(self.qid)
+
+        if not user or not user.steamid:
+            self.error = '客服小祥温馨提示您: 请先 /bind'
+            self.error_image = Path('data/img/binding.png')
+            print(self.error)
+            return
 
-            if not user or not user.steamid:
-                self.error = '客服小祥温馨提示您: 请先 /bind'
-                self.error_image = Path('data/img/binding.png')
-                print(self.error)
+        if self._target_qid:
+            user2 = await get_user(self._target_qid)
+            if not user2 or not user2.steamid:
+                self.error = "你指定的用户未绑定steamid"
                 return
-
-            qid = parsed_args.get('qid')
-            if not qid:
-                at_msg = event.get_message().copy()
-                for segment in at_msg:
-                    if segment.type == 'at':
-                        qid = segment.data['qq']
-                        break
-
-            if qid:
-                user2 = session.get(User, qid)
-                if not user2 or not user2.steamid:
-                    self.error = "你指定的用户未绑定steamid"
-                self.steamid = user2.steamid
-                self.steamid2 = user.steamid
-            else:
-                self.steamid = parsed_args.get('steamid') if parsed_args.get('steamid') else user.steamid
-                self.steamid2 = user.steamid if parsed_args.get('steamid') else None
+            self.steamid = user2.steamid
+            self.steamid2 = user.steamid
+        else:
+            self.steamid = parsed_args.get('steamid') if parsed_args.get('steamid') else user.steamid
+            self.steamid2 = user.steamid if parsed_args.get('steamid') else None
 
         self.mode = format_kzmode(parsed_args.get('mode', user.mode)) if parsed_args.get('mode') else user.mode
         self.map_name = parsed_args.get('map_name', "")
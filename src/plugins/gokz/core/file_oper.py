@@ -1,5 +1,7 @@
 import os
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 
 
 def check_last_modified_date(filepath):
@@ -9,3 +11,9 @@ def check_last_modified_date(filepath):
         return last_modified_date
     else:
         return None
+
+
+@lru_cache(maxsize=32)
+def read_static_image(path: Path) -> bytes:
+    """Bytes of a bundled image (help, binding guide), read from disk once"""
+    return path.read_bytes()
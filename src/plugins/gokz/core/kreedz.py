@@ -1,6 +1,4 @@
-import difflib
-
-from src.plugins.gokz.core.config import MAP_TIERS
+from src.plugins.gokz.core.map_catalog import map_catalog
 
 
 def format_kzmode(mode, form="full") -> int | str:
@@ -73,21 +71,12 @@ def format_runtime(time: float, cn=False) -> str:
 
 
 def search_map(map_name, threshold=0.2) -> list:
-    # First check for exact or substring matches
-    exact_or_substring_matches = [
-        map_ for map_ in MAP_TIERS.keys() if map_name in map_
-    ]
-
-    # If exact or substring matches are found, return them sorted by proximity
-    if exact_or_substring_matches:
-        exact_or_substring_matches.sort(key=lambda x: (x != map_name, x))
-        return exact_or_substring_matches
-
-    # If no exact or substring matches are found, use difflib to find similar matches
-    similar_matches = difflib.get_close_matches(
-        map_name, MAP_TIERS.keys(), n=5, cutoff=threshold
-    )
-    return similar_matches
+    """
+    Find maps by name, ranked exact > prefix > token > substring, falling back to fuzzy matches.
+
+    Prefixes such as kz_ can be left out, e.g. "lionharder" finds kz_lionharder.
+    """
+    return map_catalog.search(map_name, cutoff=threshold)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,238 @@
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+import psutil
+from nonebot import logger
+from selenium import webdriver
+from selenium.common.exceptions import TimeoutException, WebDriverException
+from selenium.webdriver.support.wait import WebDriverWait
+
+from src.plugins.gokz.core.metrics import render_latency
+from src.plugins.gokz.config import (
+    SCREENSHOT_POOL_SIZE,
+    SCREENSHOT_MAX_RENDERS,
+    SCREENSHOT_MEMORY_LIMIT_MB,
+    SCREENSHOT_DEADLINE,
+)
+
+ReadyCondition = Callable[[webdriver.Chrome], object]
+
+# document loaded, images decoded, web fonts ready and no finite CSS animation/transition still running
+PAGE_SETTLED_JS = """
+return document.readyState === 'complete'
+    && Array.from(document.images).every(img => img.complete)
+    && (!document.fonts || document.fonts.status === 'loaded')
+    && (!document.getAnimations || document.getAnimations().every(
+        a => a.playState !== 'running' || a.effect.getTiming().iterations === Infinity))
+"""
+
+
+def page_settled(driver: webdriver.Chrome) -> bool:
+    return bool(driver.execute_script(PAGE_SETTLED_JS))
+
+
+def _launch_chrome() -> webdriver.Chrome:
+    options = webdriver.ChromeOptions()
+    options.add_argument("--headless")  # Run Chrome in headless mode
+    options.add_argument("--no-sandbox")  # Bypass OS security model
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument("--disable-gpu")
+    return webdriver.Chrome(options=options)
+
+
+class PooledBrowser:
+    def __init__(self):
+        self.driver = _launch_chrome()
+        self.renders = 0
+        self.created_at = time.monotonic()
+
+    def memory_mb(self) -> float:
+        """Resident memory of chromedriver and every Chrome process it spawned"""
+        try:
+            root = psutil.Process(self.driver.service.process.pid)
+            processes = [root] + root.children(recursive=True)
+            return sum(p.memory_info().rss for p in processes) / 1024 / 1024
+        except (psutil.Error, AttributeError):
+            return 0.0
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting pooled Chrome: {e}")
+
+
+class BrowserPool:
+    """
+    Keeps a fixed number of warm headless Chrome instances for screenshots.
+
+    Renders are blocking and meant to run in a worker thread. A browser is reused
+    (same tab, navigated to the next page) until it has served `max_renders` pages
+    or grown past `memory_limit_mb`, then it is replaced with a fresh one.
+    """
+
+    def __init__(
+        self,
+        size: int = SCREENSHOT_POOL_SIZE,
+        max_renders: int = SCREENSHOT_MAX_RENDERS,
+        memory_limit_mb: float = SCREENSHOT_MEMORY_LIMIT_MB,
+        deadline: float = SCREENSHOT_DEADLINE,
+    ):
+        self.size = size
+        self.max_renders = max_renders
+        self.memory_limit_mb = memory_limit_mb
+        self.deadline = deadline
+        self._idle: queue.LifoQueue[PooledBrowser] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.render_times: deque[float] = deque(maxlen=500)
+        self.renders = 0
+        self.failures = 0
+        self.launches = 0
+        self.recycles = 0
+        self.waiting = 0
+
+    def warm(self):
+        """Launch browsers until every slot has an idle instance"""
+        while self._idle.qsize() < self.size and not self._closed:
+            self._idle.put(self._launch())
+        logger.info(f"Screenshot browser pool warmed with {self._idle.qsize()} Chrome instance(s)")
+
+    def _launch(self) -> PooledBrowser:
+        with self._lock:
+            self.launches += 1
+        return PooledBrowser()
+
+    def _acquire(self, timeout: float) -> PooledBrowser:
+        with self._lock:
+            self.waiting += 1
+        try:
+            if not self._slots.acquire(timeout=timeout):
+                raise TimeoutError("No screenshot browser became available before the deadline")
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._launch()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def _release(self, browser: PooledBrowser, broken: bool = False):
+        try:
+            retire = (
+                broken
+                or self._closed
+                or browser.renders >= self.max_renders
+                or browser.memory_mb() > self.memory_limit_mb
+            )
+            if retire:
+                with self._lock:
+                    self.recycles += 1
+                browser.quit()
+            else:
+                try:
+                    browser.driver.get("about:blank")
+                    self._idle.put(browser)
+                except WebDriverException:
+                    browser.quit()
+        finally:
+            self._slots.release()
+
+    def render(
+        self,
+        url: str,
+        window_size: tuple[int, int],
+        ready: list[ReadyCondition] = (),
+        deadline: float | None = None,
+        optional: list[ReadyCondition] = (),
+        optional_timeout: float = 3,
+    ) -> bytes:
+        """
+        Load url in a pooled browser and return a PNG screenshot once the page is ready.
+
+        Args:
+            url: Page to render
+            window_size: (width, height) of the viewport
+            ready: Extra WebDriverWait conditions that must hold before the screenshot,
+                checked in order after the page has loaded
+            deadline: Seconds the whole job may take, including waiting for a free browser
+            optional: Conditions waited for after `ready`, up to optional_timeout seconds each;
+                content that may legitimately be absent, so a timeout is not an error
+            optional_timeout: Seconds to wait for each optional condition
+        """
+        deadline = deadline or self.deadline
+        end = time.monotonic() + deadline
+        browser = self._acquire(deadline)
+        broken = False
+        start = time.monotonic()
+        try:
+            driver = browser.driver
+            driver.set_window_size(*window_size)
+            driver.set_page_load_timeout(max(end - time.monotonic(), 1))
+            driver.get(url)
+
+            for condition in ready:
+                WebDriverWait(driver, max(end - time.monotonic(), 0.1), poll_frequency=0.1).until(condition)
+            for condition in optional:
+                try:
+                    timeout = min(optional_timeout, max(end - time.monotonic(), 0.1))
+                    WebDriverWait(driver, timeout, poll_frequency=0.1).until(condition)
+                except TimeoutException:
+                    pass
+            WebDriverWait(driver, max(end - time.monotonic(), 0.1), poll_frequency=0.1).until(page_settled)
+
+            png = driver.get_screenshot_as_png()
+            browser.renders += 1
+            elapsed = time.monotonic() - start
+            with self._lock:
+                self.renders += 1
+                self.render_times.append(elapsed)
+            render_latency.observe(elapsed, outcome="ok")
+            return png
+        except Exception:
+            broken = True
+            with self._lock:
+                self.failures += 1
+            render_latency.observe(time.monotonic() - start, outcome="error")
+            raise
+        finally:
+            self._release(browser, broken)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().quit()
+            except queue.Empty:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            times = sorted(self.render_times)
+
+        def percentile(p):
+            return times[min(int(len(times) * p), len(times) - 1)] if times else 0.0
+
+        return {
+            'size': self.size,
+            'idle': self._idle.qsize(),
+            'waiting': self.waiting,
+            'renders': self.renders,
+            'failures': self.failures,
+            'launches': self.launches,
+            'recycles': self.recycles,
+            'render_p50': percentile(0.5),
+            'render_p95': percentile(0.95),
+            'render_avg': sum(times) / len(times) if times else 0.0,
+        }
+
+
+browser_pool = BrowserPool()
@@ -0,0 +1,227 @@
+import asyncio
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import nonebot_plugin_localstore as store
+from PIL import Image, ImageDraw, ImageFont
+from nonebot import require, logger
+
+from src.plugins.gokz.api.kztimerglobal import fetch_global_stats_batch
+from src.plugins.gokz.config import CARD_FONT_PATH
+from src.plugins.gokz.core.map_catalog import map_catalog
+from src.plugins.gokz.core.kreedz import format_kzmode
+from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.db.record_store import get_player_records
+
+require("nonebot_plugin_localstore")
+
+WIDTH = 700
+HEADER_HEIGHT = 130
+STATS_HEIGHT = 90
+TIER_ROW_HEIGHT = 62
+PADDING = 24
+BAR_HEIGHT = 14
+
+TIER_NAMES = {
+    1: "Very Easy",
+    2: "Easy",
+    3: "Medium",
+    4: "Hard",
+    5: "Very Hard",
+    6: "Extreme",
+    7: "Death",
+}
+TIER_COLORS = {
+    1: (76, 175, 80),
+    2: (139, 195, 74),
+    3: (255, 193, 7),
+    4: (255, 152, 0),
+    5: (244, 67, 54),
+    6: (156, 39, 176),
+    7: (158, 158, 158),
+}
+MODE_COLORS = {
+    "kz_timer": (33, 150, 243),
+    "kz_simple": (0, 188, 212),
+    "kz_vanilla": (255, 87, 34),
+}
+BACKGROUND = (24, 26, 33)
+PANEL = (36, 39, 49)
+TRACK = (55, 59, 72)
+TEXT = (236, 239, 244)
+MUTED = (150, 156, 170)
+
+FALLBACK_FONTS = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "C:/Windows/Fonts/msyh.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+)
+
+
+@lru_cache(maxsize=None)
+def _font(size: int) -> ImageFont.FreeTypeFont:
+    for path in (CARD_FONT_PATH, *FALLBACK_FONTS):
+        if path and Path(path).exists():
+            return ImageFont.truetype(path, size)
+    return ImageFont.load_default(size)
+
+
+@lru_cache(maxsize=2048)
+def _text(text: str, size: int, fill: tuple = TEXT) -> Image.Image:
+    """Rendered text sprite, cached so repeated labels and numbers are only rasterised once"""
+    font = _font(size)
+    left, top, right, bottom = font.getbbox(text)
+    sprite = Image.new("RGBA", (max(right, 1), max(bottom, 1)), (0, 0, 0, 0))
+    ImageDraw.Draw(sprite).text((0, 0), text, font=font, fill=fill)
+    return sprite
+
+
+def _paste_text(img: Image.Image, xy: tuple[int, int], text: str, size: int, fill: tuple = TEXT, anchor: str = "l"):
+    sprite = _text(text, size, fill)
+    x, y = xy
+    if anchor == "r":
+        x -= sprite.width
+    elif anchor == "m":
+        x -= sprite.width // 2
+    img.alpha_composite(sprite, (x, y))
+
+
+def tier_totals() -> dict[int, int]:
+    return map_catalog.snapshot.tier_totals
+
+
+@lru_cache(maxsize=8)
+def _background(mode: str, tiers: tuple[int, ...]) -> Image.Image:
+    """Static card layout for a mode and set of tiers: panels, accents and tier labels"""
+    height = HEADER_HEIGHT + STATS_HEIGHT + TIER_ROW_HEIGHT * len(tiers) + PADDING * 3
+    img = Image.new("RGBA", (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    accent = MODE_COLORS.get(mode, MUTED)
+
+    draw.rectangle((0, 0, WIDTH, 6), fill=accent)
+    draw.rounded_rectangle(
+        (PADDING, HEADER_HEIGHT, WIDTH - PADDING, HEADER_HEIGHT + STATS_HEIGHT), radius=10, fill=PANEL
+    )
+
+    columns = ("TP Points", "PRO Points", "TP WRs", "PRO WRs", "Maps")
+    column_width = (WIDTH - PADDING * 2) // len(columns)
+    for i, label in enumerate(columns):
+        _paste_text(img, (PADDING + column_width * i + column_width // 2, HEADER_HEIGHT + 14), label, 16, MUTED, "m")
+
+    top = HEADER_HEIGHT + STATS_HEIGHT + PADDING
+    draw.rounded_rectangle(
+        (PADDING, top, WIDTH - PADDING, top + TIER_ROW_HEIGHT * len(tiers) + PADDING // 2), radius=10, fill=PANEL
+    )
+    for i, tier in enumerate(tiers):
+        y = top + TIER_ROW_HEIGHT * i + 12
+        draw.rounded_rectangle((PADDING + 14, y + 4, PADDING + 22, y + 44), radius=3, fill=TIER_COLORS.get(tier, MUTED))
+        _paste_text(img, (PADDING + 32, y), f"T{tier}", 20)
+        _paste_text(img, (PADDING + 32, y + 26), TIER_NAMES.get(tier, ""), 14, MUTED)
+        for j, label in enumerate(("TP", "PRO")):
+            _paste_text(img, (PADDING + 150, y + 2 + j * 24), label, 14, MUTED)
+            bar_y = y + 4 + j * 24
+            draw.rounded_rectangle((PADDING + 195, bar_y, WIDTH - PADDING - 110, bar_y + BAR_HEIGHT), radius=7, fill=TRACK)
+    return img
+
+
+def summarize_records(records: list[dict]) -> dict:
+    """Aggregate Global API records into the numbers shown on a card"""
+    summary = {
+        "tp_points": 0,
+        "pro_points": 0,
+        "tp_wrs": 0,
+        "pro_wrs": 0,
+        "maps": set(),
+        "tiers": {tier: {"tp": 0, "pro": 0} for tier in tier_totals()},
+    }
+    for record in records:
+        kind = "tp" if record.get("teleports", 0) > 0 else "pro"
+        points = record.get("points") or 0
+        summary[f"{kind}_points"] += points
+        if points == 1000:
+            summary[f"{kind}_wrs"] += 1
+        summary["maps"].add(record.get("map_name"))
+        tier = map_catalog.tier(record.get("map_name"))
+        if tier in summary["tiers"]:
+            summary["tiers"][tier][kind] += 1
+    summary["maps"] = len(summary["maps"])
+    return summary
+
+
+def render_card(records: list[dict], mode: str, player_name: str = "", steamid: str = "") -> bytes:
+    """
+    Draw a player's progress card from Global API records (TP and PRO personal bests).
+
+    Returns:
+        PNG bytes
+    """
+    mode = format_kzmode(mode)
+    summary = summarize_records(records)
+    totals = tier_totals()
+    img = _background(mode, tuple(sorted(totals))).copy()
+    draw = ImageDraw.Draw(img)
+    accent = MODE_COLORS.get(mode, MUTED)
+
+    name = player_name or (records[0].get("player_name", "") if records else "")
+    _paste_text(img, (PADDING, 28), name or "未知玩家", 36)
+    _paste_text(img, (PADDING, 80), f"{format_kzmode(mode, 'm').upper()}  ·  {steamid}", 18, MUTED)
+    total = summary["tp_points"] + summary["pro_points"]
+    _paste_text(img, (WIDTH - PADDING, 30), f"{total:,}", 36, accent, "r")
+    _paste_text(img, (WIDTH - PADDING, 80), "Total", 18, MUTED, "r")
+
+    values = (
+        f"{summary['tp_points']:,}",
+        f"{summary['pro_points']:,}",
+        str(summary["tp_wrs"]),
+        str(summary["pro_wrs"]),
+        str(summary["maps"]),
+    )
+    column_width = (WIDTH - PADDING * 2) // len(values)
+    for i, value in enumerate(values):
+        _paste_text(img, (PADDING + column_width * i + column_width // 2, HEADER_HEIGHT + 42), value, 24, TEXT, "m")
+
+    top = HEADER_HEIGHT + STATS_HEIGHT + PADDING
+    bar_left = PADDING + 195
+    bar_right = WIDTH - PADDING - 110
+    for i, tier in enumerate(sorted(totals)):
+        y = top + TIER_ROW_HEIGHT * i + 12
+        for j, kind in enumerate(("tp", "pro")):
+            done = summary["tiers"][tier][kind]
+            ratio = min(done / totals[tier], 1) if totals[tier] else 0
+            bar_y = y + 4 + j * 24
+            if ratio > 0:
+                fill_right = bar_left + max(int((bar_right - bar_left) * ratio), BAR_HEIGHT)
+                draw.rounded_rectangle((bar_left, bar_y, fill_right, bar_y + BAR_HEIGHT), radius=7, fill=TIER_COLORS.get(tier, accent))
+            _paste_text(img, (WIDTH - PADDING - 14, bar_y - 2), f"{done}/{totals[tier]}", 14, TEXT, "r")
+
+    buffer = BytesIO()
+    img.convert("RGB").save(buffer, format="PNG", optimize=False, compress_level=1)
+    return buffer.getvalue()
+
+
+async def kz_card(steamid, kz_mode) -> Path | None:
+    """
+    Render the /kz card for a player from their mirrored Global API records.
+
+    Returns:
+        Path of the PNG, or None if the records could not be fetched completely
+    """
+    kz_mode = format_kzmode(kz_mode)
+    steamid64 = convert_steamid(steamid, 64)
+    records = await get_player_records(steamid64, kz_mode)
+    if records is None:
+        # A partial download would draw an understated card, so only a complete one is used
+        batch = await fetch_global_stats_batch(steamid64, (kz_mode,))
+        if batch.errors:
+            logger.warning(f"Records for the kz card of {steamid64} failed: {batch.errors}")
+            return None
+        records = batch.all_records()
+    png = await asyncio.to_thread(render_card, records, kz_mode, "", convert_steamid(steamid64, 2))
+
+    cache_file = store.get_cache_file("gokz", f"cards/{steamid64}_{kz_mode}.png")
+    cache_file.parent.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(cache_file.write_bytes, png)
+    return cache_file
@@ -20,3 +20,27 @@ def count_servers(records: List[Dict], limit=5) -> List[Dict]:
         })
 
     return result
+
+
+def progress_history(runs: List[Dict]) -> tuple[List[Dict], List[int]]:
+    """
+    Reduce a player's runs on one map to the runs that improved their time.
+
+    Args:
+        runs: Every run, any order; sorted in place by created_on
+
+    Returns:
+        (improving runs newest first, runs finished without improving before each of them)
+    """
+    runs.sort(key=lambda x: x['created_on'])
+    records = []
+    completions = []
+    completions_counter = 0
+    for record in runs:
+        if not records or record['time'] < records[-1]['time']:
+            records.append(record)
+            completions.append(completions_counter)
+            completions_counter = 0
+        else:
+            completions_counter += 1
+    return list(reversed(records)), list(reversed(completions))
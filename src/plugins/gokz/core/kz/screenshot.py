@@ -1,6 +1,5 @@
 import asyncio
 import random
-import time
 from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from io import BytesIO
@@ -8,19 +7,37 @@ from pathlib import Path
 
 import nonebot_plugin_localstore as store
 from PIL import Image
-from nonebot import require
-from selenium import webdriver
+from nonebot import require, logger
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.wait import WebDriverWait
 
+from src.plugins.gokz.config import SCREENSHOT_POOL_SIZE, SCREENSHOT_POOL_WARM
 from src.plugins.gokz.core.file_oper import check_last_modified_date
+from src.plugins.gokz.core.kz.browser_pool import browser_pool
 from src.plugins.gokz.core.kreedz import format_kzmode
 from src.plugins.gokz.core.steam_user import convert_steamid
 
 require("nonebot_plugin_localstore")
 
-executor = ThreadPoolExecutor(max_workers=5)
+executor = ThreadPoolExecutor(max_workers=SCREENSHOT_POOL_SIZE, thread_name_prefix="screenshot")
+
+
+async def start_browser_pool():
+    """Warm the Chrome pool in the background so startup isn't held up by browser launches"""
+    if not SCREENSHOT_POOL_WARM:
+        return
+
+    def on_done(future):
+        if future.exception():
+            logger.error(f"Failed to warm screenshot browser pool: {future.exception()}")
+
+    loop = asyncio.get_event_loop()
+    loop.run_in_executor(executor, browser_pool.warm).add_done_callback(on_done)
+
+
+async def stop_browser_pool():
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, browser_pool.shutdown)
 
 
 async def kzgoeu_screenshot_async(steamid, kz_mode, force_update=False):
@@ -60,25 +77,14 @@ def kzgoeu_screenshot(steamid, kz_mode, force_update=False):
         if last_modified_date and (datetime.now() - last_modified_date <= timedelta(hours=1)):
             return str(cache_file)
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")  # Run Chrome in headless mode
-    options.add_argument("--no-sandbox")  # Bypass OS security model
-
-    driver = webdriver.Chrome(options=options)
-
     kzgo_url = f"https://kzgo.eu/players/{steamid}?{kz_mode}"
-    driver.get(kzgo_url)
-
     width = 700
     height = 1000
-    driver.set_window_size(width, height)
-
-    wait = WebDriverWait(driver, 30)
-    wait.until(EC.presence_of_element_located((By.CLASS_NAME, "progress-bg")))
-    time.sleep(1)
-
-    screenshot = driver.get_screenshot_as_png()
-    driver.quit()
+    screenshot = browser_pool.render(
+        kzgo_url,
+        (width, height),
+        ready=[EC.presence_of_element_located((By.CLASS_NAME, "progress-bg"))],
+    )
     img = Image.open(BytesIO(screenshot))
 
     # Crop the image
@@ -104,45 +110,17 @@ def vnl_screenshot(steamid: str, force_update: bool = False) -> str:
         if last_modified_date and (datetime.now() - last_modified_date <= timedelta(days=1)):
             return str(cache_file)
 
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    driver = webdriver.Chrome(options=options)
-
-    driver.get(f"https://vnl.kz/#/stats/{steamid64}")
     # Increase window size to capture more content
     width, height = 920, 700
-    driver.set_window_size(width, height)
-    
-    wait = WebDriverWait(driver, 30)
-    
-    # Wait for the main content to load
-    wait.until(EC.presence_of_element_located((By.XPATH, "//p[contains(text(), 'TP')]")))
-    
-    # Wait for avatar image to load
-    try:
-        # Wait for the avatar img element to be present
-        avatar_img = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, "img[src*='avatars.steamstatic.com']")))
-        # Wait for the image to be fully loaded
-        wait.until(lambda d: d.execute_script(
-            "return arguments[0].complete && arguments[0].naturalHeight > 0", 
-            avatar_img
-        ))
-    except Exception:
-        # If avatar doesn't load, continue anyway after a short delay
-        time.sleep(1)
-    
-    # Wait for progress bars or other key content elements to be visible
-    try:
-        wait.until(EC.presence_of_element_located((By.XPATH, "//p[contains(text(), 'PRO')]")))
-        # Additional wait for any progress bars to render
-        time.sleep(1.5)
-    except Exception:
-        # If elements don't appear, wait a bit more before screenshot
-        time.sleep(2)
-
-    screenshot = driver.get_screenshot_as_png()
-    driver.quit()
+    # Ready once TP stats are in and the page has settled (avatar decoded, progress bar
+    # transitions finished), see browser_pool.page_settled. Players without PRO runs have
+    # no PRO section, so that one is only waited for briefly
+    screenshot = browser_pool.render(
+        f"https://vnl.kz/#/stats/{steamid64}",
+        (width, height),
+        ready=[EC.presence_of_element_located((By.XPATH, "//p[contains(text(), 'TP')]"))],
+        optional=[EC.presence_of_element_located((By.XPATH, "//p[contains(text(), 'PRO')]"))],
+    )
 
     img = Image.open(BytesIO(screenshot))
     # Crop: remove top 64px and bottom 130px, keep small side margins
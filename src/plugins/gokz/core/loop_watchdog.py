@@ -0,0 +1,132 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from nonebot import logger
+
+from src.plugins.gokz.config import LOOP_LAG_INTERVAL, LOOP_LAG_THRESHOLD
+from src.plugins.gokz.core.metrics import Histogram, register_collector
+
+# Frames under here are ours; the innermost of them is the call site a block is charged to
+PLUGIN_ROOT = Path(__file__).resolve().parents[1]
+
+loop_lag = Histogram(
+    "gokz_event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled every LOOP_LAG_INTERVAL",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+
+@dataclass
+class Offender:
+    site: str
+    count: int = 0
+    total: float = 0.0
+    worst: float = 0.0
+    stack: list[str] = field(default_factory=list)
+
+
+def _call_site(frames: traceback.StackSummary) -> str:
+    for frame in reversed(frames):
+        path = Path(frame.filename)
+        if path.is_relative_to(PLUGIN_ROOT) and frame.filename != __file__:
+            return f"{path.relative_to(PLUGIN_ROOT)}:{frame.lineno} {frame.name}"
+    frame = frames[-1]
+    return f"{frame.filename}:{frame.lineno} {frame.name}"
+
+
+class LoopWatchdog:
+    """
+    Measures event-loop scheduling delay and names the code that caused it.
+
+    A heartbeat task on the loop wakes every LOOP_LAG_INTERVAL and records how late it ran. A daemon
+    thread watches the heartbeat; once it is LOOP_LAG_THRESHOLD overdue the loop is blocked, so the
+    thread grabs the loop thread's stack right then. When the loop comes back the lag is charged to the
+    innermost project frame of that stack and logged with the full stack.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self.offenders: dict[str, Offender] = {}
+        self.blocks = 0
+        self._beat = time.monotonic()
+        self._captured: traceback.StackSummary | None = None
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            self._beat = time.monotonic()
+            self._captured = None
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._beat - self.interval)
+            loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._charge(lag)
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue < self.threshold or self._captured is not None:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)  # NOQA
+            if frame is not None:
+                self._captured = traceback.extract_stack(frame)
+
+    def _charge(self, lag: float):
+        frames, self._captured = self._captured, None
+        self.blocks += 1
+        if not frames:  # the watcher did not catch it in the act
+            site, stack = "unknown", []
+        else:
+            site, stack = _call_site(frames), traceback.format_list(frames)
+        offender = self.offenders.get(site)
+        if offender is None:
+            offender = self.offenders[site] = Offender(site)
+        offender.count += 1
+        offender.total += lag
+        if lag >= offender.worst:
+            offender.worst = lag
+            offender.stack = stack
+        logger.warning(f"Event loop blocked for {lag:.3f}s at {site}\n{''.join(stack[-8:])}")
+
+    def start(self):
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._watch, name="loop-watchdog", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def top(self, limit: int = 5) -> list[Offender]:
+        """Call sites that blocked the loop longest in total"""
+        return sorted(self.offenders.values(), key=lambda o: o.total, reverse=True)[:limit]
+
+
+loop_watchdog = LoopWatchdog()
+
+register_collector(
+    "gokz_event_loop_blocked_seconds_total", "Event loop time lost to blocking calls, by call site",
+    lambda: [({"site": o.site}, round(o.total, 6)) for o in loop_watchdog.offenders.values()], kind="counter",
+)
+
+
+async def start_loop_watchdog():
+    if LOOP_LAG_THRESHOLD > 0:
+        loop_watchdog.start()
+
+
+async def stop_loop_watchdog():
+    loop_watchdog.stop()
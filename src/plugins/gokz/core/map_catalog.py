@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import cached_property
+from pathlib import Path
+
+from nonebot import logger
+
+from src.plugins.gokz.core.map_search import MapSearchIndex
+
+# Written by /update_map; the bundled list is used until the first update
+MAP_DATA_FILES = (Path("data/gokz_maps_data.json"), Path("data/gokz_maps.json"))
+SNAPSHOT_PATH = Path("data/gokz/maps.snapshot.json")
+SNAPSHOT_VERSION = 2
+
+
+@dataclass(frozen=True, slots=True)
+class MapInfo:
+    id: int
+    name: str
+    tier: int | None
+    validated: bool
+    updated_on: str = ""
+
+
+@dataclass(frozen=True)
+class CatalogDiff:
+    added: set[str] = field(default_factory=set)
+    removed: set[str] = field(default_factory=set)
+    changed: set[str] = field(default_factory=set)
+
+    @property
+    def affected(self) -> set[str]:
+        return self.added | self.removed | self.changed
+
+    def __bool__(self):
+        return bool(self.affected)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable view of the map list; refreshes build a new one and swap it in"""
+    maps: dict[str, MapInfo] = field(default_factory=dict)
+    source: str = ""
+
+    @classmethod
+    def from_maps_data(cls, maps_data: list[dict], source: str = "") -> "CatalogSnapshot":
+        maps = {}
+        for map_info in maps_data:
+            if not map_info.get("name"):
+                continue
+            maps[map_info["name"]] = MapInfo(
+                id=map_info.get("id") or 0,
+                name=map_info["name"],
+                tier=map_info.get("difficulty"),
+                validated=bool(map_info.get("validated")),
+                updated_on=map_info.get("updated_on") or "",
+            )
+        return cls(maps, source)
+
+    def diff(self, other: "CatalogSnapshot") -> CatalogDiff:
+        """Maps added, removed or changed (tier, validation, file update) going from self to other"""
+        return CatalogDiff(
+            added=other.maps.keys() - self.maps.keys(),
+            removed=self.maps.keys() - other.maps.keys(),
+            changed={name for name in self.maps.keys() & other.maps.keys() if self.maps[name] != other.maps[name]},
+        )
+
+    @cached_property
+    def tiers(self) -> dict[str, int]:
+        return {name: info.tier for name, info in self.maps.items() if info.tier is not None}
+
+    @cached_property
+    def tier_totals(self) -> dict[int, int]:
+        return dict(Counter(self.tiers.values()))
+
+    @cached_property
+    def index(self) -> MapSearchIndex:
+        return MapSearchIndex(self.tiers.keys())
+
+
+def _file_stamp(path: Path) -> list[int]:
+    stat = path.stat()
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _atomic_write(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _read_snapshot(source: Path) -> CatalogSnapshot | None:
+    """Load the compact snapshot if it was written from the current version of source"""
+    try:
+        snapshot = json.loads(SNAPSHOT_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if (
+        snapshot.get("version") != SNAPSHOT_VERSION
+        or snapshot.get("source") != str(source)
+        or snapshot.get("stamp") != _file_stamp(source)
+    ):
+        return None
+    maps = {row[1]: MapInfo(*row) for row in snapshot["maps"]}
+    return CatalogSnapshot(maps, str(source))
+
+
+def _write_snapshot(catalog: CatalogSnapshot, source: Path):
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "source": str(source),
+        "stamp": _file_stamp(source),
+        "maps": [[info.id, info.name, info.tier, info.validated, info.updated_on] for info in catalog.maps.values()],
+    }
+    try:
+        _atomic_write(SNAPSHOT_PATH, json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")))
+    except OSError as e:
+        logger.warning(f"Failed to write map catalogue snapshot: {e}")
+
+
+def _load_from_disk() -> CatalogSnapshot:
+    source = next((path for path in MAP_DATA_FILES if path.exists()), None)
+    if source is None:
+        logger.error(f"No map data found in {', '.join(map(str, MAP_DATA_FILES))}")
+        return CatalogSnapshot()
+
+    catalog = _read_snapshot(source)
+    if catalog is None:
+        with source.open("r", encoding="utf-8") as f:
+            catalog = CatalogSnapshot.from_maps_data(json.load(f), str(source))
+        _write_snapshot(catalog, source)
+    _ = catalog.index  # build the search index off the event loop too
+    return catalog
+
+
+class MapCatalog:
+    """
+    Map tiers, ids and validation flags plus the map search index.
+
+    Readers always see a complete CatalogSnapshot: reloads build a new snapshot in a worker thread
+    and replace the reference in one assignment.
+    """
+
+    def __init__(self):
+        self._snapshot: CatalogSnapshot | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        if self._snapshot is None:
+            # Only hit when used before the startup hook has loaded the catalogue
+            self._snapshot = _load_from_disk()
+        return self._snapshot
+
+    @property
+    def tiers(self) -> dict[str, int]:
+        return self.snapshot.tiers
+
+    def get(self, map_name: str) -> MapInfo | None:
+        return self.snapshot.maps.get(map_name)
+
+    def tier(self, map_name: str, default=None):
+        return self.snapshot.tiers.get(map_name, default)
+
+    def search(self, query: str, limit: int = 5, cutoff: float = 0.2) -> list[str]:
+        return self.snapshot.index.search(query, limit, cutoff)
+
+    async def load(self):
+        """Reload the catalogue from disk, using the snapshot when it is still current"""
+        async with self._lock:
+            self._snapshot = await asyncio.to_thread(_load_from_disk)
+        logger.info(f"Loaded {len(self._snapshot.maps)} maps from {self._snapshot.source}")
+
+    async def refresh(self, maps_data: list[dict]) -> CatalogDiff:
+        """
+        Replace the catalogue with a freshly fetched Global API map list and persist it.
+
+        Nothing is written or swapped if no map changed.
+
+        Args:
+            maps_data: response of the Global API `maps` endpoint
+
+        Returns:
+            Maps added, removed and changed compared to the previous catalogue
+        """
+        old = self.snapshot
+
+        def build():
+            source = MAP_DATA_FILES[0]
+            catalog = CatalogSnapshot.from_maps_data(maps_data, str(source))
+            diff = old.diff(catalog)
+            if diff or not source.exists():
+                _atomic_write(source, json.dumps(maps_data, ensure_ascii=False, indent=2))
+                _write_snapshot(catalog, source)
+                _ = catalog.index
+            return catalog, diff
+
+        async with self._lock:
+            catalog, diff = await asyncio.to_thread(build)
+            if diff or catalog.source != old.source:
+                self._snapshot = catalog
+        logger.info(
+            f"Refreshed map catalogue with {len(catalog.maps)} maps: "
+            f"{len(diff.added)} added, {len(diff.removed)} removed, {len(diff.changed)} changed"
+        )
+        return diff
+
+
+map_catalog = MapCatalog()
+
+
+async def load_map_catalog():
+    await map_catalog.load()
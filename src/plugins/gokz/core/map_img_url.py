@@ -1,55 +1,270 @@
-import aiohttp
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
 from pathlib import Path
-from aiohttp import ClientTimeout
+from urllib.parse import urlsplit
 
+import aiohttp
 import nonebot_plugin_localstore as store
-from nonebot import require
+from cachetools import TTLCache
+from nonebot import require, logger
+
+from src.plugins.gokz.api.helper import get_session, make_timeout
+from src.plugins.gokz.api.throttle import throttled
+from src.plugins.gokz.core.metrics import record_upstream
+from src.plugins.gokz.config import (
+    MAP_IMAGE_MEMORY_CACHE_BYTES, MAP_IMAGE_DISK_LIMIT_BYTES, MAP_IMAGE_REFRESH_INTERVAL, MAP_IMAGE_MISSING_TTL
+)
 
 require("nonebot_plugin_localstore")
 
 # CDN URL for GitHub map images
 CDN_BASE_URL = "https://cdn.jsdelivr.net/gh/KZGlobalTeam/map-images@public/mediums"
 
+# Single writer thread keeps image and index writes ordered
+disk_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-images")
+
+
+@dataclass
+class ImageMeta:
+    size: int
+    checked_at: float
+    used_at: float
+    etag: str | None = None
+    last_modified: str | None = None
+
 
-async def get_map_img_url(map_name: str) -> Path:
+class MapImageStore:
     """
-    Get the path to a cached map image, downloading it from CDN if necessary.
-    
+    Map thumbnails from the CDN, cached in memory (LRU by bytes) and on disk (capped, LRU eviction).
+
+    Images older than MAP_IMAGE_REFRESH_INTERVAL are revalidated with If-None-Match/If-Modified-Since,
+    maps the CDN has no image for are remembered for MAP_IMAGE_MISSING_TTL, and disk writes happen in the
+    background so callers only ever wait on the download itself.
+    """
+
+    def __init__(self, memory_limit: int = MAP_IMAGE_MEMORY_CACHE_BYTES, disk_limit: int = MAP_IMAGE_DISK_LIMIT_BYTES):
+        self.memory_limit = memory_limit
+        self.disk_limit = disk_limit
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._meta: dict[str, ImageMeta] | None = None
+        self._missing: TTLCache[str, bool] = TTLCache(maxsize=4096, ttl=MAP_IMAGE_MISSING_TTL)
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._index_lock = asyncio.Lock()
+        self._writes: set[asyncio.Future] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache_dir(self) -> Path:
+        return store.get_cache_dir("gokz") / "map_images"
+
+    @property
+    def index_file(self) -> Path:
+        return self.cache_dir / "index.json"
+
+    def _path(self, map_name: str) -> Path:
+        return self.cache_dir / f"{map_name}.jpg"
+
+    def _load_index(self) -> dict[str, ImageMeta]:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            raw = json.loads(self.index_file.read_text(encoding="utf-8"))
+            meta = {name: ImageMeta(**value) for name, value in raw.items()}
+        except (OSError, ValueError, TypeError):
+            meta = {}
+        # Pick up images downloaded before the index existed and drop entries whose file is gone
+        files = {path.stem: path for path in self.cache_dir.glob("*.jpg")}
+        for name, path in files.items():
+            if name not in meta:
+                stat = path.stat()
+                meta[name] = ImageMeta(size=stat.st_size, checked_at=stat.st_mtime, used_at=stat.st_mtime)
+        return {name: value for name, value in meta.items() if name in files}
+
+    def _save_index(self, meta: dict[str, ImageMeta]):
+        tmp_file = self.index_file.with_suffix(".tmp")
+        tmp_file.write_text(json.dumps({name: asdict(value) for name, value in meta.items()}), encoding="utf-8")
+        os.replace(tmp_file, self.index_file)
+
+    def _write_image(self, map_name: str, content: bytes | None, evict: list[str], meta: dict[str, ImageMeta]):
+        if content is not None:
+            path = self._path(map_name)
+            tmp_file = path.with_suffix(".tmp")
+            tmp_file.write_bytes(content)
+            os.replace(tmp_file, path)
+        for name in evict:
+            self._path(name).unlink(missing_ok=True)
+        self._save_index(meta)
+
+    async def _meta_index(self) -> dict[str, ImageMeta]:
+        async with self._index_lock:
+            if self._meta is None:
+                loop = asyncio.get_running_loop()
+                self._meta = await loop.run_in_executor(disk_executor, self._load_index)
+        return self._meta
+
+    def _remember(self, map_name: str, content: bytes):
+        if map_name in self._memory:
+            self._memory_bytes -= len(self._memory.pop(map_name))
+        if len(content) > self.memory_limit:
+            return
+        self._memory[map_name] = content
+        self._memory_bytes += len(content)
+        while self._memory_bytes > self.memory_limit:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _schedule_write(self, map_name: str, content: bytes | None, meta: dict[str, ImageMeta]):
+        """
+        Account for a new file against the disk cap and write it, the evictions and the index in the background.
+
+        With content None only the index is rewritten.
+        """
+        evict = []
+        total = sum(value.size for value in meta.values())
+        for name, value in sorted(meta.items(), key=lambda item: item[1].used_at):
+            if total <= self.disk_limit:
+                break
+            if name != map_name:
+                evict.append(name)
+                total -= value.size
+        for name in evict:
+            del meta[name]
+
+        loop = asyncio.get_running_loop()
+        task = loop.run_in_executor(disk_executor, self._write_image, map_name, content, evict, dict(meta))
+        self._writes.add(task)
+        task.add_done_callback(self._on_write_done)
+
+    def _on_write_done(self, task: asyncio.Future):
+        self._writes.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Failed to write map image cache: {task.exception()}")
+
+    async def _download(self, map_name: str, cached: ImageMeta | None) -> tuple[int, bytes | None, dict]:
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+        url = f"{CDN_BASE_URL}/{map_name}.jpg"
+        session = await get_session()
+        async with throttled(url):
+            start = time.monotonic()
+            async with session.get(url, headers=headers, timeout=make_timeout(10)) as response:
+                content = await response.read() if response.status == 200 else None
+                record_upstream(urlsplit(url).hostname, "GET", response.status, time.monotonic() - start)
+                return response.status, content, dict(response.headers)
+
+    async def get(self, map_name: str) -> bytes | None:
+        """
+        Get a map's image.
+
+        Returns:
+            JPEG bytes, or None if the CDN has no image for the map (or it is unreachable and nothing is cached)
+        """
+        if map_name in self._missing:
+            return None
+
+        meta = await self._meta_index()
+        now = time.time()
+        cached = meta.get(map_name)
+        if map_name in self._memory and cached and now - cached.checked_at < MAP_IMAGE_REFRESH_INTERVAL:
+            self._memory.move_to_end(map_name)
+            cached.used_at = now
+            self.hits += 1
+            return self._memory[map_name]
+
+        lock = self._locks.setdefault(map_name, asyncio.Lock())
+        async with lock:
+            cached = meta.get(map_name)
+            content = self._memory.get(map_name)
+            if content is None and cached:
+                try:
+                    content = await asyncio.to_thread(self._path(map_name).read_bytes)
+                except OSError:
+                    meta.pop(map_name, None)
+                    cached = None
+
+            if content is not None and cached and now - cached.checked_at < MAP_IMAGE_REFRESH_INTERVAL:
+                self.hits += 1
+                cached.used_at = now
+                self._remember(map_name, content)
+                return content
+
+            self.misses += 1
+            try:
+                status, downloaded, headers = await self._download(map_name, cached if content else None)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Network error downloading map image for {map_name}: {e}")
+                return content  # serve the stale copy if there is one
+
+            if status == 304 and cached and content is not None:
+                cached.checked_at = cached.used_at = now
+                self._remember(map_name, content)
+                self._schedule_write(map_name, None, meta)
+                return content
+            if status == 404:
+                logger.info(f"No map image for {map_name}")
+                self._missing[map_name] = True
+                return None
+            if status != 200 or not downloaded:
+                logger.warning(f"Failed to download map image for {map_name}: HTTP {status}")
+                return content
+
+            meta[map_name] = ImageMeta(
+                size=len(downloaded),
+                checked_at=now,
+                used_at=now,
+                etag=headers.get("ETag"),
+                last_modified=headers.get("Last-Modified"),
+            )
+            self._remember(map_name, downloaded)
+            self._schedule_write(map_name, downloaded, meta)
+            return downloaded
+
+    def invalidate(self, map_name: str):
+        """Force the next request for map_name to revalidate with the CDN"""
+        if map_name in self._memory:
+            self._memory_bytes -= len(self._memory.pop(map_name))
+        self._missing.pop(map_name, None)
+        if self._meta and map_name in self._meta:
+            self._meta[map_name].checked_at = 0
+
+    async def flush(self):
+        """Wait for pending background writes"""
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": sum(value.size for value in (self._meta or {}).values()),
+            "missing": len(self._missing),
+            "pending_writes": len(self._writes),
+        }
+
+
+map_image_store = MapImageStore()
+
+
+async def get_map_image(map_name: str) -> bytes | None:
+    """
+    Get a map's image, downloading it from the CDN if necessary.
+
     Args:
         map_name: The name of the map (e.g., 'kz_prototype')
-        
+
     Returns:
-        Path to the cached image file
+        JPEG bytes, or None if no image exists for the map
     """
-    cache_file = store.get_cache_file("gokz", f"map_images/{map_name}.jpg")
-    
-    # Return cached file if it exists
-    if cache_file.exists():
-        return cache_file
-    
-    # Download from CDN if not cached
-    image_url = f"{CDN_BASE_URL}/{map_name}.jpg"
-    
-    try:
-        async with aiohttp.ClientSession(timeout=ClientTimeout(total=10)) as session:
-            async with session.get(image_url) as response:
-                if response.status == 200:
-                    # Ensure parent directory exists
-                    cache_file.parent.mkdir(parents=True, exist_ok=True)
-                    # Download and save the image
-                    with cache_file.open("wb") as f:
-                        f.write(await response.read())
-                    return cache_file
-                else:
-                    # If download fails, raise an exception
-                    raise FileNotFoundError(f"Failed to download map image for {map_name}: HTTP {response.status}")
-    except aiohttp.ClientError as e:
-        # Network errors - log and re-raise
-        from nonebot import logger
-        logger.error(f"Network error downloading map image for {map_name}: {e}")
-        raise FileNotFoundError(f"Failed to download map image for {map_name}: {e}") from e
-    except Exception as e:
-        # Other errors - log and re-raise
-        from nonebot import logger
-        logger.error(f"Error downloading map image for {map_name}: {e}")
-        raise
+    return await map_image_store.get(map_name)
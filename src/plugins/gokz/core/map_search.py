@@ -0,0 +1,122 @@
+import difflib
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Iterable
+
+# Map name prefixes users commonly leave out, e.g. `/wr lionharder` for kz_lionharder
+MAP_PREFIXES = ("kz_", "bkz_", "xc_", "skz_", "vnl_", "kzpro_")
+
+
+def strip_prefix(name: str) -> str:
+    for prefix in MAP_PREFIXES:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class MapSearchIndex:
+    """
+    Prebuilt search index over map names.
+
+    Built once per map list: a trigram posting list for substring/fuzzy candidates,
+    sorted name and alias lists for prefix lookups (binary search) and a token table
+    for whole-word hits. Results are ranked exact > prefix > token > substring > fuzzy.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names: list[str] = sorted(set(names))
+        self._names_set = set(self.names)
+        self.aliases: dict[str, list[str]] = defaultdict(list)
+        self.tokens: dict[str, set[str]] = defaultdict(set)
+        self.postings: dict[str, set[str]] = defaultdict(set)
+
+        for name in self.names:
+            alias = strip_prefix(name)
+            if alias != name:
+                self.aliases[alias].append(name)
+            for token in name.split("_"):
+                if token:
+                    self.tokens[token].add(name)
+            for gram in trigrams(name):
+                self.postings[gram].add(name)
+
+        # (key, name) pairs sorted by key; keys are full names and prefix-less aliases
+        self._prefix_keys: list[tuple[str, str]] = sorted(
+            [(name, name) for name in self.names]
+            + [(alias, name) for alias, names in self.aliases.items() for name in names]
+        )
+
+    def __len__(self):
+        return len(self.names)
+
+    def _prefix_matches(self, query: str) -> list[str]:
+        matches = []
+        i = bisect_left(self._prefix_keys, (query, ""))
+        while i < len(self._prefix_keys) and self._prefix_keys[i][0].startswith(query):
+            matches.append(self._prefix_keys[i][1])
+            i += 1
+        return matches
+
+    def _substring_candidates(self, query: str) -> Iterable[str]:
+        if len(query) < 3:
+            return self.names
+        grams = {query[i:i + 3] for i in range(len(query) - 2)}
+        postings = sorted((self.postings.get(gram, set()) for gram in grams), key=len)
+        return set.intersection(*postings)
+
+    def _fuzzy_matches(self, query: str, limit: int, cutoff: float) -> list[str]:
+        # Only score names sharing trigrams with the query instead of the whole list
+        overlap = Counter()
+        for gram in trigrams(query):
+            for name in self.postings.get(gram, ()):
+                overlap[name] += 1
+        candidates = [name for name, _ in overlap.most_common(50)] or self.names
+
+        scored = []
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        for name in candidates:
+            matcher.set_seq1(name)
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                score = matcher.ratio()
+                if score >= cutoff:
+                    scored.append((score, name))
+        scored.sort(key=lambda x: (-x[0], x[1]))
+        return [name for _, name in scored[:limit]]
+
+    def search(self, query: str, limit: int = 5, cutoff: float = 0.2) -> list[str]:
+        """
+        Find maps matching query.
+
+        Every exact, prefix, token and substring match is returned in that order;
+        only when none exist are up to `limit` fuzzy matches returned.
+        """
+        query = query.strip().lower()
+        if not query:
+            return []
+
+        ranked: list[str] = []
+        seen = set()
+
+        def extend(names):
+            for name in sorted(names):
+                if name not in seen:
+                    seen.add(name)
+                    ranked.append(name)
+
+        if query in self._names_set:
+            extend([query])
+        extend(self.aliases.get(query, ()))
+
+        extend(self._prefix_matches(query))
+        extend(self.tokens.get(query, ()))
+        extend(name for name in self._substring_candidates(query) if query in name)
+
+        if ranked:
+            return ranked
+        return self._fuzzy_matches(query, limit, cutoff)
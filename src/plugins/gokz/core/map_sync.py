@@ -0,0 +1,121 @@
+import asyncio
+from asyncio.subprocess import PIPE
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from nonebot import logger
+
+from src.plugins.gokz.api.cache import response_cache
+from src.plugins.gokz.api.kztimerglobal import fetch_map_list
+from src.plugins.gokz.api.throttle import background_priority
+from src.plugins.gokz.core.map_catalog import map_catalog, CatalogDiff
+from src.plugins.gokz.core.map_img_url import map_image_store
+
+MAP_IMAGES_REPO = Path("data/map-images")
+IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".webp")
+GIT_TIMEOUT = 300
+
+_sync_lock = asyncio.Lock()
+
+
+@dataclass
+class MapSyncResult:
+    maps: CatalogDiff = field(default_factory=CatalogDiff)
+    images: set[str] = field(default_factory=set)
+    errors: list[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        lines = [
+            f"地图: 新增 {len(self.maps.added)}, 移除 {len(self.maps.removed)}, 变更 {len(self.maps.changed)}",
+            f"图片: 更新 {len(self.images)}",
+        ]
+        if self.maps.added:
+            lines.append("新地图: " + ", ".join(sorted(self.maps.added)[:10]))
+        lines.extend(f"失败: {error}" for error in self.errors)
+        return "\n".join(lines)
+
+
+async def _git(*args: str) -> str:
+    process = await asyncio.create_subprocess_exec("git", *args, cwd=MAP_IMAGES_REPO, stdout=PIPE, stderr=PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), GIT_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise RuntimeError(f"git {args[0]} timed out")
+    if process.returncode:
+        raise RuntimeError(f"git {args[0]}: {stderr.decode(errors='replace').strip()}")
+    return stdout.decode(errors='replace').strip()
+
+
+async def pull_map_images() -> set[str]:
+    """
+    Fast-forward the local map-images checkout.
+
+    Returns:
+        Names of the maps whose images changed
+    """
+    if not (MAP_IMAGES_REPO / ".git").exists():
+        return set()
+
+    before = await _git("rev-parse", "HEAD")
+    await _git("pull", "--ff-only")
+    after = await _git("rev-parse", "HEAD")
+    if before == after:
+        return set()
+    changed = await _git("diff", "--name-only", before, after)
+    return {Path(line).stem for line in changed.splitlines() if line.lower().endswith(IMAGE_SUFFIXES)}
+
+
+def sync_running() -> bool:
+    return _sync_lock.locked()
+
+
+async def sync_map_assets(progress: Callable[[str], Awaitable] | None = None) -> MapSyncResult:
+    """
+    Refresh the map catalogue from the Global API and pull the map-images repo.
+
+    Only cache entries for maps that actually changed are invalidated. The map list fetch and the
+    git pull run concurrently; neither blocks the event loop.
+
+    Args:
+        progress: coroutine function called with a status line after each step
+    """
+    async def report(text: str):
+        logger.info(f"Map sync: {text}")
+        if progress:
+            await progress(text)
+
+    async def refresh_catalog():
+        data = await fetch_map_list()
+        if data is None:
+            raise RuntimeError("获取地图列表失败")
+        diff = await map_catalog.refresh(data)
+        await report(f"地图列表已更新, 共 {len(map_catalog.snapshot.maps)} 张地图")
+        return diff
+
+    async def refresh_images():
+        images = await pull_map_images()
+        await report(f"地图图片已同步, {len(images)} 张有变化")
+        return images
+
+    async with _sync_lock:
+        result = MapSyncResult()
+        with background_priority():
+            maps, images = await asyncio.gather(refresh_catalog(), refresh_images(), return_exceptions=True)
+        if isinstance(maps, Exception):
+            result.errors.append(str(maps))
+        else:
+            result.maps = maps
+        if isinstance(images, Exception):
+            result.errors.append(str(images))
+        else:
+            result.images = images
+
+        # New maps may have been remembered as missing images, changed ones may have new thumbnails
+        for map_name in result.maps.affected | result.images:
+            map_image_store.invalidate(map_name)
+        if result.maps:
+            response_cache.invalidate(lambda key: key[0] == 'maps')
+        return result
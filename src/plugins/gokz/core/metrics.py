@@ -0,0 +1,185 @@
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from nonebot.consts import PREFIX_KEY, CMD_KEY
+from nonebot.matcher import Matcher
+
+# Seconds; covers a cached lookup up to a slow screenshot
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# (labels, value) pairs of one collected metric
+Samples = Iterable[tuple[dict[str, str], float]]
+
+# Every Counter and Histogram, in creation order
+_metrics: list = []
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in labels.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self) -> dict[tuple, float]:
+        with self._lock:
+            return dict(self._values)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram, safe to observe from worker threads.
+
+    quantile() interpolates inside the bucket like Prometheus' histogram_quantile, which is
+    plenty for spotting which path regressed.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def series(self) -> dict[tuple, tuple[list[int], float, int]]:
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._series.items()}
+
+    def quantile(self, q: float, counts: list[int]) -> float:
+        """Estimate the q-quantile from one series' per-bucket counts"""
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.series().items()):
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': str(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+command_latency = Histogram(
+    "gokz_command_duration_seconds", "Time spent in command handlers", ("command", "outcome")
+)
+upstream_latency = Histogram(
+    "gokz_upstream_request_duration_seconds", "Upstream HTTP request latency", ("host", "method")
+)
+upstream_responses = Counter(
+    "gokz_upstream_responses_total", "Upstream HTTP outcomes by status code or error", ("host", "method", "status")
+)
+render_latency = Histogram(
+    "gokz_screenshot_render_seconds", "Browser screenshot render time", ("outcome",)
+)
+
+# name -> (help, type, callable returning samples); read at scrape time
+_collected: dict[str, tuple[str, str, Callable[[], Samples]]] = {}
+
+
+def register_collector(name: str, documentation: str, collect: Callable[[], Samples], kind: str = "gauge"):
+    """
+    Expose values kept elsewhere, read on every scrape.
+
+    Args:
+        collect: Returns (labels, value) pairs, e.g. a queue's depth per host
+        kind: 'gauge', or 'counter' for totals some component already counts (cache hits)
+    """
+    _collected[name] = (documentation, kind, collect)
+
+
+def render_metrics() -> str:
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.expose())
+    for name, (documentation, kind, collect) in _collected.items():
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in collect():
+            lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def record_upstream(host: str, method: str, status: int | str, latency: float | None = None):
+    """Count an upstream outcome; latency is only observed when a response actually arrived"""
+    upstream_responses.inc(host=host, method=method, status=status)
+    if latency is not None:
+        upstream_latency.observe(latency, host=host, method=method)
+
+
+def _command_name(matcher: Matcher) -> str:
+    command = matcher.state.get(PREFIX_KEY, {}).get(CMD_KEY)
+    if command:
+        return "/".join(command)
+    return f"{matcher.plugin_name}:{matcher.type}"
+
+
+async def command_started(matcher: Matcher):
+    """run_preprocessor hook"""
+    matcher.state["_metrics_start"] = time.perf_counter()
+
+
+async def command_finished(matcher: Matcher, exception: Exception | None):
+    """run_postprocessor hook"""
+    start = matcher.state.get("_metrics_start")
+    if start is None:
+        return
+    outcome = "ok" if exception is None else "error"
+    command_latency.observe(time.perf_counter() - start, command=_command_name(matcher), outcome=outcome)
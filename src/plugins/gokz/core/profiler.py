@@ -0,0 +1,128 @@
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+import nonebot_plugin_localstore as store
+from nonebot import require
+
+from src.plugins.gokz.config import PROFILE_INTERVAL
+
+require("nonebot_plugin_localstore")
+
+# Leaf frames in these modules mean the thread is parked, not working
+IDLE_MODULES = ("threading.py", "selectors.py", "queue.py", "thread.py")
+
+_lock = threading.Lock()
+
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    samples: int = 0
+    stacks: Counter = field(default_factory=Counter)  # collapsed stack -> samples
+    own: Counter = field(default_factory=Counter)  # function -> samples where it was the leaf
+    total: Counter = field(default_factory=Counter)  # function -> samples where it was on the stack
+    busy: int = 0  # thread samples that were not idle
+    allocations: list[str] = field(default_factory=list)
+    path: Path | None = None
+
+    def top(self, limit: int = 15) -> list[tuple[str, float, float]]:
+        """(function, own %, total %) of the busiest functions, relative to non-idle samples"""
+        if not self.busy:
+            return []
+        return [
+            (function, own * 100 / self.busy, self.total[function] * 100 / self.busy)
+            for function, own in self.own.most_common(limit)
+        ]
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+def _sample(result: ProfileResult, own_thread: int):
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():  # NOQA
+        if ident == own_thread:
+            continue
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        if not codes:
+            continue
+        codes.reverse()
+        labels = [_label(code) for code in codes]
+        thread_name = names.get(ident, str(ident))
+        result.stacks[";".join([thread_name, *labels])] += 1
+        if Path(codes[-1].co_filename).name in IDLE_MODULES:
+            continue
+        result.busy += 1
+        result.own[labels[-1]] += 1
+        for label in set(labels):
+            result.total[label] += 1
+    result.samples += 1
+
+
+def _write_collapsed(result: ProfileResult) -> Path:
+    directory = store.get_cache_dir("gokz") / "profiles"
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded"
+    with path.open("w", encoding="utf-8") as f:
+        for stack, count in result.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def run_profile(seconds: float, memory: bool = False, interval: float = PROFILE_INTERVAL) -> ProfileResult:
+    """
+    Sample every thread's stack for `seconds` and write a collapsed-stack file for flamegraph.pl/speedscope.
+
+    Blocking; run it in a worker thread. Nothing is hooked in when no profile is running: the sampler
+    is a thread that only exists for the duration, and tracemalloc is only on while `memory` is asked for.
+
+    Args:
+        memory: Also diff tracemalloc snapshots taken at the start and the end
+        interval: Seconds between samples
+
+    Raises:
+        RuntimeError: Another profile is already running
+    """
+    if not _lock.acquire(blocking=False):
+        raise RuntimeError("A profile is already running")
+    started_tracing = memory and not tracemalloc.is_tracing()
+    try:
+        result = ProfileResult(seconds)
+        if started_tracing:
+            tracemalloc.start(10)
+        before = tracemalloc.take_snapshot() if memory else None
+
+        own_thread = threading.get_ident()
+        end = time.monotonic() + seconds
+        while (now := time.monotonic()) < end:
+            _sample(result, own_thread)
+            time.sleep(max(0.0, interval - (time.monotonic() - now)))
+
+        if memory:
+            after = tracemalloc.take_snapshot()
+            for stat in after.compare_to(before, "lineno")[:10]:
+                frame = stat.traceback[0]
+                result.allocations.append(
+                    f"{Path(frame.filename).name}:{frame.lineno} {stat.size_diff / 1024:+.1f}KiB ({stat.count_diff:+d})"
+                )
+
+        result.path = _write_collapsed(result)
+        return result
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+        _lock.release()
+
+
+def profile_running() -> bool:
+    return _lock.locked()
@@ -0,0 +1,94 @@
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from cachetools import TLRUCache
+from nonebot import logger
+from nonebot.adapters import Bot
+from nonebot.adapters.qq.models import PostC2CFilesReturn, PostGroupFilesReturn
+from nonebot.exception import MockApiException
+
+from src.plugins.gokz.config import MEDIA_CACHE_SIZE, MEDIA_CACHE_MAX_TTL
+
+# Rich-media upload APIs, the field naming their target and the model they return
+UPLOAD_APIS = {
+    "post_group_files": ("group_openid", PostGroupFilesReturn),
+    "post_c2c_files": ("openid", PostC2CFilesReturn),
+}
+SEND_APIS = ("post_group_messages", "post_c2c_messages")
+
+# Stop reusing a handle this long before QQ says it expires
+EXPIRY_MARGIN = 60
+
+
+@dataclass(frozen=True)
+class UploadedMedia:
+    file_info: str
+    file_uuid: str | None
+    expires_at: float
+
+
+media_cache: TLRUCache[tuple, UploadedMedia] = TLRUCache(
+    maxsize=MEDIA_CACHE_SIZE, ttu=lambda _key, media, _now: media.expires_at, timer=time.monotonic
+)
+media_stats = {"hits": 0, "uploads": 0, "evictions": 0}
+
+
+def _media_key(api: str, data: dict[str, Any]) -> tuple | None:
+    """
+    Cache key for an upload: the target (group or user) plus a hash of the file or its URL.
+
+    Uploads that also send a message (srv_send_msg) are never cached.
+    """
+    if api not in UPLOAD_APIS or data.get("srv_send_msg"):
+        return None
+    content = data.get("file_data") or data.get("url")
+    if not content:
+        return None
+    if isinstance(content, str):
+        content = content.encode()
+    target_field, _ = UPLOAD_APIS[api]
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    return api, data.get(target_field), data.get("file_type"), digest
+
+
+async def reuse_uploaded_media(bot: Bot, api: str, data: dict[str, Any]):
+    """calling_api hook: answer an upload from the cache when the same file was sent to the same target"""
+    key = _media_key(api, data)
+    if key is None:
+        return
+    media = media_cache.get(key)
+    if media is None:
+        return
+    media_stats["hits"] += 1
+    _, model = UPLOAD_APIS[api]
+    raise MockApiException(model(file_info=media.file_info, file_uuid=media.file_uuid))
+
+
+async def remember_uploaded_media(bot: Bot, exception: Exception | None, api: str, data: dict[str, Any], result: Any):
+    """called_api hook: cache fresh upload handles and drop handles QQ rejected"""
+    if exception is not None:
+        media = data.get("media")
+        if api in SEND_APIS and media is not None:
+            stale = [key for key, value in media_cache.items() if value.file_info == media.file_info]
+            for key in stale:
+                media_cache.pop(key, None)
+            if stale:
+                media_stats["evictions"] += len(stale)
+                logger.debug(f"Dropped {len(stale)} cached media handle(s) after failed send: {exception}")
+        return
+
+    key = _media_key(api, data)
+    if key is None or not getattr(result, "file_info", None):
+        return
+    cached = media_cache.get(key)
+    if cached is not None and cached.file_info == result.file_info:
+        return  # answered from the cache by reuse_uploaded_media
+    # ttl 0 means the handle does not expire
+    ttl = result.ttl or MEDIA_CACHE_MAX_TTL
+    ttl = min(ttl, MEDIA_CACHE_MAX_TTL) - EXPIRY_MARGIN
+    if ttl <= 0:
+        return
+    media_stats["uploads"] += 1
+    media_cache[key] = UploadedMedia(result.file_info, result.file_uuid, time.monotonic() + ttl)
@@ -1,63 +1,104 @@
 import asyncio
+from dataclasses import dataclass
+from functools import lru_cache
 
-import aiohttp
-from aiohttp import ClientTimeout
-from steam.steamid import SteamID, from_url
+from steam.steamid import SteamID
 
 from nonebot import logger
 
-from src.plugins.gokz.config import STEAM_API_KEY
+from src.plugins.gokz.api.steam import player_summaries, player_bans, resolve_vanity_url
+from src.plugins.gokz.config import STEAMID_CACHE_SIZE
+from src.plugins.gokz.db.vanity_store import get_vanity, save_vanity
 
 
-def convert_steamid(steamid, target_type: int | str = 2, url=False):
-    logger.debug(f"Converting SteamID: {steamid} to type: {target_type}")
-    steamid = SteamID(steamid)
-    if steamid.is_valid() is False:
+@dataclass(frozen=True)
+class SteamIdentity:
+    """Every format of one SteamID"""
+    steam2: str
+    steam3: str
+    steam32: int
+    steam64: int
+    url: str
+
+
+@lru_cache(maxsize=STEAMID_CACHE_SIZE)
+def steam_identity(steamid) -> SteamIdentity:
+    """
+    Parse a SteamID in any format once; later calls with the same value are a dict lookup.
+
+    Raises:
+        ValueError: Not a valid SteamID
+    """
+    parsed = SteamID(steamid)
+    if parsed.is_valid() is False:
         raise ValueError(f"Invalid SteamID: {steamid}")
+    return SteamIdentity(parsed.as_steam2, parsed.as_steam3, parsed.as_32, parsed.as_64, parsed.community_url)
+
+
+def convert_steamid(steamid, target_type: int | str = 2, url=False):
+    identity = steam_identity(steamid)
 
     if url:
-        return steamid.community_url
+        return identity.url
 
     if target_type == '64':
-        return str(steamid.as_64)
+        return str(identity.steam64)
 
     target_type = int(target_type)
 
     if target_type == 2:
-        return steamid.as_steam2
+        return identity.steam2
     if target_type == 3:
-        return steamid.as_steam3
+        return identity.steam3
     if target_type == 32:
-        return steamid.as_32
+        return identity.steam32
     if target_type == 64:
-        return steamid.as_64
+        return identity.steam64
     if target_type == 0:
         return {
-            "steam2": steamid.as_steam2,
-            "steam3": steamid.as_steam3,
-            "steam64": steamid.as_64,
-            "steam32": steamid.as_32,
-            "url": steamid.community_url,
+            "steam2": identity.steam2,
+            "steam3": identity.steam3,
+            "steam64": identity.steam64,
+            "steam32": identity.steam32,
+            "url": identity.url,
         }
 
     raise ValueError(f"Invalid target type: {target_type}")
 
 
+async def resolve_vanity(vanity: str) -> str | None:
+    """steamid64 of a custom profile URL: memory, then the local steam_vanity table, then Steam"""
+    if steamid64 := await get_vanity(vanity):
+        return steamid64
+    steamid64 = await resolve_vanity_url(vanity)
+    if steamid64:
+        await save_vanity(vanity, steamid64)
+    return steamid64
+
+
 async def retrieve_steamid(steamid_or_url) -> str | None:
-    logger.debug(f"Retrieving SteamID from: {steamid_or_url}")
+    """
+    SteamID2 of a SteamID in any format or a steamcommunity.com profile URL.
+
+    Returns:
+        None for profile URLs that do not resolve
+
+    Raises:
+        ValueError: Neither a URL nor a valid SteamID
+    """
     steamid_or_url = str(steamid_or_url).strip()
     if steamid_or_url.startswith("http"):
         if "/profiles/" in steamid_or_url:
-            steam64 = steamid_or_url.split("/profiles/")[-1]
-            steamid = SteamID(steam64)
-            if steamid.is_valid():
-                return steamid.as_steam2
-            else:
+            steam64 = steamid_or_url.split("/profiles/")[-1].split("/")[0]
+            try:
+                return steam_identity(steam64).steam2
+            except ValueError:
                 return None
 
         elif "/id/" in steamid_or_url:
-            steamid = from_url(steamid_or_url)
-            return steamid.as_steam2
+            vanity = steamid_or_url.split("/id/")[-1].split("/")[0]
+            steam64 = await resolve_vanity(vanity) if vanity else None
+            return steam_identity(steam64).steam2 if steam64 else None
 
         else:
             return None
@@ -67,19 +108,14 @@ async def retrieve_steamid(steamid_or_url) -> str | None:
 
 
 async def check_steam_bans(steamid) -> dict | None:
-    steam64 = convert_steamid(steamid, 64)
-
-    url = f'http://api.steampowered.com/ISteamUser/GetPlayerBans/v1/?key={STEAM_API_KEY}&steamids={steam64}'
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url) as response:
-            ban_data = await response.json()
-    return ban_data['players'][0]
+    """GetPlayerBans entry of one player, batched with concurrent lookups and cached"""
+    return await player_bans.get(convert_steamid(steamid, 64))
 
 
 async def get_steam_user_info(steamid, timeout=5.0) -> dict | None:
     """
         Get information about a Steam user using their SteamID64.
+        Lookups are batched with concurrent ones into a single GetPlayerSummaries call and cached.
         Returns:
             {
                 'steamid': str,
@@ -104,23 +140,12 @@ async def get_steam_user_info(steamid, timeout=5.0) -> dict | None:
     """
     steamid = convert_steamid(steamid, 64)
 
-    url = f"https://api.steampowered.com/ISteamUser/GetPlayerSummaries/v2/?key={STEAM_API_KEY}&steamids={steamid}"
-
     try:
-        async with aiohttp.ClientSession(timeout=ClientTimeout(timeout)) as session:
-            async with session.get(url) as response:
-                try:
-                    data = await response.json()
-                except aiohttp.client_exceptions.ContentTypeError:
-                    logger.warning(f"Failed to get user info for SteamID: {steamid}")
-                    return None
+        player_data = await asyncio.wait_for(player_summaries.get(steamid), timeout)
     except asyncio.TimeoutError:
         logger.warning(f"Request to Steam API timed out for SteamID: {steamid}")
         return {"error": "Request timed out"}
 
-    try:
-        player_data = data['response']['players'][0]
-        return player_data
-    except IndexError:
+    if player_data is None:
         logger.warning(f"Failed to get user info for SteamID: {steamid}")
-        return None
+    return player_data
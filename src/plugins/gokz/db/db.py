@@ -1,26 +1,76 @@
+import asyncio
 import os
 import urllib.parse
+from pathlib import Path
 
 from dotenv import load_dotenv
-from sqlmodel import SQLModel, create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlmodel import SQLModel
+
+from src.plugins.gokz.db.models import LocalModel
 
 load_dotenv()
 
 
 def get_url():
+    # DATABASE_URL overrides the MySQL settings, e.g. sqlite+aiosqlite:///test.sqlite3 for local testing
+    if url := os.getenv("DATABASE_URL"):
+        return url
     user = os.getenv("MYSQL_USER", "root")
     password = urllib.parse.quote_plus(os.getenv("MYSQL_PASSWORD", ""))
     server = os.getenv("MYSQL_SERVER", "localhost")
     port = os.getenv("MYSQL_PORT", "3306")
     db_name = os.getenv("MYSQL_DB", "app")
-    return f"mysql+pymysql://{user}:{password}@{server}:{port}/{db_name}"
+    return f"mysql+aiomysql://{user}:{password}@{server}:{port}/{db_name}"
+
+
+def get_local_url():
+    path = Path(os.getenv("RECORD_STORE_PATH", "data/gokz/records.sqlite3"))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):  # NOQA
+    # WAL lets readers run alongside the writer; concurrent writers wait for the lock instead of failing
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA busy_timeout={int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '30000'))}")
+    cursor.close()
+
+
+def make_engine(url: str) -> AsyncEngine:
+    if url.startswith("sqlite"):
+        sqlite_engine = create_async_engine(url)
+        event.listen(sqlite_engine.sync_engine, "connect", _sqlite_pragmas)
+        return sqlite_engine
+    return create_async_engine(
+        url,
+        pool_size=int(os.getenv("MYSQL_POOL_SIZE", "10")),
+        max_overflow=int(os.getenv("MYSQL_MAX_OVERFLOW", "10")),
+        pool_timeout=float(os.getenv("MYSQL_POOL_TIMEOUT", "10")),
+        pool_recycle=int(os.getenv("MYSQL_POOL_RECYCLE", "1800")),  # below MySQL's wait_timeout
+        pool_pre_ping=True,
+    )
+
+
+engine = make_engine(get_url())
+local_engine = make_engine(get_local_url())
+
+
+async def create_db_and_tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 
-engine = create_engine(get_url())
+async def create_local_db_and_tables():
+    async with local_engine.begin() as conn:
+        await conn.run_sync(LocalModel.metadata.create_all)
 
 
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+async def close_engines():
+    await engine.dispose()
+    await local_engine.dispose()
 
 
 def init_db():
@@ -29,4 +79,4 @@ def init_db():
 
 if __name__ == '__main__':
     print(get_url())
-    create_db_and_tables()
+    asyncio.run(create_db_and_tables())
@@ -0,0 +1,226 @@
+import asyncio
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Awaitable, Callable
+
+from cachetools import TTLCache
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.gokz.config import GROUP_MEMBER_CACHE_SIZE, GROUP_MEMBER_SEEN_TTL
+from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.db.db import engine
+from src.plugins.gokz.db.models import GroupMember, PlayerRank, User
+
+METRICS = ("points", "rating")
+
+
+@dataclass(frozen=True)
+class Standing:
+    steamid64: str
+    mode: str
+    name: str
+    points: int
+    rating: float
+    rank: int | None  # global, as reported by gokz.top
+
+    def key(self, metric: str) -> tuple:
+        """Sort key: highest first, steamid64 breaks ties so every key is unique"""
+        return -getattr(self, metric), self.steamid64
+
+
+class GroupBoard:
+    """One group's bound members in one mode, kept ordered by every metric"""
+
+    def __init__(self):
+        self.orders: dict[str, list[tuple]] = {metric: [] for metric in METRICS}
+
+    def add(self, standing: Standing):
+        for metric, order in self.orders.items():
+            insort(order, standing.key(metric))
+
+    def remove(self, standing: Standing):
+        for metric, order in self.orders.items():
+            key = standing.key(metric)
+            index = bisect_left(order, key)
+            if index < len(order) and order[index] == key:
+                del order[index]
+
+    def top(self, metric: str, limit: int) -> list[str]:
+        return [steamid64 for _, steamid64 in self.orders[metric][:limit]]
+
+    def position(self, standing: Standing, metric: str) -> int | None:
+        """1-based place of a standing on this board"""
+        order = self.orders[metric]
+        key = standing.key(metric)
+        index = bisect_left(order, key)
+        return index + 1 if index < len(order) and order[index] == key else None
+
+    def __len__(self):
+        return len(self.orders[METRICS[0]])
+
+
+class GroupRankings:
+    """
+    Materialised per-group rankings of bound members' gokz.top leaderboard entries.
+
+    A group's member list is loaded from qqbot_group_members the first time it is ranked, together
+    with the members' player_ranks rows, in two queries. From then on the boards are kept sorted in
+    place: a saved leaderboard entry moves that player on every loaded board it is on, and a member
+    seen for the first time is slotted in. Ranking a group is then only a slice of a sorted list.
+    """
+
+    def __init__(self):
+        self.members: dict[str, dict[str, str | None]] = {}  # group -> qid -> steamid64 (None if unbound)
+        self.boards: dict[tuple[str, str], GroupBoard] = {}  # (group, mode) -> board
+        self.standings: dict[tuple[str, str], Standing] = {}  # (steamid64, mode) -> standing
+        self.groups: dict[str, set[str]] = {}  # steamid64 -> loaded groups the player is in
+        self.names: dict[str, str] = {}  # steamid64 -> binding name, used until gokz.top's is known
+        # (group, qid) whose membership was written recently
+        self._seen: TTLCache[tuple[str, str], bool] = TTLCache(maxsize=GROUP_MEMBER_CACHE_SIZE, ttl=GROUP_MEMBER_SEEN_TTL)
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._fills: dict[tuple[str, str], asyncio.Task] = {}  # (group, mode) -> background fill
+
+    async def _load_members(self, group_openid: str):
+        async with AsyncSession(engine) as session:
+            rows = (await session.exec(
+                select(GroupMember.qid, User.steamid, User.name)
+                .join(User, User.qid == GroupMember.qid, isouter=True)  # NOQA
+                .where(GroupMember.group_openid == group_openid)  # NOQA
+            )).all()
+        members = {}
+        for qid, steamid, name in rows:
+            try:
+                members[qid] = str(convert_steamid(steamid, 64)) if steamid else None
+            except ValueError:
+                members[qid] = None
+            if members[qid]:
+                self.groups.setdefault(members[qid], set()).add(group_openid)
+                if name:
+                    self.names.setdefault(members[qid], name)
+        self.members[group_openid] = members
+
+    async def _load_standings(self, steamid64s: set[str], mode: str):
+        missing = [steamid64 for steamid64 in steamid64s if (steamid64, mode) not in self.standings]
+        if not missing:
+            return
+        async with AsyncSession(engine) as session:
+            rows = (await session.exec(
+                select(PlayerRank).where(PlayerRank.mode == mode, PlayerRank.steamid64.in_(missing))  # NOQA
+            )).all()
+        for row in rows:
+            self._remember(row.steamid64, mode, row.name, row.points, row.rating, row.rank)
+
+    def _remember(self, steamid64, mode, name, points, rating, rank) -> Standing:
+        previous = self.standings.get((steamid64, mode))
+        name = name or (previous.name if previous else None) or self.names.get(steamid64) or steamid64
+        standing = Standing(steamid64, mode, name, points or 0, rating or 0.0, rank)
+        self.standings[(steamid64, mode)] = standing
+        return standing
+
+    async def board(self, group_openid: str, mode: str) -> GroupBoard:
+        """The group's ranking in a mode, loaded from the database on first use"""
+        key = (group_openid, mode)
+        if key in self.boards:
+            return self.boards[key]
+        async with self._locks.setdefault(group_openid, asyncio.Lock()):
+            if key in self.boards:
+                return self.boards[key]
+            if group_openid not in self.members:
+                await self._load_members(group_openid)
+            steamid64s = {steamid64 for steamid64 in self.members[group_openid].values() if steamid64}
+            await self._load_standings(steamid64s, mode)
+            board = GroupBoard()
+            for steamid64 in steamid64s:
+                if standing := self.standings.get((steamid64, mode)):
+                    board.add(standing)
+            self.boards[key] = board
+            return board
+
+    def unranked(self, group_openid: str, mode: str) -> list[str]:
+        """Bound members of a loaded group with no leaderboard entry in mode yet"""
+        return sorted({
+            steamid64 for steamid64 in self.members.get(group_openid, {}).values()
+            if steamid64 and (steamid64, mode) not in self.standings
+        })
+
+    def start_fill(self, group_openid: str, mode: str, steamid64s: list[str],
+                   fill: Callable[[list[str]], Awaitable[object]]) -> bool:
+        """
+        Run fill(steamid64s) in the background to fetch members' missing entries, unless one is
+        already running for the group and mode. Returns whether a fill was started.
+        """
+        key = (group_openid, mode)
+        if not steamid64s or key in self._fills:
+            return False
+        task = asyncio.create_task(fill(steamid64s))
+        self._fills[key] = task
+        task.add_done_callback(lambda _: self._fills.pop(key, None))
+        return True
+
+    def on_ranks_saved(self, rows: list[dict]):
+        """Move players whose leaderboard entries were just written (rank_store.rank_values rows)"""
+        for row in rows:
+            steamid64, mode = row["steamid64"], row["mode"]
+            groups = self.groups.get(steamid64)
+            if not groups:
+                continue
+            previous = self.standings.get((steamid64, mode))
+            standing = self._remember(steamid64, mode, row["name"], row["points"], row["rating"], row["rank"])
+            for group in groups:
+                if (board := self.boards.get((group, mode))) is not None:
+                    if previous is not None:
+                        board.remove(previous)
+                    board.add(standing)
+
+    async def member_seen(self, group_openid: str, qid: str):
+        """Record that qid is in the group; cheap until GROUP_MEMBER_SEEN_TTL after the last write"""
+        if (group_openid, qid) in self._seen:
+            return
+        async with AsyncSession(engine) as session:
+            await session.merge(GroupMember(group_openid=group_openid, qid=qid, last_seen=datetime.now()))
+            await session.commit()
+        self._seen[(group_openid, qid)] = True
+
+        members = self.members.get(group_openid)
+        if members is None or qid in members:
+            return
+        async with AsyncSession(engine) as session:
+            user = await session.get(User, qid)
+        await self._add_member(group_openid, qid, user)
+
+    async def _add_member(self, group_openid: str, qid: str, user: User | None):
+        steamid64 = None
+        if user is not None and user.steamid:
+            try:
+                steamid64 = str(convert_steamid(user.steamid, 64))
+            except ValueError:
+                pass
+        self.members[group_openid][qid] = steamid64
+        if steamid64 is None:
+            return
+        self.groups.setdefault(steamid64, set()).add(group_openid)
+        if user.name:
+            self.names.setdefault(steamid64, user.name)
+        # snapshot: boards for other modes can be loaded while standings are awaited
+        for (group, mode), board in list(self.boards.items()):
+            if group != group_openid:
+                continue
+            await self._load_standings({steamid64}, mode)
+            standing = self.standings.get((steamid64, mode))
+            if standing is not None and board.position(standing, METRICS[0]) is None:
+                board.add(standing)
+
+    def invalidate_member(self, qid: str):
+        """A binding changed: rebuild the boards of every loaded group the user is in on next use"""
+        for group, members in list(self.members.items()):
+            if qid in members:
+                for steamid64 in filter(None, members.values()):
+                    self.groups.get(steamid64, set()).discard(group)
+                del self.members[group]
+                for key in [key for key in self.boards if key[0] == group]:
+                    del self.boards[key]
+
+
+group_rankings = GroupRankings()
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlmodel import Field, SQLModel, Column, DateTime, func
+from sqlalchemy.orm import registry
+from sqlmodel import Field, SQLModel, Column, DateTime, Text, func
 
 
 class User(SQLModel, table=True):
@@ -41,3 +42,59 @@ class Leaderboard(SQLModel, table=True):
     count_pro: int | None = Field(default=None)
     count_tp: int | None = Field(default=None)
     updated_on: datetime = Field(default_factory=datetime.now, sa_column=Column(DateTime, default=func.now(), onupdate=func.now(), nullable=False))
+
+
+class PlayerRank(SQLModel, table=True):
+    """A player's api.gokz.top leaderboard entry in one mode, kept warm for bound users by the rank refresher"""
+    __tablename__ = 'player_ranks'
+    steamid64: str = Field(primary_key=True, max_length=30)
+    mode: str = Field(primary_key=True, max_length=20)
+    name: str | None = Field(default=None, max_length=255)
+    rank: int | None = Field(default=None)
+    points: int | None = Field(default=None)
+    total_points_v2: int | None = Field(default=None)
+    rating: float | None = Field(default=None)
+    data: str = Field(sa_column=Column(Text, nullable=False))  # leaderboard entry JSON as returned by the API
+    fetched_at: datetime = Field(index=True)
+
+
+class GroupMember(SQLModel, table=True):
+    """A QQ user seen @-ing the bot in a group; QQ does not let bots list group members"""
+    __tablename__ = 'qqbot_group_members'
+    group_openid: str = Field(primary_key=True, max_length=64)
+    qid: str = Field(primary_key=True, max_length=64)
+    last_seen: datetime = Field(default_factory=datetime.now)
+
+
+class LocalModel(SQLModel, registry=registry()):
+    """Base for tables living in the local SQLite store, kept out of the MySQL metadata"""
+
+
+class MirroredRecord(LocalModel, table=True):
+    """A player's personal best on one map, mirrored from the Global API"""
+    __tablename__ = 'global_records'
+    steamid64: str = Field(primary_key=True, max_length=30)
+    mode: str = Field(primary_key=True, max_length=20)
+    map_name: str = Field(primary_key=True, max_length=255)
+    has_tp: bool = Field(primary_key=True)
+    record_id: int
+    time: float
+    created_on: str = Field(index=True)
+    data: str  # raw record JSON as returned by the Global API
+
+
+class RecordSyncState(LocalModel, table=True):
+    __tablename__ = 'global_record_sync'
+    steamid64: str = Field(primary_key=True, max_length=30)
+    mode: str = Field(primary_key=True, max_length=20)
+    cursor: str | None = Field(default=None)  # latest created_on seen
+    synced_at: datetime
+    full_synced_at: datetime
+
+
+class SteamVanity(LocalModel, table=True):
+    """A steamcommunity.com/id/<vanity> custom URL and the account it resolved to"""
+    __tablename__ = 'steam_vanity'
+    vanity: str = Field(primary_key=True, max_length=64)  # lower case, Steam treats custom URLs case-insensitively
+    steamid64: str = Field(max_length=30)
+    resolved_at: datetime
@@ -0,0 +1,193 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+from nonebot import logger
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.gokz.api.gokz_top import fetch_rank, fetch_player_name
+from src.plugins.gokz.api.throttle import background_priority
+from src.plugins.gokz.config import (
+    RANK_MAX_AGE, RANK_REFRESH_INTERVAL, RANK_REFRESH_PER_CYCLE, RANK_REFRESH_CONCURRENCY, RANK_UPSERT_BATCH,
+    RANK_MISSING_TTL,
+)
+from src.plugins.gokz.core.metrics import register_collector
+from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.db.db import engine
+from src.plugins.gokz.db.group_ranking import group_rankings
+from src.plugins.gokz.db.models import PlayerRank, User
+
+# Columns an upsert overwrites; name is only replaced by a non-null one
+UPDATED_COLUMNS = ("rank", "points", "total_points_v2", "rating", "data", "fetched_at")
+
+
+def rank_is_stale(row: PlayerRank) -> bool:
+    return datetime.now() - row.fetched_at > timedelta(seconds=RANK_MAX_AGE)
+
+
+def rank_values(steamid64: str, mode: str, data: dict, name: str | None = None) -> dict:
+    """Column values of a PlayerRank row for a leaderboard entry"""
+    return {
+        "steamid64": steamid64,
+        "mode": mode,
+        "name": name,
+        "rank": data.get("rank"),
+        "points": data.get("points"),
+        "total_points_v2": data.get("total_points_v2"),
+        "rating": data.get("rating"),
+        "data": json.dumps(data, ensure_ascii=False),
+        "fetched_at": datetime.now(),
+    }
+
+
+def _upsert(rows: list[dict]):
+    table = PlayerRank.__table__
+    if engine.dialect.name == "mysql":
+        statement = mysql_insert(table).values(rows)
+        new = statement.inserted
+        update = {column: new[column] for column in UPDATED_COLUMNS}
+        update["name"] = func.coalesce(new.name, table.c.name)
+        return statement.on_duplicate_key_update(update)
+    statement = sqlite_insert(table).values(rows)
+    new = statement.excluded
+    update = {column: new[column] for column in UPDATED_COLUMNS}
+    update["name"] = func.coalesce(new.name, table.c.name)
+    return statement.on_conflict_do_update(index_elements=["steamid64", "mode"], set_=update)
+
+
+async def save_ranks(rows: list[dict]):
+    """Insert or update PlayerRank rows, RANK_UPSERT_BATCH per statement, and move them on group rankings"""
+    async with engine.begin() as conn:
+        for start in range(0, len(rows), RANK_UPSERT_BATCH):
+            await conn.execute(_upsert(rows[start:start + RANK_UPSERT_BATCH]))
+    group_rankings.on_ranks_saved(rows)
+
+
+async def save_rank(steamid64: str, mode: str, data: dict, name: str | None = None):
+    await save_ranks([rank_values(steamid64, mode, data, name)])
+
+
+async def get_rank(steamid64: str, mode: str) -> PlayerRank | None:
+    async with AsyncSession(engine) as session:
+        return await session.get(PlayerRank, (steamid64, mode))
+
+
+async def stale_targets(limit: int, skip=()) -> list[tuple[str, str, bool]]:
+    """
+    (steamid64, mode, has name) of bound users whose entry in their default mode is missing or
+    older than RANK_MAX_AGE, missing ones first and then the longest out of date.
+    (steamid64, mode) pairs in skip are left out.
+    """
+    async with AsyncSession(engine) as session:
+        bindings = (await session.exec(select(User.steamid, User.mode))).all()
+        known = {
+            (steamid64, mode): (fetched_at, name is not None)
+            for steamid64, mode, fetched_at, name in await session.exec(
+                select(PlayerRank.steamid64, PlayerRank.mode, PlayerRank.fetched_at, PlayerRank.name)
+            )
+        }
+
+    cutoff = datetime.now() - timedelta(seconds=RANK_MAX_AGE)
+    due: dict[tuple[str, str], tuple[datetime, bool]] = {}
+    for steamid, mode in bindings:
+        try:
+            key = (str(convert_steamid(steamid, 64)), mode)
+        except ValueError:
+            continue
+        if key in skip:
+            continue
+        fetched_at, has_name = known.get(key, (datetime.min, False))
+        if fetched_at < cutoff:
+            due[key] = (fetched_at, has_name)
+    ordered = sorted(due.items(), key=lambda item: item[1][0])[:limit]
+    return [(steamid64, mode, has_name) for (steamid64, mode), (_, has_name) in ordered]
+
+
+class RankRefresher:
+    """
+    Keeps bound users' PlayerRank rows fresh so /rank can answer without a round trip.
+
+    Every RANK_REFRESH_INTERVAL up to RANK_REFRESH_PER_CYCLE stale entries are fetched,
+    RANK_REFRESH_CONCURRENCY at a time and behind interactive requests in the host queue, then
+    written back with bulk upserts. A player's name is only looked up until it is known. Entries that
+    failed or do not exist upstream are remembered for RANK_MISSING_TTL and skipped until then.
+    """
+
+    def __init__(self):
+        self.missing: TTLCache[tuple[str, str], bool] = TTLCache(maxsize=65536, ttl=RANK_MISSING_TTL)
+        self.refreshed = 0
+        self.failed = 0
+        self.last_run: datetime | None = None
+        self._task: asyncio.Task | None = None
+
+    async def refresh(self, targets: list[tuple[str, str, bool]]) -> int:
+        """Fetch and store entries for (steamid64, mode, has name) targets; returns how many were stored"""
+        semaphore = asyncio.Semaphore(RANK_REFRESH_CONCURRENCY)
+
+        async def refresh_one(steamid64, mode, has_name):
+            async with semaphore:
+                data = await fetch_rank(steamid64, mode)
+                if data is None:
+                    return None
+                name = None if has_name else await fetch_player_name(steamid64)
+                return rank_values(steamid64, mode, data, name)
+
+        with background_priority():
+            results = await asyncio.gather(*(refresh_one(*target) for target in targets), return_exceptions=True)
+        rows = [row for row in results if isinstance(row, dict)]
+        for (steamid64, mode, _), result in zip(targets, results):
+            if isinstance(result, dict):
+                self.missing.pop((steamid64, mode), None)
+                continue
+            self.missing[(steamid64, mode)] = True
+            if isinstance(result, BaseException):
+                logger.warning(f"Rank refresh failed: {result!r}")
+        if rows:
+            await save_ranks(rows)
+        self.refreshed += len(rows)
+        self.failed += len(results) - len(rows)
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            try:
+                targets = await stale_targets(RANK_REFRESH_PER_CYCLE, self.missing)
+                if targets:
+                    stored = await self.refresh(targets)
+                    logger.info(f"Refreshed {stored}/{len(targets)} stale leaderboard entries")
+                self.last_run = datetime.now()
+            except Exception as e:  # NOQA keep the loop alive, the next cycle retries
+                logger.exception(f"Rank refresh cycle failed: {e!r}")
+            await asyncio.sleep(RANK_REFRESH_INTERVAL)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+rank_refresher = RankRefresher()
+
+register_collector(
+    "gokz_rank_refresh_total", "Leaderboard entries refreshed in the background, by outcome",
+    lambda: [({"outcome": "ok"}, rank_refresher.refreshed), ({"outcome": "failed"}, rank_refresher.failed)],
+    kind="counter",
+)
+
+
+async def start_rank_refresher():
+    if RANK_REFRESH_INTERVAL > 0:
+        rank_refresher.start()
+
+
+async def stop_rank_refresher():
+    rank_refresher.stop()
@@ -0,0 +1,178 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from nonebot import logger
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select, delete
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.gokz.api.kztimerglobal import fetch_global_stats_batch, query_records
+from src.plugins.gokz.config import RECORD_STORE_MAX_AGE, RECORD_STORE_FULL_SYNC_INTERVAL
+from src.plugins.gokz.core.kreedz import format_kzmode
+from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.db.db import local_engine
+from src.plugins.gokz.db.models import MirroredRecord, RecordSyncState
+
+# Records asked for per variant by a delta sync; a full page means older ones may be missing
+DELTA_SYNC_LIMIT = 1000
+
+# (steamid64, mode) -> [lock, holders and waiters]; an entry only lives while someone uses it
+_sync_locks: dict[tuple[str, str], list] = {}
+# SQLite has a single writer; queueing here keeps concurrent syncs from contending for its lock
+_write_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def _sync_lock(steamid64: str, mode: str):
+    """One sync per player and mode at a time"""
+    key = (steamid64, mode)
+    entry = _sync_locks.setdefault(key, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _sync_locks[key]
+
+
+def _to_row(steamid64: str, mode: str, record: dict) -> MirroredRecord:
+    return MirroredRecord(
+        steamid64=steamid64,
+        mode=mode,
+        map_name=record['map_name'],
+        has_tp=record['teleports'] > 0,
+        record_id=record['id'],
+        time=record['time'],
+        created_on=record['created_on'],
+        data=json.dumps(record, ensure_ascii=False),
+    )
+
+
+async def _load_state(steamid64: str, mode: str) -> RecordSyncState | None:
+    async with AsyncSession(local_engine) as session:
+        return await session.get(RecordSyncState, (steamid64, mode))
+
+
+async def _load_records(steamid64: str, mode: str, map_name: str | None = None) -> list[dict]:
+    async with AsyncSession(local_engine) as session:
+        statement = select(MirroredRecord).where(
+            MirroredRecord.steamid64 == steamid64,  # NOQA
+            MirroredRecord.mode == mode,  # NOQA
+        )
+        if map_name:
+            statement = statement.where(MirroredRecord.map_name == map_name)  # NOQA
+        return [json.loads(row.data) for row in await session.exec(statement)]
+
+
+async def _save_records(steamid64: str, mode: str, records: list[dict], full: bool):
+    now = datetime.now()
+    async with _write_lock, AsyncSession(local_engine) as session:
+        if full:
+            await session.exec(delete(MirroredRecord).where(
+                MirroredRecord.steamid64 == steamid64,  # NOQA
+                MirroredRecord.mode == mode,  # NOQA
+            ))
+
+        # Global API records are personal bests, so a newer record replaces the row for its map/variant
+        rows = {}
+        for record in sorted(records, key=lambda x: x['created_on']):
+            row = _to_row(steamid64, mode, record)
+            rows[(row.map_name, row.has_tp)] = row
+        if full:
+            session.add_all(rows.values())
+        else:
+            for row in rows.values():
+                await session.merge(row)
+
+        state = await session.get(RecordSyncState, (steamid64, mode))
+        cursor = max((record['created_on'] for record in records), default=None)
+        if state is None:
+            state = RecordSyncState(steamid64=steamid64, mode=mode, cursor=cursor, synced_at=now, full_synced_at=now)
+        else:
+            state.synced_at = now
+            if cursor and (not state.cursor or cursor > state.cursor):
+                state.cursor = cursor
+            if full:
+                state.full_synced_at = now
+                state.cursor = cursor
+        session.add(state)
+        await session.commit()
+
+
+async def sync_player_records(steamid64, mode, force_full=False) -> bool:
+    """
+    Bring the local mirror of a player's records up to date.
+
+    The first sync (and one every RECORD_STORE_FULL_SYNC_INTERVAL, to drop records removed upstream)
+    downloads every record; later syncs only ask for records created after the stored cursor, and
+    fall back to a full sync when that returns a full page.
+
+    Returns:
+        True if the mirror is now in sync, False if the upstream query failed
+    """
+    steamid64 = str(convert_steamid(steamid64, 64))
+    mode = format_kzmode(mode)
+
+    state = await _load_state(steamid64, mode)
+    full = (
+        force_full
+        or state is None
+        or not state.cursor
+        or datetime.now() - state.full_synced_at > timedelta(seconds=RECORD_STORE_FULL_SYNC_INTERVAL)
+    )
+
+    if not full:
+        params = {
+            'steamid64': steamid64,
+            'tickrate': 128,
+            'stage': 0,
+            'created_since': state.cursor,
+            'limit': DELTA_SYNC_LIMIT,
+        }
+        batch = await query_records('records/top/recent', params, (mode,))
+        if not batch.errors and any(len(records) >= DELTA_SYNC_LIMIT for records in batch.records.values()):
+            # Possibly cut off: saving it would move the cursor past records that were never fetched
+            logger.info(f"Delta sync for {steamid64} {mode} hit the {DELTA_SYNC_LIMIT} record limit, syncing fully")
+            full = True
+    if full:
+        batch = await fetch_global_stats_batch(steamid64, (mode,))
+
+    if batch.errors:
+        logger.warning(f"Record sync failed for {steamid64} {mode}: {batch.errors}")
+        return False
+
+    records = batch.all_records()
+    await _save_records(steamid64, mode, records, full)
+    logger.debug(f"Synced {len(records)} records for {steamid64} {mode} ({'full' if full else 'delta'})")
+    return True
+
+
+async def get_player_records(steamid64, mode, map_name: str | None = None) -> list[dict] | None:
+    """
+    Return a player's personal bests (TP and PRO) from the local mirror.
+
+    The mirror is refreshed with a delta sync first if it is older than RECORD_STORE_MAX_AGE.
+
+    Returns:
+        List of raw Global API records, or None if the mirror is stale and could not be synced or
+        the local database failed
+    """
+    steamid64 = str(convert_steamid(steamid64, 64))
+    mode = format_kzmode(mode)
+
+    try:
+        async with _sync_lock(steamid64, mode):
+            state = await _load_state(steamid64, mode)
+            fresh = state is not None and datetime.now() - state.synced_at <= timedelta(seconds=RECORD_STORE_MAX_AGE)
+            if not fresh and not await sync_player_records(steamid64, mode):
+                return None
+
+        return await _load_records(steamid64, mode, map_name)
+    except OperationalError as e:
+        # The mirror is only a cache, callers fall back to the API
+        logger.warning(f"Record store unavailable for {steamid64} {mode}: {e!r}")
+        return None
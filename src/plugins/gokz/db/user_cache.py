@@ -0,0 +1,36 @@
+from cachetools import TTLCache
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.gokz.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from src.plugins.gokz.db.db import engine
+from src.plugins.gokz.db.models import User
+
+# qid -> User, or None for users known to be unbound
+user_cache: TTLCache[str, User | None] = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+_MISSING = object()
+
+
+async def _load_user(qid: str) -> User | None:
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        return await session.get(User, qid)  # NOQA
+
+
+async def get_user(qid: str) -> User | None:
+    """Look up a user binding, hitting the database only on a cache miss"""
+    user = user_cache.get(qid, _MISSING)
+    if user is not _MISSING:
+        return user
+
+    user = await _load_user(qid)
+    user_cache[qid] = user
+    return user
+
+
+def cache_user(user: User):
+    """Write-through after a binding was created or changed"""
+    user_cache[user.qid] = user
+
+
+def invalidate_user(qid: str):
+    user_cache.pop(qid, None)
@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+
+from cachetools import TTLCache
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.plugins.gokz.config import STEAMID_CACHE_SIZE, STEAM_VANITY_TTL
+from src.plugins.gokz.db.db import local_engine
+from src.plugins.gokz.db.models import SteamVanity
+
+# vanity -> steamid64, in front of the steam_vanity table
+vanity_cache: TTLCache[str, str] = TTLCache(maxsize=STEAMID_CACHE_SIZE, ttl=STEAM_VANITY_TTL)
+
+
+async def get_vanity(vanity: str) -> str | None:
+    """steamid64 a custom URL resolved to within STEAM_VANITY_TTL, from memory or the local store"""
+    vanity = vanity.lower()
+    if steamid64 := vanity_cache.get(vanity):
+        return steamid64
+
+    async with AsyncSession(local_engine) as session:
+        row = await session.get(SteamVanity, vanity)
+    if row is None or datetime.now() - row.resolved_at > timedelta(seconds=STEAM_VANITY_TTL):
+        return None
+    vanity_cache[vanity] = row.steamid64
+    return row.steamid64
+
+
+async def save_vanity(vanity: str, steamid64: str):
+    vanity = vanity.lower()
+    vanity_cache[vanity] = steamid64
+    async with AsyncSession(local_engine) as session:
+        await session.merge(SteamVanity(vanity=vanity, steamid64=steamid64, resolved_at=datetime.now()))
+        await session.commit()
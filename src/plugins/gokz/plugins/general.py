@@ -6,18 +6,19 @@ from nonebot import on_command, logger
 from nonebot.adapters.qq import Bot, MessageEvent, Message, MessageSegment
 from nonebot.params import CommandArg
 from sqlalchemy.exc import NoResultFound
-from sqlmodel import Session, select
+from sqlmodel import select
 
 from src.plugins.gokz.core.kreedz import format_kzmode
-from src.plugins.gokz.core.steam_user import convert_steamid
+from src.plugins.gokz.core.steam_user import retrieve_steamid, steam_identity
 from src.plugins.gokz.core.binding_code import decode_binding_code
+from src.plugins.gokz.core.file_oper import read_static_image
 from src.plugins.gokz.config import QQ_BOT_SECRET, ENABLE_DIRECT_STEAM_BINDING
 from ..api.helper import fetch_json
 from ..core.command_helper import CommandData
-from ..db.db import engine, create_db_and_tables
+from ..db.deps import SessionDep
+from ..db.group_ranking import group_rankings
 from ..db.models import User, Leaderboard
-
-create_db_and_tables()
+from ..db.user_cache import get_user, cache_user, invalidate_user
 
 
 bind = on_command("bind", aliases={"绑定"})
@@ -29,21 +30,20 @@ info = on_command("info")
 
 @info.handle()
 async def _(event: MessageEvent, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await info.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
         return await info.finish(cd.error)
     
-    with Session(engine) as session:
-        statement = select(User).where(User.qid == cd.qid)  # NOQA
-        user: User = session.exec(statement).one()
+    user = await get_user(cd.qid)
+    identity = steam_identity(cd.steamid)
 
     content = dedent(f"""
         昵称:             {user.name}
-        steamID:      {convert_steamid(cd.steamid, 2)}
-        steamID32:  {convert_steamid(cd.steamid, 32)}
-        steamID64:  {convert_steamid(cd.steamid, 64)}
+        steamID:      {identity.steam2}
+        steamID32:  {identity.steam32}
+        steamID64:  {identity.steam64}
         默认模式:      {format_kzmode(cd.mode, form='m').upper()}
         QID: {cd.qid}
     """).strip()
@@ -56,17 +56,17 @@ async def _(event: MessageEvent, args: Message = CommandArg()):
 @help_.handle()
 async def _():
     image_path = Path('data/gokz/help.png')
-    await help_.finish(MessageSegment.file_image(image_path))
+    await help_.finish(MessageSegment.file_image(read_static_image(image_path)))
 
 
 @bind.handle()
-async def bind_steamid(event: MessageEvent, args: Message = CommandArg()):
+async def bind_steamid(session: SessionDep, event: MessageEvent, args: Message = CommandArg()):
     input_text = args.extract_plain_text()
     image_path = Path('data/img/binding.png')
     
     if not input_text:
         if image_path.exists():
-            return await bind.finish(MessageSegment.file_image(image_path))
+            return await bind.finish(MessageSegment.file_image(read_static_image(image_path)))
         else:
             if ENABLE_DIRECT_STEAM_BINDING:
                 return await bind.finish("请输入绑定码或steamid")
@@ -80,7 +80,7 @@ async def bind_steamid(event: MessageEvent, args: Message = CommandArg()):
     if len(input_text) == 32 and all(c.upper() in "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ" for c in input_text):
         if not QQ_BOT_SECRET:
             if image_path.exists():
-                return await bind.finish(MessageSegment.file_image(image_path) + MessageSegment.text("绑定码功能未配置，请联系管理员"))
+                return await bind.finish(MessageSegment.file_image(read_static_image(image_path)) + MessageSegment.text("绑定码功能未配置，请联系管理员"))
             return await bind.finish("绑定码功能未配置，请联系管理员")
         
         binding_code_result = decode_binding_code(input_text.upper(), QQ_BOT_SECRET)
@@ -88,20 +88,22 @@ async def bind_steamid(event: MessageEvent, args: Message = CommandArg()):
             steamid = binding_code_result["steamid64"]
         elif not ENABLE_DIRECT_STEAM_BINDING:
             if image_path.exists():
-                return await bind.finish(MessageSegment.file_image(image_path) + MessageSegment.text("绑定码无效或已过期，请重新生成"))
+                return await bind.finish(MessageSegment.file_image(read_static_image(image_path)) + MessageSegment.text("绑定码无效或已过期，请重新生成"))
             return await bind.finish("绑定码无效或已过期，请重新生成")
     
-    # If binding code failed and direct binding is enabled, try direct SteamID
+    # If binding code failed and direct binding is enabled, try direct SteamID or profile URL
     if not steamid and ENABLE_DIRECT_STEAM_BINDING:
         try:
-            steamid = convert_steamid(input_text)
+            steamid = await retrieve_steamid(input_text)
+            if steamid is None:
+                raise ValueError(f"Unresolvable profile URL: {input_text}")
         except ValueError:
             if image_path.exists():
-                return await bind.finish(MessageSegment.file_image(image_path) + MessageSegment.text("Steamid格式不正确"))
+                return await bind.finish(MessageSegment.file_image(read_static_image(image_path)) + MessageSegment.text("Steamid格式不正确"))
             return await bind.finish("Steamid格式不正确")
     elif not steamid:
         if image_path.exists():
-            return await bind.finish(MessageSegment.file_image(image_path) + MessageSegment.text("绑定码无效或已过期，请重新生成"))
+            return await bind.finish(MessageSegment.file_image(read_static_image(image_path)) + MessageSegment.text("绑定码无效或已过期，请重新生成"))
         return await bind.finish("绑定码无效或已过期，请重新生成")
 
     # 阻止他们绑定前20玩家的steamid
@@ -118,35 +120,38 @@ async def bind_steamid(event: MessageEvent, args: Message = CommandArg()):
     player_data = await fetch_json(player_url, timeout=10)
     qq_name = player_data.get("name", "Unknown") if player_data else "Unknown"
 
-    with Session(engine) as session:
-        # If using binding code, force bind by removing any existing binding
-        if is_binding_code:
-            try:
-                statement = select(User).where(User.steamid == steamid)  # NOQA
-                exist_user: User = session.exec(statement).one()
-                # Delete the old user record to unbind
-                session.delete(exist_user)
-                session.commit()
-            except NoResultFound:
-                pass
-        else:
-            # For direct binding, check for duplicates
-            try:
-                statement = select(User).where(User.steamid == steamid)  # NOQA
-                exist_user: User = session.exec(statement).one()
-                return await bind.finish(f"该steamid已经被 {exist_user.name} QQ号{exist_user.qid} 绑定 ")
-            except NoResultFound:
-                pass
-
-        user = session.get(User, user_id)
-        if user:
-            user.name = qq_name
-            user.steamid = steamid
-        else:
-            user = User(qid=user_id, name=qq_name, steamid=steamid)
-            session.add(user)
-        session.commit()
-        session.refresh(user)
+    # If using binding code, force bind by removing any existing binding
+    if is_binding_code:
+        try:
+            statement = select(User).where(User.steamid == steamid)  # NOQA
+            exist_user: User = (await session.exec(statement)).one()
+            # Delete the old user record to unbind
+            await session.delete(exist_user)
+            await session.commit()
+            invalidate_user(exist_user.qid)
+            group_rankings.invalidate_member(exist_user.qid)
+        except NoResultFound:
+            pass
+    else:
+        # For direct binding, check for duplicates
+        try:
+            statement = select(User).where(User.steamid == steamid)  # NOQA
+            exist_user: User = (await session.exec(statement)).one()
+            return await bind.finish(f"该steamid已经被 {exist_user.name} QQ号{exist_user.qid} 绑定 ")
+        except NoResultFound:
+            pass
+
+    user = await session.get(User, user_id)
+    if user:
+        user.name = qq_name
+        user.steamid = steamid
+    else:
+        user = User(qid=user_id, name=qq_name, steamid=steamid)
+        session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    cache_user(user)
+    group_rankings.invalidate_member(user_id)
 
     content = dedent(f"""
         绑定成功!
@@ -160,7 +165,7 @@ async def bind_steamid(event: MessageEvent, args: Message = CommandArg()):
 
 
 @mode.handle()
-async def update_mode(event: MessageEvent, args: Message = CommandArg()):
+async def update_mode(session: SessionDep, event: MessageEvent, args: Message = CommandArg()):
     if mode_ := args.extract_plain_text():
         try:
             mode_ = format_kzmode(mode_)
@@ -170,14 +175,14 @@ async def update_mode(event: MessageEvent, args: Message = CommandArg()):
         return await mode.finish("你模式都不给我我怎么帮你改ヽ(ー_ー)ノ")
 
     qid = event.get_user_id()
-    with Session(engine) as session:
-        user: User | None = session.get(User, qid)
-        if not user:
-            return await mode.finish("你还未绑定steamid")
-
-        user.mode = mode_
-        session.add(user)
-        session.commit()
-        session.refresh(user)
+    user: User | None = await session.get(User, qid)
+    if not user:
+        return await mode.finish("你还未绑定steamid")
+
+    user.mode = mode_
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+    cache_user(user)
 
     await mode.finish(f"模式已更新为: {mode_}")
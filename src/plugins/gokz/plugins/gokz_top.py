@@ -2,26 +2,94 @@ from datetime import datetime
 from textwrap import dedent
 
 from nonebot import on_command, logger
-from nonebot.adapters.qq import MessageEvent as Event, Message
+from nonebot.adapters.qq import MessageEvent as Event, Message, GroupAtMessageCreateEvent
+from nonebot.message import event_preprocessor
 from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
 
-from src.plugins.gokz.core.command_helper import CommandData
+from src.plugins.gokz.core.command_helper import CommandData, parse_args
 from src.plugins.gokz.core.formatter import format_gruntime, diff_seconds_to_time, record_format_time
-from src.plugins.gokz.core.kreedz import search_map
-from src.plugins.gokz.core.kz.records import count_servers
+from src.plugins.gokz.core.kreedz import search_map, format_kzmode
+from src.plugins.gokz.core.kz.records import count_servers, progress_history
 from ..api.dataclasses import LeaderboardData
-from ..api.helper import fetch_json
+from ..api.helper import fetch_json, Fetched
+from ..api.records import fetch_top_records, fetch_map_progress, GLOBAL_API
+from ..db.group_ranking import group_rankings
+from ..db.rank_store import rank_refresher
+from ..db.record_store import get_player_records
 from nonebot.adapters.qq import MessageSegment
 
-BASE = "https://api.gokz.top/"
-
 progress = on_command('mp', aliases={'progress', '进度'})
 ccf = on_command('ccf', aliases={'查成分'})
 pk = on_command('pk', aliases={'pk'})
 find = on_command('find', aliases={'查找'})
 group_rank = on_command('群排名', aliases={'group_rank'}, permission=SUPERUSER)
 
+GROUP_RANK_LIMIT = 20
+
+
+@event_preprocessor
+async def record_group_member(event: GroupAtMessageCreateEvent):
+    # QQ bots cannot list a group's members, so membership is learned from who talks to the bot
+    try:
+        await group_rankings.member_seen(event.group_openid, event.get_user_id())
+    except Exception as e:  # NOQA a failed write is retried on the member's next message, never drops the command
+        logger.warning(f"Failed to record group member: {e!r}")
+
+
+@group_rank.handle()
+async def group_rank_handle(event: Event, args: Message = CommandArg()):
+    group_openid = getattr(event, 'group_openid', None)
+    if not group_openid:
+        return await group_rank.finish("请在群聊中使用")
+
+    parsed = parse_args(args.extract_plain_text())
+    if error := parsed.get('error'):
+        return await group_rank.finish(error)
+    try:
+        mode = format_kzmode(parsed['mode']) if parsed.get('mode') else "kz_timer"
+    except ValueError:
+        return await group_rank.finish("模式格式不正确")
+    metric = "rating" if "rating" in parsed['args'] else "points"
+
+    board = await group_rankings.board(group_openid, mode)
+    unranked = group_rankings.unranked(group_openid, mode)
+    # members gokz.top recently had nothing for are not asked for again until RANK_MISSING_TTL passes
+    pending = [steamid64 for steamid64 in unranked if (steamid64, mode) not in rank_refresher.missing]
+    group_rankings.start_fill(
+        group_openid, mode, pending,
+        lambda steamid64s: rank_refresher.refresh([(steamid64, mode, False) for steamid64 in steamid64s]),
+    )
+
+    if not len(board):
+        content = f"本群暂无 {mode} 排名数据"
+        if pending:
+            content += f"，正在获取 {len(pending)} 名成员的数据，请稍后再试"
+        return await group_rank.finish(content)
+
+    def line(place, standing):
+        value = f"{standing.rating:.2f}" if metric == "rating" else f"{standing.points:,}"
+        global_rank = f"No.{standing.rank}" if standing.rank else "-"
+        return f"{place}. {standing.name} | {value} | {global_rank}\n"
+
+    content = f"════群排名 {mode} {'Rating' if metric == 'rating' else '分数'}════\n"
+    for place, steamid64 in enumerate(board.top(metric, GROUP_RANK_LIMIT), 1):
+        content += line(place, group_rankings.standings[(steamid64, mode)])
+
+    steamid64 = group_rankings.members.get(group_openid, {}).get(event.get_user_id())
+    own = group_rankings.standings.get((steamid64, mode)) if steamid64 else None
+    if own and (place := board.position(own, metric)) and place > GROUP_RANK_LIMIT:
+        content += "……\n" + line(place, own)
+
+    content += f"共 {len(board)} 名成员上榜"
+    if pending:
+        content += f"\n{len(pending)} 名成员的数据获取中"
+    if missing := len(unranked) - len(pending):
+        content += f"\n{missing} 名成员暂无 gokz.top 数据"
+    # Add newline at start for group messages (bot will @ user automatically)
+    content = '\n' + content
+    await group_rank.finish(content)
+
 
 @find.handle()
 async def find_handle(event: Event, args: Message = CommandArg()):
@@ -56,35 +124,25 @@ async def find_handle(event: Event, args: Message = CommandArg()):
 
 @ccf.handle()
 async def check_cheng_fen(event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await ccf.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
         return await ccf.finish(cd.error)
 
-    url = f'{BASE}records/top/{cd.steamid}?mode={cd.mode}'
-    if cd.args:
-        if cd.args[0] == 'all':
-            url = f'{BASE}records/{cd.steamid}?mode={cd.mode}'
+    records = None
+    fetched = Fetched(None)
+    all_records = bool(cd.args) and cd.args[0] == 'all'
+    if not all_records:
+        # Personal bests are mirrored locally, only pull the delta from the Global API
+        records = await get_player_records(cd.steamid, cd.mode)
 
-    records = await fetch_json(url)
-    
-    # If gokz.top API fails, try kztimerglobal as fallback
-    if records is None:
-        logger.info(f"gokz.top API unavailable, trying kztimerglobal fallback for {cd.steamid}")
-        try:
-            from ..api.kztimerglobal import fetch_global_stats
-            mode_str = cd.mode
-            records = await fetch_global_stats(cd.steamid, mode_str, has_tp=True)
-            # Convert kztimerglobal format to match expected format
-            if records:
-                for record in records:
-                    record['server_name'] = record.get('server_name', '未知服务器')
-                    record['player_name'] = record.get('player_name', '未知玩家')
-                    record['steam_id'] = record.get('steam_id', cd.steamid)
-        except Exception as e:
-            logger.error(f"Fallback to kztimerglobal also failed: {e}")
+    if not records:
+        # gokz.top, with the Global API raced against it when gokz.top is slow or down
+        fetched = await fetch_top_records(cd.steamid, cd.mode, all_records)
+        if fetched.data is None:
             return await ccf.finish("API服务暂时不可用，请稍后再试。")
+        records = fetched.data
     
     if not records:
         return await ccf.finish("未找到该玩家的记录。")
@@ -100,6 +158,7 @@ async def check_cheng_fen(event: Event, args: Message = CommandArg()):
         """).strip() + '\n'
         for idx, server in enumerate(data):
             content += f"{idx+1}. {server['server']} | {server['count']}次 | ({server['per']}%)\n"
+        content += fetched.stale_note
         # Add newline at start for group messages (bot will @ user automatically)
         if getattr(event, 'group_id', None):
             content = '\n' + content
@@ -111,7 +170,7 @@ async def check_cheng_fen(event: Event, args: Message = CommandArg()):
 
 @progress.handle()
 async def map_progress(event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await progress.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -119,74 +178,48 @@ async def map_progress(event: Event, args: Message = CommandArg()):
 
     map_name = search_map(cd.args[0])[0]
 
-    query_url = (
-        f"https://api.gokz.top/records/{cd.steamid}?mode={cd.mode}&map_name={map_name}"
-    )
-    data = await fetch_json(query_url)
-
-    # If gokz.top API fails, try kztimerglobal as fallback (limited functionality)
+    # gokz.top has every run; if it is slow or down the Global API answers with the personal bests only
+    fetched = await fetch_map_progress(cd.steamid, cd.mode, map_name)
+    data = fetched.data
     if data is None:
-        logger.info(f"gokz.top API unavailable, trying kztimerglobal fallback for {cd.steamid} on {map_name}")
-        try:
-            from ..api.kztimerglobal import fetch_personal_best
-            # kztimerglobal only returns best records, not all records
-            tp_record = await fetch_personal_best(cd.steamid, map_name, cd.mode, has_tp=True)
-            pro_record = await fetch_personal_best(cd.steamid, map_name, cd.mode, has_tp=False)
-            
-            if not tp_record and not pro_record:
-                return await progress.finish(f"你尚未完成过{map_name}（使用kztimerglobal数据）")
-            
-            # Build limited content with only best records
-            content = f"玩家: {tp_record.get('player_name', pro_record.get('player_name', '未知'))}\n"
-            content += f"在地图: {map_name}\n模式: {cd.mode} 的进度（仅显示最佳记录）\n"
-            content += "\n注意: gokz-top API不可用，仅显示最佳记录\n"
-            
-            if tp_record:
-                time_field = tp_record.get('created_on') or tp_record.get('updated_on', '')
-                content += f"=====TP=====\n"
-                content += f"╔ {format_gruntime(tp_record['time'], True)}\n"
-                content += f"╠ {tp_record.get('points', 0)}分　　{tp_record.get('teleports', 0)} TPs\n"
-                if time_field:
-                    content += f"╚ {record_format_time(time_field)}\n"
-                else:
-                    content += f"╚ 时间未知\n"
-            
-            if pro_record:
-                time_field = pro_record.get('created_on') or pro_record.get('updated_on', '')
-                content += f"\n=====PRO=====\n"
-                content += f"╔ {format_gruntime(pro_record['time'], True)}\n"
-                content += f"╠ {pro_record.get('points', 0)}分\n"
-                if time_field:
-                    content += f"╚ {record_format_time(time_field)}\n"
-                else:
-                    content += f"╚ 时间未知\n"
-            
-            # Add newline at start for group messages (bot will @ user automatically)
-            if getattr(event, 'group_id', None):
-                content = '\n' + content
-            return await progress.finish(content)
-        except Exception as e:
-            logger.error(f"Fallback to kztimerglobal also failed: {e}")
-            return await progress.finish("API服务暂时不可用，请稍后再试。")
-
+        return await progress.finish("API服务暂时不可用，请稍后再试。")
     if not data:
         return await progress.finish(f"你尚未完成过{map_name}")
 
-    try:
-        data.sort(key=lambda x: x['created_on'])
-        records = []
-        completions = []
-        completions_counter = 0
-        for record in data:
-            if not records or record['time'] < records[-1]['time']:
-                records.append(record)
-                completions.append(completions_counter)
-                completions_counter = 0
+    if fetched.source == GLOBAL_API:
+        tp_record = next((r for r in data if r['teleports'] > 0), None)
+        pro_record = next((r for r in data if r['teleports'] == 0), None)
+
+        # Build limited content with only best records
+        content = f"玩家: {(tp_record or pro_record)['player_name']}\n"
+        content += f"在地图: {map_name}\n模式: {cd.mode} 的进度（仅显示最佳记录）\n"
+        content += "\n注意: gokz-top API响应过慢或不可用，仅显示最佳记录\n"
+
+        if tp_record:
+            content += f"=====TP=====\n"
+            content += f"╔ {format_gruntime(tp_record['time'], True)}\n"
+            content += f"╠ {tp_record['points']}分　　{tp_record['teleports']} TPs\n"
+            if tp_record['created_on']:
+                content += f"╚ {record_format_time(tp_record['created_on'])}\n"
+            else:
+                content += f"╚ 时间未知\n"
+
+        if pro_record:
+            content += f"\n=====PRO=====\n"
+            content += f"╔ {format_gruntime(pro_record['time'], True)}\n"
+            content += f"╠ {pro_record['points']}分\n"
+            if pro_record['created_on']:
+                content += f"╚ {record_format_time(pro_record['created_on'])}\n"
             else:
-                completions_counter += 1
+                content += f"╚ 时间未知\n"
 
-        records = list(reversed(records))
-        completions = list(reversed(completions))
+        # Add newline at start for group messages (bot will @ user automatically)
+        if getattr(event, 'group_id', None):
+            content = '\n' + content
+        return await progress.finish(content)
+
+    try:
+        records, completions = progress_history(data)
 
         tp_records = [record for record in records if record['teleports'] > 0]
         pro_records = [record for record in records if record['teleports'] == 0]
@@ -209,6 +242,7 @@ async def map_progress(event: Event, args: Message = CommandArg()):
 
         content += generate_content(tp_records, completions, 'TP')
         content += generate_content(pro_records, completions, 'PRO')
+        content += fetched.stale_note
         # Add newline at start for group messages (bot will @ user automatically)
         if getattr(event, 'group_id', None):
             content = '\n' + content
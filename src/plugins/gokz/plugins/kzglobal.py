@@ -1,3 +1,5 @@
+import asyncio
+import json
 import math
 from datetime import datetime
 from pathlib import Path
@@ -9,15 +11,20 @@ from nonebot.adapters.qq import Bot, Event, Message, MessageSegment
 from nonebot.params import CommandArg
 from nonebot.permission import SUPERUSER
 
-from ..api.kztimerglobal import fetch_personal_best, fetch_personal_recent, fetch_world_record, fetch_personal_bans, \
-    update_map_data
-from ..api.helper import fetch_json, put_json, post_json
+from ..api.kztimerglobal import fetch_personal_best_batch, fetch_personal_recent, fetch_world_record_batch, \
+    fetch_personal_bans
+from ..api.gokz_top import GOKZ_TOP_API_URL, API_MODES, auth_headers
+from ..api.helper import fetch_json_swr, put_json, post_json, Fetched
+from ..db.rank_store import get_rank, save_rank, rank_is_stale
 from src.plugins.gokz.core.command_helper import CommandData
-from src.plugins.gokz.core.config import MAP_TIERS
 from src.plugins.gokz.core.formatter import format_gruntime, record_format_time
 from src.plugins.gokz.core.kreedz import search_map
+from src.plugins.gokz.core.map_catalog import map_catalog
+from src.plugins.gokz.core.kz.card import kz_card
 from src.plugins.gokz.core.kz.screenshot import vnl_screenshot_async, kzgoeu_screenshot_async
-from src.plugins.gokz.core.map_img_url import get_map_img_url
+from src.plugins.gokz.core.map_img_url import get_map_image
+from src.plugins.gokz.core.map_sync import sync_map_assets, sync_running
+from src.plugins.gokz.core.steam_user import convert_steamid
 from ..config import GOKZ_TOP_API_KEY
 
 pb = on_command('pb', aliases={'personal-best'})
@@ -38,8 +45,11 @@ DEFAULT_MAP = 'bkz_cakewalk'
 
 @update_map_info.handle()
 async def _():
-    await update_map_data()
-    await update_map_info.finish('更新完成')
+    if sync_running():
+        return await update_map_info.finish('已有更新任务在进行')
+    await update_map_info.send('开始更新地图数据')
+    result = await sync_map_assets(progress=update_map_info.send)
+    await update_map_info.finish(('更新失败\n' if result.errors else '更新完成\n') + result.summary())
 
 
 def convert_to_shanghai_time(date_str):
@@ -57,7 +67,7 @@ def convert_to_shanghai_time(date_str):
 
 @ban_.handle()
 async def _(event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await ban_.send(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -98,7 +108,7 @@ async def _(event: Event, args: Message = CommandArg()):
 
 @wr.handle()
 async def _(event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await wr.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -110,16 +120,16 @@ async def _(event: Event, args: Message = CommandArg()):
         map_name = search_map(cd.args[0])[0]
 
     kz_mode = cd.mode
+    batch = await fetch_world_record_batch(map_name, (kz_mode,))
 
     content = dedent(f"""
         ╔ 地图:　{map_name}
-        ║ 难度:　T{MAP_TIERS.get(map_name, '未知')}
+        ║ 难度:　T{map_catalog.tier(map_name, '未知')}
         ║ 模式:　{kz_mode}
         ╠═════存点记录═════
     """).strip()
 
-    try:
-        data = await fetch_world_record(map_name, mode=kz_mode, has_tp=True)
+    if data := batch.first(kz_mode, True):
         content += dedent(f"""
             ║ {data['steam_id']}
             ║ 昵称:　　{data['player_name']}
@@ -128,12 +138,13 @@ async def _(event: Event, args: Message = CommandArg()):
             ║ 分数:　　{data['points']}
             ║ 服务器:　{data['server_name']}
             ║ {record_format_time(data['created_on'])}""")
-    except IndexError:
+    elif batch.failed(kz_mode, True):
+        content += f"\n╠ 存点记录查询失败"
+    else:
         content += f"\n╠ 未发现存点记录:"
 
     content += f"\n╠═════裸跳记录═════"
-    try:
-        pro = await fetch_world_record(map_name, mode=kz_mode, has_tp=False)
+    if pro := batch.first(kz_mode, False):
         content += dedent(f"""
             ║ {pro['steam_id']}
             ║ 昵称:　　{pro['player_name']}
@@ -142,14 +153,18 @@ async def _(event: Event, args: Message = CommandArg()):
             ║ 服务器:　{pro['server_name']}
             ╚ {record_format_time(pro['created_on'])}═══
         """)
-    except IndexError:
+    elif batch.failed(kz_mode, False):
+        content += f"\n裸跳记录查询失败"
+    else:
         content += f"\n未发现裸跳记录:"
 
-    img_path = await get_map_img_url(map_name)
+    image = await get_map_image(map_name)
     # Add newline at start for group messages (bot will @ user automatically)
     if getattr(event, 'group_id', None):
         content = '\n' + content
-    combined_message = MessageSegment.file_image(img_path) + MessageSegment.text(content)
+    combined_message = MessageSegment.text(content)
+    if image:
+        combined_message = MessageSegment.file_image(image) + combined_message
     await wr.send(combined_message)
 
     # if map_name == 'kz_hb_fafnir':
@@ -158,17 +173,19 @@ async def _(event: Event, args: Message = CommandArg()):
 
 @pr.handle()
 async def handle_pr(bot: Bot, event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await pr.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
         return await pr.finish(cd.error)
 
     data = await fetch_personal_recent(cd.steamid, cd.mode)
+    if not data:
+        return await pr.finish("未找到该玩家的记录。")
 
     content = dedent(f"""
         ╔ 地图:　　{data['map_name']}
-        ║ 难度:　　T{MAP_TIERS.get(data['map_name'], '未知')}
+        ║ 难度:　　T{map_catalog.tier(data['map_name'], '未知')}
         ║ 模式:　　{cd.mode}
         ║ 玩家:　　{data['player_name']} 
         ║ 用时:　　{format_gruntime(data['time'])}
@@ -177,18 +194,20 @@ async def handle_pr(bot: Bot, event: Event, args: Message = CommandArg()):
         ║ 服务器:　{data['server_name']}
         ╚ {record_format_time(data['created_on'])} ═══""").strip()
 
-    img_path = await get_map_img_url(data['map_name'])
+    image = await get_map_image(data['map_name'])
     # Add newline at start for group messages (bot will @ user automatically)
     if getattr(event, 'group_id', None):
         content = '\n' + content
-    combined_message = MessageSegment.file_image(img_path) + MessageSegment.text(content)
+    combined_message = MessageSegment.text(content)
+    if image:
+        combined_message = MessageSegment.file_image(image) + combined_message
 
     await bot.send(event, combined_message)
 
 
 @pb.handle()
 async def map_pb(bot: Bot, event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await pb.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -201,85 +220,88 @@ async def map_pb(bot: Bot, event: Event, args: Message = CommandArg()):
 
     content = dedent(f"""
         ╔ 地图:　{map_name}
-        ║ 难度:　T{MAP_TIERS.get(map_name, '未知')}
+        ║ 难度:　T{map_catalog.tier(map_name, '未知')}
         ║ 模式:　{cd.mode}
         ╠═════存点记录═════""").strip()
 
-    try:
-        data = await fetch_personal_best(cd.steamid, map_name, cd.mode)
-        if data:
-            content += dedent(f"""
-                ║ 玩家:　　{data['player_name']}
-                ║ 用时:　　{format_gruntime(data['time'])}
-                ║ 存点:　　{data['teleports']}
-                ║ 分数:　　{data['points']}
-                ║ 服务器:　{data['server_name']}
-                ║ {record_format_time(data['created_on'])} """)
-        else:
-            content += f"\n║ 未发现存点记录"
-    except Exception as e:
-        logger.info(repr(e))
+    batch = await fetch_personal_best_batch(cd.steamid, map_name, (cd.mode,))
+    if batch.errors:
+        logger.info(f"/pb partial failure: {batch.errors}")
+
+    if data := batch.first(cd.mode, True):
+        content += dedent(f"""
+            ║ 玩家:　　{data['player_name']}
+            ║ 用时:　　{format_gruntime(data['time'])}
+            ║ 存点:　　{data['teleports']}
+            ║ 分数:　　{data['points']}
+            ║ 服务器:　{data['server_name']}
+            ║ {record_format_time(data['created_on'])} """)
+    elif batch.failed(cd.mode, True):
+        content += f"\n║ 存点记录查询失败"
+    else:
         content += f"\n║ 未发现存点记录"
 
     content += f"\n╠═════裸跳记录═════"
 
-    try:
-        pro = await fetch_personal_best(cd.steamid, map_name, cd.mode, has_tp=False)
-        if pro:
-            content += dedent(f"""
-                ║ 玩家:　　{pro['player_name']}
-                ║ 用时:　　{format_gruntime(pro['time'])}
-                ║ 分数:　　{pro['points']}
-                ║ 服务器:　{pro['server_name']}
-                ╚ {record_format_time(pro['created_on'])} ═══""")
-        else:
-            content += f"\n╚ 未发现裸跳记录"
-    except Exception as e:
-        logger.info(repr(e))
+    if pro := batch.first(cd.mode, False):
+        content += dedent(f"""
+            ║ 玩家:　　{pro['player_name']}
+            ║ 用时:　　{format_gruntime(pro['time'])}
+            ║ 分数:　　{pro['points']}
+            ║ 服务器:　{pro['server_name']}
+            ╚ {record_format_time(pro['created_on'])} ═══""")
+    elif batch.failed(cd.mode, False):
+        content += f"\n╚ 裸跳记录查询失败"
+    else:
         content += f"\n╚ 未发现裸跳记录"
 
-    img_path = await get_map_img_url(map_name)
+    image = await get_map_image(map_name)
     # Add newline at start for group messages (bot will @ user automatically)
     if getattr(event, 'group_id', None):
         content = '\n' + content
-    combined_message = MessageSegment.file_image(img_path) + MessageSegment.text(content)
+    combined_message = MessageSegment.text(content)
+    if image:
+        combined_message = MessageSegment.file_image(image) + combined_message
 
     await bot.send(event, combined_message)
 
 
 @rank.handle()
 async def handle_rank(bot: Bot, event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await rank.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
         return await rank.finish(cd.error)
 
-    BASE_URL = "https://api.gokz.top/api/v1"
-    leaderboard_url = f"{BASE_URL}/leaderboards/{cd.steamid}"
-    player_url = f"{BASE_URL}/players/{cd.steamid}"
+    leaderboard_url = f"{GOKZ_TOP_API_URL}/leaderboards/{cd.steamid}"
+    player_url = f"{GOKZ_TOP_API_URL}/players/{cd.steamid}"
+    steamid64 = str(convert_steamid(cd.steamid, 64))
     
     # Prepare headers with API key if available
-    headers = {}
-    if GOKZ_TOP_API_KEY:
-        headers["Authorization"] = f"Bearer {GOKZ_TOP_API_KEY}"
-    
-    # Fetch player info to get name/alias (silently ignore errors)
-    player_name = 'N/A'
-    try:
-        player_data = await fetch_json(player_url, timeout=30, headers=headers)
-        # Only use player_data if it's a valid success response (not an error response)
-        if player_data and isinstance(player_data, dict) and 'detail' not in player_data:
-            player_name = player_data.get('alias') or player_data.get('name', 'N/A')
-    except Exception:
-        # Silently ignore any errors when fetching player info
-        pass
+    headers = auth_headers()
+    
+    async def fetch_player_name() -> str:
+        # Fetch player info to get name/alias (silently ignore errors)
+        try:
+            player_data = (await fetch_json_swr(player_url, timeout=30, headers=headers)).data
+            # Only use player_data if it's a valid success response (not an error response)
+            if player_data and isinstance(player_data, dict) and 'detail' not in player_data:
+                return player_data.get('alias') or player_data.get('name', 'N/A')
+        except Exception:
+            # Silently ignore any errors when fetching player info
+            pass
+        return 'N/A'
+    
+    fetched = Fetched(None)
     
     # If update flag is set, use PUT request with kz_timer format
     if cd.update:
         # PUT uses mode=kz_timer format
         params = {"mode": cd.mode}
-        rank_data = await put_json(leaderboard_url, params=params, timeout=30, headers=headers)
+        player_name, rank_data = await asyncio.gather(
+            fetch_player_name(), put_json(leaderboard_url, params=params, timeout=30, headers=headers)
+        )
         if rank_data is None:
             return await rank.finish("gokz-top API服务暂时不可用，请稍后再试。")
         
@@ -291,6 +313,9 @@ async def handle_rank(bot: Bot, event: Event, args: Message = CommandArg()):
         if not isinstance(rank_data, dict) or 'steamid64' not in rank_data:
             return await rank.finish("gokz-top API返回了无效数据，请稍后再试。")
         
+        entry = {key: value for key, value in rank_data.items() if key != 'differ'}
+        await save_rank(steamid64, cd.mode, entry, None if player_name == 'N/A' else player_name)
+        
         # Format response with update information
         differ = rank_data.get('differ', {})
         
@@ -405,16 +430,24 @@ async def handle_rank(bot: Bot, event: Event, args: Message = CommandArg()):
             ╚═════════════
         """).strip()
     else:
-        # Use GET request for normal query with KZT format
-        # Convert mode to API format: kz_timer -> KZT, kz_simple -> SKZ, kz_vanilla -> VNL
-        mode_mapping = {
-            "kz_timer": "KZT",
-            "kz_simple": "SKZ",
-            "kz_vanilla": "VNL"
-        }
-        api_mode = mode_mapping.get(cd.mode, cd.mode.upper())
-        params = {"mode": api_mode}
-        rank_data = await fetch_json(leaderboard_url, params=params, timeout=30, headers=headers)
+        cached = await get_rank(steamid64, cd.mode)
+        if cached is not None and not rank_is_stale(cached):
+            # Kept fresh by the background refresher (or an earlier /rank), no need to wait for gokz.top
+            rank_data = json.loads(cached.data)
+            player_name = cached.name or 'N/A'
+        else:
+            # Use GET request for normal query with KZT format
+            # Convert mode to API format: kz_timer -> KZT, kz_simple -> SKZ, kz_vanilla -> VNL
+            params = {"mode": API_MODES.get(cd.mode, cd.mode.upper())}
+            player_name, fetched = await asyncio.gather(
+                fetch_player_name(), fetch_json_swr(leaderboard_url, params=params, timeout=30, headers=headers)
+            )
+            rank_data = fetched.data
+            if rank_data is None and cached is not None:
+                # gokz.top is down: an outdated local entry beats no answer
+                rank_data = json.loads(cached.data)
+                player_name = cached.name or player_name
+                fetched = Fetched(rank_data, stale=True, fetched_at=cached.fetched_at.timestamp())
         if rank_data is None:
             return await rank.finish("gokz-top API服务暂时不可用，请稍后再试。")
         
@@ -426,6 +459,9 @@ async def handle_rank(bot: Bot, event: Event, args: Message = CommandArg()):
         if not isinstance(rank_data, dict) or 'steamid64' not in rank_data:
             return await rank.finish("gokz-top API返回了无效数据，请稍后再试。")
         
+        if fetched.data is not None and not fetched.stale:
+            await save_rank(steamid64, cd.mode, rank_data, None if player_name == 'N/A' else player_name)
+        
         content = dedent(f"""
             ╔════════════
             ║ 玩家:　　　{player_name}
@@ -464,6 +500,7 @@ async def handle_rank(bot: Bot, event: Event, args: Message = CommandArg()):
             ╚═════════════
         """).strip()
     
+    content += fetched.stale_note
     # Add newline at start for group messages (bot will @ user automatically)
     if getattr(event, 'group_id', None):
         content = '\n' + content
@@ -493,7 +530,8 @@ async def handle_review(bot: Bot, event: Event, args: Message = CommandArg()):
     # Fetch review summary
     summary_url = f"{BASE_URL}/maps/reviews/summary"
     summary_params = {"map_name": map_name, "limit": 100}
-    summary_data = await fetch_json(summary_url, params=summary_params, headers=headers, timeout=30)
+    fetched = await fetch_json_swr(summary_url, params=summary_params, headers=headers, timeout=30)
+    summary_data = fetched.data
     
     if summary_data is None:
         return await review.finish("gokz-top API服务暂时不可用，请稍后再试。")
@@ -524,7 +562,7 @@ async def handle_review(bot: Bot, event: Event, args: Message = CommandArg()):
     
     # Fetch map data to get authors
     map_url = f"{BASE_URL}/maps/name/{map_name}"
-    map_data = await fetch_json(map_url, headers=headers, timeout=30)
+    map_data = (await fetch_json_swr(map_url, headers=headers, timeout=30)).data
     
     # Format author names (use alias if available, otherwise name)
     author_names = []
@@ -537,7 +575,7 @@ async def handle_review(bot: Bot, event: Event, args: Message = CommandArg()):
     # Build summary content
     content = dedent(f"""
         ╔ 地图:　{map_name}
-        ║ 难度:　T{MAP_TIERS.get(map_name, '未知')}
+        ║ 难度:　T{map_catalog.tier(map_name, '未知')}
     """).strip()
     
     # Append author information if available
@@ -556,7 +594,7 @@ async def handle_review(bot: Bot, event: Event, args: Message = CommandArg()):
     # Fetch comments from comments endpoint
     comments_url = f"{BASE_URL}/maps/{map_name}/comments"
     comments_params = {"offset": 0, "limit": 100, "include_ratings_only": "false"}
-    comments_data = await fetch_json(comments_url, params=comments_params, headers=headers, timeout=30)
+    comments_data = (await fetch_json_swr(comments_url, params=comments_params, headers=headers, timeout=30)).data
     
     if comments_data and isinstance(comments_data, dict):
         comments_count = comments_data.get('count', 0)
@@ -596,6 +634,7 @@ async def handle_review(bot: Bot, event: Event, args: Message = CommandArg()):
                 content += f"\n║ ... 还有 {len(comments_list) - 5} 条评论"
     
     content += "\n╚═════════════"
+    content += fetched.stale_note
     
     # Add newline at start for group messages
     if getattr(event, 'group_id', None):
@@ -613,7 +652,7 @@ async def handle_rate(bot: Bot, event: Event, args: Message = CommandArg()):
         /rate map_name overall_star gameplay_star visual_star [comments]
         /rate map_name comments
     """
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await rate.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -757,12 +796,23 @@ async def handle_rate(bot: Bot, event: Event, args: Message = CommandArg()):
 
 @kz.handle()
 async def handle_kz(bot: Bot, event: Event, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await bot.send(event, MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
         return await bot.send(event, cd.error)
 
+    # Native card by default, `/kz web` still screenshots kzgo.eu / vnl.kz
+    if not (cd.args and cd.args[0].lower() == 'web'):
+        try:
+            image_path = await kz_card(cd.steamid, cd.mode)
+        except Exception as e:
+            logger.error(f"Failed to render kz card for {cd.steamid}: {e}")
+            return await bot.send(event, "图片生成失败，请稍后重试。")
+        if image_path is None:
+            return await bot.send(event, "查询失败，请稍后再试，或使用 /kz web")
+        return await bot.send(event, MessageSegment.file_image(image_path))
+
     if cd.mode == "kz_vanilla":
         await bot.send(event, "客服小祥正在为您: 生成vnl-kz图片...")
         url = await vnl_screenshot_async(cd.steamid, force_update=cd.update)
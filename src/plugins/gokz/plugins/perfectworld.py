@@ -1,17 +1,17 @@
-import aiohttp
 from textwrap import dedent
 from nonebot import on_command
 from nonebot.adapters.qq import MessageEvent, Message, MessageSegment
 from nonebot.params import CommandArg
 from src.plugins.gokz.core.command_helper import CommandData
 from src.plugins.gokz.core.steam_user import convert_steamid
+from ..api.perfectworld import fetch_cs2_stats
 
 pw = on_command("pw", aliases={"完美", "perfectworld"})
 
 
 @pw.handle()
 async def _(event: MessageEvent, args: Message = CommandArg()):
-    cd = CommandData(event, args)
+    cd = await CommandData.create(event, args)
     if cd.error:
         if cd.error_image and cd.error_image.exists():
             return await pw.finish(MessageSegment.file_image(cd.error_image) + MessageSegment.text(cd.error))
@@ -23,20 +23,7 @@ async def _(event: MessageEvent, args: Message = CommandArg()):
         if cd.args[0].upper().startswith('S'):
             season = str(cd.args[0]).upper()
 
-    url = "https://api.wmpvp.com/api/v2/csgo/pvpDetailDataStats"
-    headers = {
-        "User-Agent": "okhttp/4.11.0",
-        "Content-Type": "application/json",
-        "t": str(int(__import__('time').time()))
-    }
-    payload = {
-        "steamId64": steamid64,
-        "csgoSeasonId": season
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, headers=headers, json=payload) as response:
-            resp = await response.json()
+    resp = await fetch_cs2_stats(steamid64, season)
 
     if resp["statusCode"] != 0 or not resp.get("data"):
         return await pw.finish("获取数据失败，请检查SteamID是否正确")
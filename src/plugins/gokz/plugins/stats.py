@@ -0,0 +1,172 @@
+import asyncio
+
+import nonebot
+from nonebot import on_command, logger
+from nonebot.adapters.qq import Message
+from nonebot.drivers import ASGIMixin, HTTPServerSetup, Request, Response, URL
+from nonebot.message import run_preprocessor, run_postprocessor
+from nonebot.params import CommandArg
+from nonebot.permission import SUPERUSER
+
+from src.plugins.gokz.config import METRICS_PATH, PROFILE_MAX_SECONDS
+from src.plugins.gokz.core.kz.browser_pool import browser_pool
+from src.plugins.gokz.core.kz.screenshot import executor as screenshot_executor
+from src.plugins.gokz.core.loop_watchdog import loop_watchdog, loop_lag
+from src.plugins.gokz.core.map_img_url import map_image_store
+from src.plugins.gokz.core.metrics import (
+    command_latency, upstream_latency, upstream_responses, render_latency,
+    register_collector, render_metrics, command_started, command_finished,
+)
+from src.plugins.gokz.core.profiler import run_profile, profile_running
+from src.plugins.gokz.core.qq_media import media_stats
+from ..api.breaker import breaker_stats
+from ..api.cache import response_cache
+from ..api.hedge import hedge_stats
+from ..api.steam import player_summaries, player_bans
+from ..api.throttle import limiter_stats
+
+stats = on_command('stats', aliases={'统计'}, permission=SUPERUSER)
+profile = on_command('profile', aliases={'性能分析'}, permission=SUPERUSER)
+
+run_preprocessor(command_started)
+run_postprocessor(command_finished)
+
+
+def _cache_counts():
+    """(cache, hits, misses) for every cache that keeps its own counters"""
+    response = response_cache.stats()
+    images = map_image_store.stats()
+    return [
+        ("response", response["hits"] + response["coalesced"], response["misses"]),
+        ("map_image", images["hits"], images["misses"]),
+        ("qq_media", media_stats["hits"], media_stats["uploads"]),
+        ("steam_summary", player_summaries.hits, player_summaries.misses),
+        ("steam_bans", player_bans.hits, player_bans.misses),
+    ]
+
+
+def _queue_depths():
+    """(queue, depth) for everything requests can pile up in"""
+    depths = [(f"upstream:{host}", s["queued"]) for host, s in limiter_stats().items()]
+    depths.append(("screenshot_jobs", screenshot_executor._work_queue.qsize()))  # NOQA
+    depths.append(("screenshot_browsers", browser_pool.waiting))
+    depths.append(("map_image_writes", map_image_store.stats()["pending_writes"]))
+    return depths
+
+
+register_collector(
+    "gokz_cache_hits_total", "Cache lookups answered from the cache",
+    lambda: [({"cache": name}, hits) for name, hits, _ in _cache_counts()], kind="counter",
+)
+register_collector(
+    "gokz_cache_misses_total", "Cache lookups that went upstream",
+    lambda: [({"cache": name}, misses) for name, _, misses in _cache_counts()], kind="counter",
+)
+register_collector(
+    "gokz_queue_depth", "Requests or jobs waiting for a slot",
+    lambda: [({"queue": name}, depth) for name, depth in _queue_depths()],
+)
+register_collector(
+    "gokz_upstream_active_requests", "Requests in flight per upstream host",
+    lambda: [({"host": host}, s["active"]) for host, s in limiter_stats().items()],
+)
+register_collector(
+    "gokz_circuit_open", "1 while the host's circuit breaker is open",
+    lambda: [({"host": host}, int(s["open"])) for host, s in breaker_stats().items()],
+)
+register_collector(
+    "gokz_hedged_requests_total", "Hedged lookups: answered by primary or secondary, backups started, both failed",
+    lambda: [({"event": name}, count) for name, count in hedge_stats.items()], kind="counter",
+)
+
+if METRICS_PATH:
+    driver = nonebot.get_driver()
+    if isinstance(driver, ASGIMixin):
+        async def _serve_metrics(request: Request) -> Response:  # NOQA
+            return Response(200, headers={"Content-Type": "text/plain; version=0.0.4"}, content=render_metrics())
+
+        driver.setup_http_server(HTTPServerSetup(URL(METRICS_PATH), "GET", "gokz_metrics", _serve_metrics))
+    else:
+        logger.warning(f"Metrics endpoint needs an ASGI server driver such as FastAPI, {driver.type} is in use")
+
+
+def _seconds(value: float) -> str:
+    return f"{value * 1000:.0f}ms" if value < 1 else f"{value:.1f}s"
+
+
+def _latency_lines(histogram, failures: dict[str, int]) -> list[str]:
+    """One line per value of the histogram's first label, busiest first: count, p50, p95 and failures"""
+    merged: dict[str, list[int]] = {}
+    for key, (counts, _, _) in histogram.series().items():
+        merged[key[0]] = [a + b for a, b in zip(merged.get(key[0], [0] * len(counts)), counts)]
+    lines = []
+    for name, counts in sorted(merged.items(), key=lambda item: -sum(item[1])):
+        p50 = _seconds(histogram.quantile(0.5, counts))
+        p95 = _seconds(histogram.quantile(0.95, counts))
+        lines.append(f"{name} {sum(counts)}次 | p50 {p50} | p95 {p95} | 失败 {failures.get(name, 0)}")
+    return lines
+
+
+@stats.handle()
+async def _():
+    command_failures: dict[str, int] = {}
+    for (command, outcome), (_, _, count) in command_latency.series().items():
+        if outcome == "error":
+            command_failures[command] = command_failures.get(command, 0) + count
+    content = "════运行统计════\n【命令】\n"
+    content += "\n".join(_latency_lines(command_latency, command_failures)) or "暂无"
+
+    upstream_failures: dict[str, int] = {}
+    for (host, _, status), count in upstream_responses.values().items():
+        if not status.isdigit() or int(status) >= 500:
+            upstream_failures[host] = upstream_failures.get(host, 0) + int(count)
+    content += "\n【上游】\n"
+    content += "\n".join(_latency_lines(upstream_latency, upstream_failures)) or "暂无"
+    open_circuits = [host for host, s in breaker_stats().items() if s["open"]]
+    if open_circuits:
+        content += f"\n熔断中: {', '.join(open_circuits)}"
+
+    content += "\n【缓存命中率】\n"
+    for name, hits, misses in _cache_counts():
+        total = hits + misses
+        content += f"{name} {hits / total:.0%} ({hits}/{total})\n" if total else f"{name} 暂无\n"
+
+    renders = render_latency.series()
+    if renders:
+        counts = [sum(bucket) for bucket in zip(*(series[0] for series in renders.values()))]
+        failed = sum(series[2] for key, series in renders.items() if key[0] == "error")
+        content += f"【截图】{sum(counts)}次 | p95 {_seconds(render_latency.quantile(0.95, counts))} | 失败 {failed}\n"
+
+    lag = [sum(bucket) for bucket in zip(*(series[0] for series in loop_lag.series().values()))]
+    if lag:
+        content += f"【事件循环】延迟 p99 {_seconds(loop_lag.quantile(0.99, lag))} | 阻塞 {loop_watchdog.blocks}次\n"
+        for offender in loop_watchdog.top(3):
+            content += f"  {offender.site} {offender.count}次 共{_seconds(offender.total)} 最长{_seconds(offender.worst)}\n"
+
+    busy = [f"{name} {depth}" for name, depth in _queue_depths() if depth]
+    content += "【排队】" + (", ".join(busy) if busy else "无")
+    await stats.finish(content)
+
+
+@profile.handle()
+async def _(args: Message = CommandArg()):
+    options = args.extract_plain_text().split()
+    seconds = next((int(option) for option in options if option.isdigit()), 30)
+    seconds = min(max(seconds, 1), PROFILE_MAX_SECONDS)
+    memory = 'mem' in options
+    if profile_running():
+        return await profile.finish('已有性能分析在进行')
+
+    await profile.send(f'开始采样 {seconds} 秒' + ('（含内存分配）' if memory else ''))
+    try:
+        result = await asyncio.to_thread(run_profile, seconds, memory)
+    except RuntimeError:
+        return await profile.finish('已有性能分析在进行')
+
+    content = f"════性能分析════\n{result.samples} 次采样 | 火焰图: {result.path}\n【热点函数】自身% | 累计%\n"
+    content += "\n".join(
+        f"{own:5.1f} | {total:5.1f} {function}" for function, own, total in result.top()
+    ) or "无活动线程"
+    if result.allocations:
+        content += "\n【内存分配增量】\n" + "\n".join(result.allocations)
+    await profile.finish(content)